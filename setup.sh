@@ -17,5 +17,7 @@ echo "Frontend setup complete!"
 echo ""
 echo "To run your project:"
 echo "  ▶ Backend: Go to travelog-backend directory --> .env.example file and follow the instructions.
-           ▶ Then run: source travelog-backend/venv/bin/activate && python3 travelog-backend/app.py"
+           ▶ Then run: source travelog-backend/venv/bin/activate && cd travelog-backend && flask db upgrade
+           ▶ Development server: python3 app.py (FLASK_DEBUG=1 for the reloader and debugger)
+           ▶ Production server: python3 serve.py (workers and threads are set in .env)"
 echo "  ▶ Frontend: Open a new terminal and run cd travelog-frontend && npm run dev"
@@ -1,11 +1,36 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, g, request, jsonify, send_from_directory
+from werkzeug.utils import safe_join
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+from collections import defaultdict
+from sqlalchemy import and_, or_, delete, event, exists, func, insert, select, union_all, update, literal
+from flask_migrate import Migrate
+from city_index import CityIndex
+from follow_graph import FollowGraph
+from images import is_image, make_variants
+from storage import BlobStore
+from cache import make_cache
+from metrics import QUERY_BUCKETS, SIZE_BUCKETS, MetricsRegistry, RequestStats, TimedJSONProvider, after_cursor_execute, before_cursor_execute
+from db_routing import ReplicaRouter, RoutingSession, apply_statement_timeout, engine_options, make_write_marks, parse_route_timeouts, primary_reads, read_only, replica_binds
+from geocode import Gazetteer, RemoteGeocoder
+from passwords import PasswordHasher, PasswordHasherBusy
+from geo import GEOHASH_END, MAX_ZOOM, cluster_points, covering_cells, distances_km, geohash, parse_bbox
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import base64
+import click
+import mimetypes
 import os
+import re
 import uuid
+from urllib.parse import quote
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -14,25 +39,135 @@ UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}}, supports_credentials=True)
 
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Connection pool of every engine: the primary and each replica
+app.config['DB_POOL_SIZE'] = int(os.getenv("DB_POOL_SIZE", "5"))
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+app.config['DB_POOL_RECYCLE'] = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+app.config['DB_POOL_PRE_PING'] = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+# Postgres statement_timeout in ms (0 = none), and per-endpoint overrides
+# such as "get_map=2000,get_following_feed=500"
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+app.config['DB_ROUTE_STATEMENT_TIMEOUTS'] = parse_route_timeouts(os.getenv("DB_ROUTE_STATEMENT_TIMEOUTS", ""))
+# Comma-separated read replicas for @read_only GET routes, and how long a
+# user's own reads stay on the primary after they write.
+app.config['DATABASE_REPLICA_URLS'] = os.getenv("DATABASE_REPLICA_URLS", "")
+app.config['READ_YOUR_WRITES_SECONDS'] = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+def pool_options(url):
+    return engine_options(
+        url,
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE'],
+        pre_ping=app.config['DB_POOL_PRE_PING']
+    )
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_BINDS'] = {
+    name: {'url': url, **pool_options(url)} for name, url in replica_binds(app.config['DATABASE_REPLICA_URLS']).items()
+}
 app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY")
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
+app.config['FEED_LEGACY_UNPAGINATED'] = os.getenv("FEED_LEGACY_UNPAGINATED", "true").lower() == "true"
+app.config['TIMELINE_FANOUT_LIMIT'] = int(os.getenv("TIMELINE_FANOUT_LIMIT", "10000"))
+app.config['CITY_INDEX_MAX_AGE'] = int(os.getenv("CITY_INDEX_MAX_AGE", "300"))
+app.config['FOLLOW_GRAPH_MAX_AGE'] = int(os.getenv("FOLLOW_GRAPH_MAX_AGE", "60"))
+app.config['IMAGE_WORKERS'] = int(os.getenv("IMAGE_WORKERS", "2"))
+# Let a front proxy serve /uploads bytes: X-Sendfile (Apache, lighttpd) or
+# X-Accel-Redirect to an internal nginx location such as /protected-uploads/.
+app.config['USE_X_SENDFILE'] = os.getenv("USE_X_SENDFILE", "false").lower() == "true"
+app.config['UPLOADS_ACCEL_REDIRECT_PREFIX'] = os.getenv("UPLOADS_ACCEL_REDIRECT_PREFIX", "")
+app.config['CACHE_URL'] = os.getenv("CACHE_URL", "memory://")
+app.config['CACHE_TTL'] = int(os.getenv("CACHE_TTL", "300"))
+app.config['CACHE_MAX_ENTRIES'] = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+app.config['GAZETTEER_PATH'] = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv'))
+# Nominatim-compatible service for cities missing from the gazetteer, asked
+# in the background when a trip creates one and by `flask geocode-cities`.
+# Empty keeps geocoding fully offline.
+app.config['GEOCODER_URL'] = os.getenv("GEOCODER_URL", "")
+# Werkzeug hash method, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Stored hashes are upgraded on the next successful login after a change.
+app.config['PASSWORD_HASH_METHOD'] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+# The cores are shared by every web worker's pool (serve.py sets WEB_WORKERS)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv(
+    "PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_WORKERS", "1"))))
+))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(4 * app.config['PASSWORD_HASH_WORKERS'] or 1)))
+app.config['PASSWORD_HASH_RETRY_AFTER'] = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+# Serving through asgi.py: the async driver URL (derived from DATABASE_URL
+# when empty), the threads that run the routes which stay synchronous, and
+# the connections (and so concurrent queries) of the async routes.
+app.config['ASYNC_DATABASE_URL'] = os.getenv("ASYNC_DATABASE_URL", "")
+app.config['ASGI_WSGI_THREADS'] = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+app.config['ASGI_DB_POOL_SIZE'] = int(os.getenv("ASGI_DB_POOL_SIZE", "20"))
+# Request metrics: the Server-Timing header, the statement count past which
+# a request logs a possible N+1 (0 = never), and a directory shared by all
+# worker processes so /metrics covers every one of them.
+app.config['SERVER_TIMING'] = os.getenv("SERVER_TIMING", "true").lower() == "true"
+app.config['N_PLUS_ONE_THRESHOLD'] = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+app.config['METRICS_DIR'] = os.getenv("METRICS_DIR", "")
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+migrate = Migrate(app, db)
 jwt = JWTManager(app)
+response_cache = make_cache(app.config['CACHE_URL'], ttl=app.config['CACHE_TTL'], max_entries=app.config['CACHE_MAX_ENTRIES'])
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING']
+)
+replica_router = ReplicaRouter(
+    app.config['SQLALCHEMY_BINDS'],
+    make_write_marks(app.config['CACHE_URL'], app.config['READ_YOUR_WRITES_SECONDS']),
+    window=app.config['READ_YOUR_WRITES_SECONDS']
+)
+# On the base classes, so asgi.py's async sessions and engine are covered too
+event.listen(Session, 'after_begin', apply_statement_timeout)
+event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
 
 # ----------------------- Models -----------------------
+class lower_bytewise(FunctionElement):
+    """lower(x), ordered byte by byte whatever the database's collation.
+
+    get_users scans name ranges ("abc" <= name < "abd") built in Python,
+    which only holds under code point order. SQLite compares text that way
+    already; a Postgres database created with e.g. en_US.UTF-8 doesn't, so
+    there the expression (and the index on it) is COLLATE "C".
+    """
+    type = db.String()
+    inherit_cache = True
+
+@compiles(lower_bytewise)
+def compile_lower_bytewise(element, compiler, **kw):
+    return f"lower({compiler.process(element.clauses, **kw)})"
+
+@compiles(lower_bytewise, 'postgresql')
+def compile_lower_bytewise_postgresql(element, compiler, **kw):
+    return f'(lower({compiler.process(element.clauses, **kw)}) COLLATE "C")'
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.Text, nullable=False)
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    trip_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Upload time of the profile photo in ms, used to bust browser caches
+    photo_version = db.Column(db.BigInteger, nullable=True)
+    # Trips are merged into followers' feeds on read instead of fanned out, see Timeline
+    pull_on_read = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     followers = db.relationship(
         'User',
         secondary='follows',
@@ -41,11 +176,28 @@ class User(db.Model):
         backref='following'
     )
 
+    __table_args__ = (
+        # Usernames are unique regardless of case; also serves prefix search
+        db.Index('uq_users_username_lower', lower_bytewise(username), unique=True),
+        # Lists the few pull-mode authors. SQLite compiles a filter on a
+        # boolean as "= 1", and the predicate must match it to be used.
+        db.Index('ix_users_pull_on_read', 'id', postgresql_where=pull_on_read, sqlite_where=pull_on_read == True),
+    )
+
+def username_key(username):
+    return username.strip().lower()
+
 class Follow(db.Model):
     __tablename__ = 'follows'
     id = db.Column(db.Integer, primary_key=True)
     follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('follower_id', 'followed_id', name='uq_follows_follower_followed'),
+        db.Index('ix_follows_followed', 'followed_id', 'id'),
+        db.Index('ix_follows_follower', 'follower_id', 'id'),
+    )
     
 class Like(db.Model):
     __tablename__ = 'likes'
@@ -53,6 +205,10 @@ class Like(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     trip_id = db.Column(db.Integer, db.ForeignKey('trips.id'), nullable=False)
 
+    __table_args__ = (
+        db.UniqueConstraint('trip_id', 'user_id', name='uq_likes_trip_user'),
+    )
+
 class Comment(db.Model):
     __tablename__ = 'comments'
     id = db.Column(db.Integer, primary_key=True)
@@ -61,6 +217,10 @@ class Comment(db.Model):
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_comments_trip_created', 'trip_id', 'created_at'),
+    )
+
 
 class Trip(db.Model):
     __tablename__ = 'trips'
@@ -68,6 +228,7 @@ class Trip(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     city = db.Column(db.String(120), nullable=False)
     country = db.Column(db.String(120), nullable=False)
+    city_id = db.Column(db.Integer, db.ForeignKey('cities.id'), nullable=True, index=True)
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     accommodation = db.Column(db.String(120), nullable=True)
@@ -75,67 +236,524 @@ class Trip(db.Model):
     favorite_attractions = db.Column(db.Text, nullable=True)
     other_notes = db.Column(db.Text, nullable=True)
     photos = db.Column(db.JSON, nullable=True)
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('trips', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_trips_user_created', 'user_id', 'created_at'),
+        db.Index('ix_trips_country_city', 'country', 'city'),
+        db.Index('ix_trips_city_created', 'city_id', 'created_at'),
+    )
     
-    def to_dict(self):
-        photos = self.photos or []
-        for photo in photos:
+    def to_dict(self, viewer_id=None):
+        return serialize_trips([self], viewer_id=viewer_id)[0]
+
+class City(db.Model):
+    __tablename__ = 'cities'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    country = db.Column(db.String(120), nullable=False)
+    slug = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    # Spatial index key, see geo.py
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+
+    def set_coordinates(self, coords):
+        self.latitude, self.longitude = coords
+        self.geohash = geohash(*coords)
+
+gazetteer = Gazetteer(app.config['GAZETTEER_PATH'])
+
+def city_slug(name, country):
+    """Build the URL id of a city, e.g. ("New York", "USA") -> "new-york_usa"."""
+    return f"{'-'.join(name.lower().split())}_{'-'.join(country.lower().split())}"
+
+def get_or_create_city(name, country):
+    slug = city_slug(name, country)
+    city = City.query.filter_by(slug=slug).first()
+    if city:
+        return city
+    try:
+        with db.session.begin_nested():
+            city = City(name=name.strip(), country=country.strip(), slug=slug)
+            coords = gazetteer.lookup(name, country)
+            if coords:
+                city.set_coordinates(coords)
+            db.session.add(city)
+    except IntegrityError:
+        # Another request created it first
+        city = City.query.filter_by(slug=slug).first()
+    return city
+
+def insert_ignore(model, **values):
+    """INSERT ... ON CONFLICT DO NOTHING. Returns True if a row was inserted."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        stmt = postgresql.insert(model).values(**values).on_conflict_do_nothing()
+    else:
+        stmt = sqlite.insert(model).values(**values).on_conflict_do_nothing()
+    return db.session.execute(stmt).rowcount == 1
+
+def insert_ignore_many(model, rows, returning):
+    """Bulk INSERT ... ON CONFLICT DO NOTHING. Returns `returning` of the inserted rows."""
+    if not rows:
+        return []
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    stmt = dialect.insert(model).values(rows).on_conflict_do_nothing().returning(returning)
+    return [row[0] for row in db.session.execute(stmt)]
+
+class Blob(db.Model):
+    """A content-addressed upload and the number of trip photos using it."""
+    __tablename__ = 'blobs'
+    filename = db.Column(db.String(100), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    """A resumable upload. Chunks land in storage until it is finalized."""
+    __tablename__ = 'upload_sessions'
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    mimetype = db.Column(db.String(120), nullable=True)
+    size = db.Column(db.BigInteger, nullable=True)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='open')
+    blob_filename = db.Column(db.String(100), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TimelineEntry(db.Model):
+    """One trip in one user's materialized home feed."""
+    __tablename__ = 'timeline_entries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    trip_id = db.Column(db.Integer, db.ForeignKey('trips.id'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_timeline_entries_user_created', 'user_id', 'created_at', 'trip_id'),
+        db.Index('ix_timeline_entries_trip_id', 'trip_id'),
+    )
+
+# ----------------------- Serializers -----------------------
+def serialize_trips(trips, viewer_id=None, compact=False):
+    """Serialize trips in bulk with a fixed number of queries.
+
+    Likes, comments and the usernames of trip owners and commenters are
+    loaded with one grouped query each instead of per trip / per comment.
+    With compact=True only the counter columns and the viewer's own like
+    are returned, which is all a feed card needs.
+    """
+    if not trips:
+        return []
+    trip_ids = [trip.id for trip in trips]
+
+    likes_by_trip = defaultdict(list)
+    comments_by_trip = defaultdict(list)
+    comments = []
+    if compact:
+        liked = set()
+        if viewer_id:
+            liked = {row[0] for row in db.session.query(Like.trip_id).filter(
+                Like.trip_id.in_(trip_ids), Like.user_id == viewer_id
+            )}
+    else:
+        for trip_id, user_id in db.session.query(Like.trip_id, Like.user_id).filter(Like.trip_id.in_(trip_ids)):
+            likes_by_trip[trip_id].append(user_id)
+        liked = {trip_id for trip_id, user_ids in likes_by_trip.items() if viewer_id in user_ids}
+
+        comments = Comment.query.filter(Comment.trip_id.in_(trip_ids)).order_by(Comment.created_at.asc(), Comment.id.asc()).all()
+        for c in comments:
+            comments_by_trip[c.trip_id].append(c)
+
+    user_ids = {trip.user_id for trip in trips} | {c.user_id for c in comments}
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids)))
+    city_ids = {trip.city_id for trip in trips if trip.city_id}
+    coordinates = {city_id: (lat, lng) for city_id, lat, lng in db.session.query(
+        City.id, City.latitude, City.longitude
+    ).filter(City.id.in_(city_ids))} if city_ids else {}
+
+    result = []
+    for trip in trips:
+        photos = []
+        for photo in trip.photos or []:
+            photo = dict(photo)
+            # The blob name leads to the upload itself, which /uploads
+            # doesn't serve for images
+            photo.pop('filename', None)
+            if is_image(photo.get('mimetype')) and not photo_is_clean(photo):
+                # The upload itself still has its EXIF (GPS included)
+                photo.pop('url', None)
             if 'url' in photo:
                 photo['url'] = f"http://localhost:5050{photo['url']}"
+            if 'variants' in photo:
+                photo['variants'] = {
+                    name: dict(variant, url=f"http://localhost:5050{variant['url']}")
+                    for name, variant in photo['variants'].items()
+                }
+            photos.append(photo)
 
-        likes = Like.query.filter_by(trip_id=self.id).all()
-        comments = Comment.query.filter_by(trip_id=self.id).order_by(Comment.created_at.asc()).all()
-
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'username': self.user.username if self.user else None,
-            'city': self.city,
-            'country': self.country,
-            'start_date': str(self.start_date),
-            'end_date': str(self.end_date),
-            'accommodation': self.accommodation,
-            'favorite_restaurants': self.favorite_restaurants,
-            'favorite_attractions': self.favorite_attractions,
-            'other_notes': self.other_notes,
+        latitude, longitude = coordinates.get(trip.city_id, (None, None))
+        data = {
+            'id': trip.id,
+            'user_id': trip.user_id,
+            'username': usernames.get(trip.user_id),
+            'city': trip.city,
+            'country': trip.country,
+            'latitude': latitude,
+            'longitude': longitude,
+            'start_date': str(trip.start_date),
+            'end_date': str(trip.end_date),
+            'accommodation': trip.accommodation,
+            'favorite_restaurants': trip.favorite_restaurants,
+            'favorite_attractions': trip.favorite_attractions,
+            'other_notes': trip.other_notes,
             'photos': photos,
-            'likes': [like.user_id for like in likes],  # 🔥 Add this line
-            'comments': [{
+            'like_count': trip.like_count,
+            'comment_count': trip.comment_count,
+            'liked_by_viewer': trip.id in liked
+        }
+        if not compact:
+            data['likes'] = likes_by_trip[trip.id]
+            data['comments'] = [{
                 'id': c.id,
                 'user_id': c.user_id,
-                'username': User.query.get(c.user_id).username,
+                'username': usernames.get(c.user_id),
                 'content': c.content,
                 'created_at': c.created_at.isoformat()
-            } for c in comments]
-        }
-class City(db.Model):
-    __tablename__ = 'cities'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
-    country = db.Column(db.String(120), nullable=False)
+            } for c in comments_by_trip[trip.id]]
+        result.append(data)
+    return result
+
+def list_options():
+    """Read the viewer_id and compact query parameters of trip list routes."""
+    compact = request.args.get('compact', '').lower() in ('1', 'true')
+    return request.args.get('viewer_id', type=int), compact
+
+def reconcile_counters():
+    """Recompute the denormalized counters from their source tables."""
+    db.session.execute(update(Trip).values(
+        like_count=select(func.count(Like.id)).where(Like.trip_id == Trip.id).scalar_subquery(),
+        comment_count=select(func.count(Comment.id)).where(Comment.trip_id == Trip.id).scalar_subquery()
+    ))
+    db.session.execute(update(User).values(
+        follower_count=select(func.count(Follow.id)).where(Follow.followed_id == User.id).scalar_subquery(),
+        following_count=select(func.count(Follow.id)).where(Follow.follower_id == User.id).scalar_subquery(),
+        trip_count=select(func.count(Trip.id)).where(Trip.user_id == User.id).scalar_subquery(),
+        photo_version=None
+    ))
+    # Profile photos are plain files, so their versions come from the upload folder
+    versions = []
+    for entry in os.scandir(app.config['UPLOAD_FOLDER']):
+        match = re.fullmatch(r'user_(\d+)\.png', entry.name)
+        if match:
+            versions.append({'id': int(match.group(1)), 'photo_version': int(entry.stat().st_mtime * 1000)})
+    existing = {row[0] for row in db.session.query(User.id).filter(User.id.in_([v['id'] for v in versions]))} if versions else set()
+    versions = [v for v in versions if v['id'] in existing]
+    if versions:
+        db.session.execute(update(User), versions)
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Recompute like, comment, follow and trip counters and photo versions."""
+    reconcile_counters()
+    db.session.commit()
+    click.echo("Counters reconciled.")
+
+# ----------------------- Response Cache -----------------------
+# Keys, and the write routes that invalidate them:
+#   trip:<id>                 full trip payload: like/unlike, comment,
+#                             delete_comment, delete_trip, photo processing
+#   city:<slug>:trips         trip ids of a city: add_trip, delete_trip
+#   city:<slug>:users         visitors of a city: add_trip, delete_trip
+#   user:<id>:followers       follower list: follow/unfollow of <id>
+# Feeds read their trip ids from the timeline and their payloads from
+# trip:<id>, so a like touches one key however many feeds show the trip.
+
+def trip_payloads(trip_ids, viewer_id=None, compact=False):
+    """Serialized trips in trip_ids order, filled from the response cache."""
+    keys = {trip_id: f"trip:{trip_id}" for trip_id in trip_ids}
+    cached = response_cache.get_many(list(keys.values()))
+    missing = [trip_id for trip_id, key in keys.items() if key not in cached]
+    if missing:
+        with primary_reads():
+            fresh = {f"trip:{data['id']}": data for data in serialize_trips(load_trips_in_order(missing))}
+        response_cache.set_many(fresh)
+        cached.update(fresh)
+
+    result = []
+    for trip_id in trip_ids:
+        data = cached.get(keys[trip_id])
+        if data is None:
+            continue
+        data['liked_by_viewer'] = viewer_id in data['likes']
+        if compact:
+            del data['likes'], data['comments']
+        result.append(data)
+    return result
+
+def invalidate_trip(trip_id):
+    response_cache.delete(f"trip:{trip_id}")
+
+def invalidate_city(slug):
+    response_cache.delete(f"city:{slug}:trips", f"city:{slug}:users")
+
+# ----------------------- Request Metrics -----------------------
+# Every request collects a RequestStats (see metrics.py): statements run,
+# time in them and time encoding JSON. The totals go out in a Server-Timing
+# header and into per-route histograms, served at /metrics.
+
+request_metrics = MetricsRegistry(app.config['METRICS_DIR'])
+ROUTE_LABELS = ('endpoint', 'method')
+request_seconds = request_metrics.histogram(
+    'travelog_request_duration_seconds', "Time to produce the response", ROUTE_LABELS)
+request_db_seconds = request_metrics.histogram(
+    'travelog_request_db_seconds', "Time spent in SQL statements per request", ROUTE_LABELS)
+request_serialize_seconds = request_metrics.histogram(
+    'travelog_request_serialize_seconds', "Time spent encoding JSON per request", ROUTE_LABELS)
+request_queries = request_metrics.histogram(
+    'travelog_request_queries', "SQL statements per request", ROUTE_LABELS, buckets=QUERY_BUCKETS)
+response_bytes = request_metrics.histogram(
+    'travelog_response_bytes', "Response body size", ROUTE_LABELS, buckets=SIZE_BUCKETS)
+responses_total = request_metrics.counter(
+    'travelog_responses_total', "Responses by status code", ROUTE_LABELS + ('status',))
+repeated_queries_total = request_metrics.counter(
+    'travelog_repeated_queries_total', "Requests that ran one statement more than N_PLUS_ONE_THRESHOLD times", ROUTE_LABELS)
+
+@app.before_request
+def start_request_stats():
+    g.request_stats = RequestStats()
+
+@app.after_request
+def finish_request_stats(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    elapsed = stats.elapsed()
+    labels = (request.endpoint or 'unmatched', request.method)
+    observations = [
+        (request_seconds, labels, elapsed),
+        (request_db_seconds, labels, stats.db_seconds),
+        (request_serialize_seconds, labels, stats.serialize_seconds),
+        (request_queries, labels, stats.queries),
+        (response_bytes, labels, response.content_length or 0),
+        (responses_total, labels + (str(response.status_code),), 1),
+    ]
+    threshold = app.config['N_PLUS_ONE_THRESHOLD']
+    repeated = stats.repeated(threshold) if threshold else []
+    for shape, count in repeated:
+        app.logger.warning("Possible N+1 in %s %s: one statement ran %d times: %s", request.method, labels[0], count, shape[:500])
+    if repeated:
+        observations.append((repeated_queries_total, labels, 1))
+    request_metrics.record(*observations)
+    if app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = stats.server_timing(elapsed)
+    return response
+
+# ----------------------- Database Routing -----------------------
+# GET routes marked @read_only read from a replica (see db_routing.py),
+# except for a user who wrote within READ_YOUR_WRITES_SECONDS. Cache
+# misses are filled with primary_reads(), so a lagging replica never puts
+# stale rows into the shared cache after a write invalidated them.
+
+def request_user_ids(include_body):
+    """Users a request acts for: <user_id> in the path, ?user_id / ?viewer_id, or the body's user_id.
+
+    Write routes whose request doesn't name the user (signup, deletes)
+    put them in g.written_user_ids instead.
+    """
+    candidates = [(request.view_args or {}).get('user_id'), request.args.get('user_id'), request.args.get('viewer_id')]
+    if include_body:
+        body = request.get_json(silent=True) if request.is_json else request.form
+        if hasattr(body, 'get'):
+            candidates.append(body.get('user_id'))
+    return {int(user_id) for user_id in candidates if user_id is not None and str(user_id).isdigit()}
+
+@app.before_request
+def route_database():
+    g.statement_timeout = app.config['DB_ROUTE_STATEMENT_TIMEOUTS'].get(request.endpoint, app.config['DB_STATEMENT_TIMEOUT_MS'])
+    view = app.view_functions.get(request.endpoint)
+    if request.method == 'GET' and getattr(view, 'read_only', False):
+        g.replica_bind = replica_router.choose(request_user_ids(include_body=False))
+
+@app.after_request
+def remember_writes(response):
+    if replica_router.binds and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        replica_router.record_write(request_user_ids(include_body=True) | set(g.get('written_user_ids', ())))
+    return response
+
+# ----------------------- Timeline -----------------------
+# Home feeds are materialized into timeline_entries when a trip is written
+# (fan-out-on-write). An author who has TIMELINE_FANOUT_LIMIT or more
+# followers when posting is switched to pull_on_read: their trips are no
+# longer fanned out but merged in when the feed is read. The switch is
+# stored, not derived from the live follower count, so trips posted in pull
+# mode stay visible however the count moves afterwards.
+
+def load_follow_edges():
+    # Runs on a background thread when the graph reloads, so it brings its own context
+    with app.app_context():
+        yield from db.session.query(Follow.follower_id, Follow.followed_id).yield_per(50000)
+
+# Who follows whom, kept in memory so mutuals and suggestions don't re-read
+# the follows table on every request. Each worker reloads its copy every
+# FOLLOW_GRAPH_MAX_AGE seconds, so feeds and the map, which must show a
+# follow right away, query the follows table instead.
+follow_graph = FollowGraph(load_follow_edges, max_age=app.config['FOLLOW_GRAPH_MAX_AGE'])
+
+# A pull-mode author goes back to fan-out only below this share of the
+# limit, so one hovering around it doesn't switch on every post.
+FANOUT_RESUME_RATIO = 0.9
+
+def fan_out_trip(trip):
+    """Insert the trip into the timeline of every follower of its author.
+
+    add_trip has already updated the author's row, which holds its lock,
+    so concurrent posts by one author switch modes one at a time.
+    """
+    follower_count, pull_on_read = db.session.query(User.follower_count, User.pull_on_read).filter(
+        User.id == trip.user_id
+    ).one()
+    limit = app.config['TIMELINE_FANOUT_LIMIT']
+    if follower_count >= (limit * FANOUT_RESUME_RATIO if pull_on_read else limit):
+        if not pull_on_read:
+            db.session.execute(update(User).where(User.id == trip.user_id).values(pull_on_read=True))
+        return
+    if pull_on_read:
+        # Copies this trip along with the ones posted in pull mode
+        backfill_followers(trip.user_id)
+        db.session.execute(update(User).where(User.id == trip.user_id).values(pull_on_read=False))
+        return
+    followers = select(
+        Follow.follower_id, literal(trip.id), literal(trip.user_id), literal(trip.created_at, db.DateTime)
+    ).where(Follow.followed_id == trip.user_id).distinct()
+    db.session.execute(insert(TimelineEntry).from_select(
+        ['user_id', 'trip_id', 'author_id', 'created_at'], followers
+    ))
+
+def backfill_followers(author_id):
+    """Copy an author's trips into every follower's timeline that lacks them."""
+    missing = select(Follow.follower_id, Trip.id, Trip.user_id, Trip.created_at).join(
+        Trip, Trip.user_id == Follow.followed_id
+    ).where(
+        Follow.followed_id == author_id,
+        ~exists().where(TimelineEntry.user_id == Follow.follower_id, TimelineEntry.trip_id == Trip.id)
+    )
+    db.session.execute(insert(TimelineEntry).from_select(
+        ['user_id', 'trip_id', 'author_id', 'created_at'], missing
+    ))
+
+def backfill_timeline(user_id, author_ids):
+    """Copy the existing trips of newly followed authors into a user's timeline."""
+    missing = select(literal(user_id), Trip.id, Trip.user_id, Trip.created_at).where(
+        Trip.user_id.in_(author_ids),
+        ~exists().where(TimelineEntry.user_id == user_id, TimelineEntry.trip_id == Trip.id)
+    )
+    db.session.execute(insert(TimelineEntry).from_select(
+        ['user_id', 'trip_id', 'author_id', 'created_at'], missing
+    ))
+
+def rebuild_timeline(user_id):
+    """Regenerate a user's timeline from the follows and trips tables."""
+    TimelineEntry.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    followed = select(Follow.followed_id).where(Follow.follower_id == user_id)
+    trips = select(literal(user_id), Trip.id, Trip.user_id, Trip.created_at).join(
+        User, User.id == Trip.user_id
+    ).where(
+        Trip.user_id.in_(followed),
+        ~User.pull_on_read
+    )
+    db.session.execute(insert(TimelineEntry).from_select(
+        ['user_id', 'trip_id', 'author_id', 'created_at'], trips
+    ))
+
+def timeline_page(user_id, position=None, limit=None):
+    """Return (created_at, trip_id) pairs for one page of a user's feed.
+
+    Fanned-out entries are read with a range scan on the timeline index and
+    merged with the recent trips of any pull-mode authors the user follows.
+    """
+    # Read from the follows table rather than follow_graph, whose copy in this
+    # worker can miss a follow made on another one for up to a reload.
+    # Only accounts that reached TIMELINE_FANOUT_LIMIT are pull-mode, so this stays short.
+    heavy_ids = [row[0] for row in db.session.query(Follow.followed_id).join(
+        User, User.id == Follow.followed_id
+    ).filter(Follow.follower_id == user_id, User.pull_on_read)]
+
+    def after_position(created_col, id_col, query):
+        if not position:
+            return query
+        created_at, trip_id = position
+        return query.filter(or_(created_col < created_at, and_(created_col == created_at, id_col < trip_id)))
+
+    entries = db.session.query(TimelineEntry.created_at, TimelineEntry.trip_id).filter(TimelineEntry.user_id == user_id)
+    if heavy_ids:
+        entries = entries.filter(TimelineEntry.author_id.notin_(heavy_ids))
+    entries = after_position(TimelineEntry.created_at, TimelineEntry.trip_id, entries)
+    entries = entries.order_by(TimelineEntry.created_at.desc(), TimelineEntry.trip_id.desc())
+    if limit is not None:
+        entries = entries.limit(limit)
+    rows = [tuple(row) for row in entries]
+
+    if heavy_ids:
+        pulled = db.session.query(Trip.created_at, Trip.id).filter(Trip.user_id.in_(heavy_ids))
+        pulled = after_position(Trip.created_at, Trip.id, pulled)
+        pulled = pulled.order_by(Trip.created_at.desc(), Trip.id.desc())
+        if limit is not None:
+            pulled = pulled.limit(limit)
+        rows = sorted(set(rows) | {tuple(row) for row in pulled}, reverse=True)
+        if limit is not None:
+            rows = rows[:limit]
+    return rows
+
+@app.cli.command('rebuild-timeline')
+@click.argument('user_id', type=int, required=False)
+def rebuild_timeline_command(user_id):
+    """Rebuild one user's home timeline, or every user's if none is given."""
+    user_ids = [user_id] if user_id else [row[0] for row in db.session.query(User.id)]
+    for uid in user_ids:
+        rebuild_timeline(uid)
+        db.session.commit()
+    click.echo(f"Rebuilt {len(user_ids)} timeline(s).")
 
 # ----------------------- User Routes -----------------------
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    response = jsonify({"error": "Too many sign-ins right now, please retry"})
+    response.headers['Retry-After'] = str(app.config['PASSWORD_HASH_RETRY_AFTER'])
+    return response, 503
+
 
 @app.route('/signup', methods=['POST'])
 def signup():
     data = request.get_json()
-    username = data.get('username')
+    username = (data.get('username') or '').strip()
     email = data.get('email')
     password = data.get('password')
 
     if not username or not email or not password:
         return jsonify({"error": "Missing fields"}), 400
 
-    if User.query.filter((User.username == username) | (User.email == email)).first():
+    taken = (lower_bytewise(User.username) == username_key(username)) | (User.email == email)
+    if db.session.query(exists().where(taken)).scalar():
         return jsonify({"error": "User already exists"}), 409
+    db.session.rollback()
 
-    hashed_password = generate_password_hash(password)
+    hashed_password = password_hasher.hash(password)
     new_user = User(username=username, email=email, password=hashed_password)
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Someone signed up with the same name while we were hashing
+        db.session.rollback()
+        return jsonify({"error": "User already exists"}), 409
 
+    g.written_user_ids = [new_user.id]
     access_token = create_access_token(identity=new_user.id)
     return jsonify({"message": "User created", "access_token": access_token}), 201
 
@@ -145,68 +763,296 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
-    user = User.query.filter_by(username=username).first()
-    if user and check_password_hash(user.password, password):
-        access_token = create_access_token(identity=user.id)
-        return jsonify({
-            "message": "Login successful",
-            "access_token": access_token,
-            "user": {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email
-            }
-        }), 200
-    return jsonify({"error": "Invalid credentials"}), 401
+    if not username or not password:
+        return jsonify({"error": "Invalid credentials"}), 401
+    user = db.session.query(User.id, User.username, User.email, User.password).filter(
+        lower_bytewise(User.username) == username_key(username)
+    ).first()
+    if not user:
+        return jsonify({"error": "Invalid credentials"}), 401
+    # Hand the connection back to the pool while another process checks the hash
+    db.session.rollback()
+
+    matches, new_hash = password_hasher.verify(user.password, password)
+    if not matches:
+        return jsonify({"error": "Invalid credentials"}), 401
+    if new_hash:
+        # Skipped if the password changed while we were hashing
+        db.session.execute(update(User).where(User.id == user.id, User.password == user.password).values(password=new_hash))
+        db.session.commit()
+
+    access_token = create_access_token(identity=user.id)
+    return jsonify({
+        "message": "Login successful",
+        "access_token": access_token,
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email
+        }
+    }), 200
+
+USER_SEARCH_DEFAULT_LIMIT = 20
+USER_SEARCH_MAX_LIMIT = 100
 
 @app.route('/users', methods=['GET'])
+@read_only
 def get_users():
-    users = User.query.all()
-    return jsonify([{ 'id': user.id, 'username': user.username, 'email': user.email } for user in users])
+    """Users whose name starts with ?q=, in name order, one page at a time.
+
+    Pages are {"users", "next_cursor"}. Both the prefix match and the
+    cursor are range conditions on uq_users_username_lower, so a page
+    reads only its own rows. Without q, limit or cursor the old full list
+    is returned for older clients.
+    """
+    query_text = username_key(request.args.get('q', ''))
+    if not query_text and 'limit' not in request.args and 'cursor' not in request.args:
+        users = db.session.query(User.id, User.username, User.email).all()
+        return jsonify([{ 'id': user.id, 'username': user.username, 'email': user.email } for user in users])
+
+    limit = min(max(request.args.get('limit', USER_SEARCH_DEFAULT_LIMIT, type=int), 1), USER_SEARCH_MAX_LIMIT)
+    key = lower_bytewise(User.username)
+    query = db.session.query(User.id, User.username, User.email, key.label('key'))
+    if query_text:
+        # Every name starting with "abc" sorts in ["abc", "abd")
+        query = query.filter(key >= query_text, key < query_text[:-1] + chr(ord(query_text[-1]) + 1))
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(key > cursor)
+    rows = query.order_by(key).limit(limit + 1).all()
+    return jsonify({
+        'users': [{ 'id': row.id, 'username': row.username, 'email': row.email } for row in rows[:limit]],
+        'next_cursor': rows[limit - 1].key if len(rows) > limit else None
+    })
+
+@app.route('/users/by-username/<username>', methods=['GET'])
+@read_only
+def get_user_by_username(username):
+    user = db.session.query(User.id, User.username, User.email).filter(
+        lower_bytewise(User.username) == username_key(username)
+    ).first()
+    if user:
+        return jsonify({ 'id': user.id, 'username': user.username, 'email': user.email })
+    return jsonify({'error': 'User not found'}), 404
 
 @app.route('/users/<int:user_id>', methods=['GET'])
+@read_only
 def get_user(user_id):
     user = User.query.get(user_id)
     if user:
         return jsonify({ 'id': user.id, 'username': user.username, 'email': user.email })
     return jsonify({'error': 'User not found'}), 404
 
+PROFILE_TRIP_LIMIT = 10
+
+def profile_response(condition):
+    """Everything a profile page shows, in one response.
+
+    Counts come from the counter columns on the user row, so the page
+    costs the same for an account with a million followers. The first
+    page of trips continues with GET /trips/<user_id>?cursor=. With
+    ?viewer_id the response says whether the viewer follows this user.
+    """
+    user = db.session.query(
+        User.id, User.username, User.email, User.follower_count, User.following_count,
+        User.trip_count, User.photo_version
+    ).filter(condition).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    user_id = user.id
+
+    viewer_id, compact = list_options()
+    limit = min(max(request.args.get('trip_limit', PROFILE_TRIP_LIMIT, type=int), 1), FEED_MAX_LIMIT)
+    rows = user_trip_page(user_id, None, limit + 1)
+
+    avatar_url = f"/uploads/user_{user_id}.png"
+    if user.photo_version:
+        avatar_url += f"?v={user.photo_version}"
+    profile = {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'follower_count': user.follower_count,
+        'following_count': user.following_count,
+        'trip_count': user.trip_count,
+        'avatar_url': avatar_url,
+        'avatar_version': user.photo_version,
+        'trips': trip_payloads([trip_id for _, trip_id in rows[:limit]], viewer_id=viewer_id, compact=compact),
+        'next_trip_cursor': encode_feed_cursor(*rows[limit - 1]) if len(rows) > limit else None
+    }
+    if viewer_id:
+        profile['is_following'] = db.session.query(exists().where(
+            Follow.follower_id == viewer_id, Follow.followed_id == user_id
+        )).scalar()
+    return jsonify(profile)
+
+@app.route('/users/<int:user_id>/profile', methods=['GET'])
+@read_only
+def get_profile(user_id):
+    return profile_response(User.id == user_id)
+
+@app.route('/users/by-username/<username>/profile', methods=['GET'])
+@read_only
+def get_profile_by_username(username):
+    return profile_response(lower_bytewise(User.username) == username_key(username))
+
+FOLLOW_DEFAULT_LIMIT = 50
+FOLLOW_MAX_LIMIT = 200
+FOLLOW_CHECK_MAX = 500
+FOLLOW_BULK_MAX = 100
+
+def follow_page(user_id, direction):
+    """One page of a follower or following list, newest follow first.
+
+    Old clients get the whole list unless ?limit or ?cursor is passed.
+    Pages hold {"users", "next_cursor", "total"}. The cursor is the id of
+    the last follow row, so pages stay stable while people follow and
+    unfollow. Only id and username are read, through ix_follows_followed
+    or ix_follows_follower.
+    """
+    if direction == 'followers':
+        match, other = Follow.followed_id, Follow.follower_id
+    else:
+        match, other = Follow.follower_id, Follow.followed_id
+
+    query = db.session.query(Follow.id, User.id, User.username).join(User, User.id == other).filter(match == user_id)
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return [{"id": uid, "username": username} for _, uid, username in query.order_by(Follow.id.desc())]
+
+    limit = min(max(request.args.get('limit', FOLLOW_DEFAULT_LIMIT, type=int), 1), FOLLOW_MAX_LIMIT)
+    cursor = request.args.get('cursor')
+    if cursor:
+        if not cursor.isdigit():
+            return None
+        query = query.filter(Follow.id < int(cursor))
+    rows = query.order_by(Follow.id.desc()).limit(limit + 1).all()
+
+    if direction == 'followers':
+        total = db.session.query(User.follower_count).filter(User.id == user_id).scalar() or 0
+    else:
+        total = db.session.query(User.following_count).filter(User.id == user_id).scalar() or 0
+    return {
+        "users": [{"id": uid, "username": username} for _, uid, username in rows[:limit]],
+        "next_cursor": str(rows[limit - 1][0]) if len(rows) > limit else None,
+        "total": total
+    }
+
 @app.route('/users/<int:user_id>/followers', methods=['GET'])
+@read_only
 def get_followers(user_id):
-    user = User.query.get(user_id)
-    if user:
-        followers = [{"id": f.id, "username": f.username} for f in user.followers]
-        return jsonify(followers)
-    return jsonify([])
+    if 'limit' in request.args or 'cursor' in request.args:
+        page = follow_page(user_id, 'followers')
+        if page is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify(page)
+
+    key = f"user:{user_id}:followers"
+    followers = response_cache.get_many([key]).get(key)
+    if followers is None:
+        with primary_reads():
+            followers = follow_page(user_id, 'followers')
+        response_cache.set_many({key: followers})
+    return jsonify(followers)
 
 @app.route('/users/<int:user_id>/following', methods=['GET'])
+@read_only
 def get_following(user_id):
-    user = User.query.get(user_id)
-    if user:
-        following = [{"id": u.id, "username": u.username} for u in user.following]
-        return jsonify(following)
-    return jsonify([])
+    page = follow_page(user_id, 'following')
+    if page is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(page)
+
+@app.route('/users/<int:user_id>/following/check', methods=['GET'])
+@read_only
+def check_following(user_id):
+    """Answer "does user_id follow each of ?ids=1,2,3" with one query."""
+    try:
+        target_ids = list(dict.fromkeys(int(part) for part in request.args.get('ids', '').split(',') if part))
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of user ids'}), 400
+    if len(target_ids) > FOLLOW_CHECK_MAX:
+        return jsonify({'error': f'At most {FOLLOW_CHECK_MAX} ids per request'}), 400
+
+    followed = {row[0] for row in db.session.query(Follow.followed_id).filter(
+        Follow.follower_id == user_id, Follow.followed_id.in_(target_ids)
+    )} if target_ids else set()
+    return jsonify({str(target_id): target_id in followed for target_id in target_ids})
+
+def follow_targets():
+    """Target ids of a follow/unfollow body: target_user_id or target_user_ids."""
+    data = request.get_json(silent=True) or {}
+    targets = data.get('target_user_ids')
+    if targets is None:
+        targets = [data['target_user_id']] if data.get('target_user_id') else []
+    if not isinstance(targets, list) or not all(isinstance(t, int) or str(t).isdigit() for t in targets):
+        return None
+    return list(dict.fromkeys(int(t) for t in targets))
 
 @app.route('/users/<int:user_id>/follow', methods=['POST'])
 def follow_user(user_id):
-    target_id = request.json.get("target_user_id")
-    if not target_id:
+    target_ids = follow_targets()
+    if not target_ids:
         return jsonify({"error": "Missing target user id"}), 400
-    existing = Follow.query.filter_by(follower_id=user_id, followed_id=target_id).first()
-    if not existing:
-        new_follow = Follow(follower_id=user_id, followed_id=target_id)
-        db.session.add(new_follow)
-        db.session.commit()
-    return jsonify({"message": "Followed"})
+    if len(target_ids) > FOLLOW_BULK_MAX:
+        return jsonify({"error": f"At most {FOLLOW_BULK_MAX} users per request"}), 400
+
+    existing = [row[0] for row in db.session.query(User.id).filter(User.id.in_(target_ids))]
+    followed = insert_ignore_many(
+        Follow, [{"follower_id": user_id, "followed_id": target_id} for target_id in existing], Follow.followed_id
+    )
+    if followed:
+        db.session.execute(update(User).where(User.id.in_(followed)).values(follower_count=User.follower_count + 1))
+        db.session.execute(update(User).where(User.id == user_id).values(following_count=User.following_count + len(followed)))
+        backfill_timeline(user_id, followed)
+    db.session.commit()
+    follow_graph.follow(user_id, followed)
+    response_cache.delete(*(f"user:{target_id}:followers" for target_id in followed))
+    return jsonify({"message": "Followed", "followed": followed})
 
 @app.route('/users/<int:user_id>/unfollow', methods=['POST'])
 def unfollow_user(user_id):
-    target_id = request.json.get("target_user_id")
-    follow = Follow.query.filter_by(follower_id=user_id, followed_id=target_id).first()
-    if follow:
-        db.session.delete(follow)
-        db.session.commit()
-    return jsonify({"message": "Unfollowed"})
+    target_ids = follow_targets()
+    if not target_ids:
+        return jsonify({"error": "Missing target user id"}), 400
+    if len(target_ids) > FOLLOW_BULK_MAX:
+        return jsonify({"error": f"At most {FOLLOW_BULK_MAX} users per request"}), 400
+
+    unfollowed = [row[0] for row in db.session.execute(
+        delete(Follow).where(Follow.follower_id == user_id, Follow.followed_id.in_(target_ids)).returning(Follow.followed_id)
+    )]
+    if unfollowed:
+        db.session.execute(update(User).where(User.id.in_(unfollowed)).values(follower_count=User.follower_count - 1))
+        db.session.execute(update(User).where(User.id == user_id).values(following_count=User.following_count - len(unfollowed)))
+        TimelineEntry.query.filter(
+            TimelineEntry.user_id == user_id, TimelineEntry.author_id.in_(unfollowed)
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    follow_graph.unfollow(user_id, unfollowed)
+    response_cache.delete(*(f"user:{target_id}:followers" for target_id in unfollowed))
+    return jsonify({"message": "Unfollowed", "unfollowed": unfollowed})
+
+def usernames_by_id(user_ids):
+    return dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids))) if user_ids else {}
+
+@app.route('/users/<int:user_id>/mutuals', methods=['GET'])
+@read_only
+def get_mutuals(user_id):
+    """Users who follow user_id and are followed back."""
+    mutual_ids = follow_graph.mutuals(user_id)
+    usernames = usernames_by_id(mutual_ids)
+    return jsonify([{"id": uid, "username": usernames[uid]} for uid in mutual_ids if uid in usernames])
+
+@app.route('/users/<int:user_id>/suggestions', methods=['GET'])
+@read_only
+def get_suggestions(user_id):
+    """People followed by the people user_id follows, most shared connections first."""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    ranked = follow_graph.suggestions(user_id, limit)
+    usernames = usernames_by_id([uid for uid, _ in ranked])
+    return jsonify([
+        {"id": uid, "username": usernames[uid], "mutual_count": count}
+        for uid, count in ranked if uid in usernames
+    ])
 
 @app.route('/users/<int:user_id>/upload_photo', methods=['POST'])
 def upload_profile_photo(user_id):
@@ -216,7 +1062,10 @@ def upload_profile_photo(user_id):
     filename = f"user_{user_id}.png"
     path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     file.save(path)
-    return jsonify({"message": "Photo uploaded", "photo_url": f"/uploads/{filename}"}), 200
+    version = int(datetime.now().timestamp() * 1000)
+    db.session.execute(update(User).where(User.id == user_id).values(photo_version=version))
+    db.session.commit()
+    return jsonify({"message": "Photo uploaded", "photo_url": f"/uploads/{filename}?v={version}", "photo_version": version}), 200
 
 @app.route('/users/<int:user_id>/has_photo', methods=['GET'])
 def user_has_photo(user_id):
@@ -224,29 +1073,208 @@ def user_has_photo(user_id):
     path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     return jsonify({"hasPhoto": os.path.exists(path)})
 
+# ----------------------- Media -----------------------
+# Resizing runs off the request thread; Pillow releases the GIL while it
+# decodes, resamples and encodes, so a thread pool gives real parallelism.
+image_pool = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'], thread_name_prefix='images')
+
+def photo_is_clean(photo):
+    """Whether a photo's url points at its metadata-free full-size copy."""
+    return 'full' in photo.get('variants', {})
+
+def photo_needs_processing(photo):
+    """Pending uploads, and images processed before the full-size copy existed."""
+    return is_image(photo.get('mimetype')) and photo.get('status') != 'failed' and not photo_is_clean(photo)
+
+def process_trip_photos(trip_id):
+    """Generate the variants, full-size copy included, of a trip's unprocessed photos."""
+    with app.app_context():
+        trip = Trip.query.get(trip_id)
+        if not trip or not trip.photos:
+            return
+        photos = []
+        for photo in trip.photos:
+            photo = dict(photo)
+            if photo_needs_processing(photo):
+                try:
+                    variants = make_variants(app.config['UPLOAD_FOLDER'], photo['filename'])
+                    photo['variants'] = {
+                        name: dict(variant, url=f"/uploads/{variant['filename']}")
+                        for name, variant in variants.items()
+                    }
+                    photo['url'] = photo['variants']['full']['url']
+                    photo['status'] = 'ready'
+                except Exception as e:
+                    print("Error processing photo:", photo['filename'], e)
+                    photo['status'] = 'failed'
+            photos.append(photo)
+        # Reassign so SQLAlchemy sees the JSON column change
+        trip.photos = photos
+        db.session.commit()
+        invalidate_trip(trip_id)
+
+blob_store = BlobStore(app.config['UPLOAD_FOLDER'])
+
+def acquire_blob(filename, size):
+    insert_ignore(Blob, filename=filename, size=size, ref_count=0)
+    db.session.execute(update(Blob).where(Blob.filename == filename).values(ref_count=Blob.ref_count + 1))
+
+def release_blob(filename):
+    """Drop one reference to a blob. Returns True if its files should be deleted.
+
+    The files stay on disk until the caller has committed and passes them
+    to remove_released_blobs, so a failed transaction leaves nothing missing.
+    """
+    remaining = db.session.execute(
+        update(Blob).where(Blob.filename == filename).values(ref_count=Blob.ref_count - 1).returning(Blob.ref_count)
+    ).scalar()
+    if remaining is None:
+        # Uploaded before content addressing, so owned by this trip alone
+        return True
+    if remaining > 0:
+        return False
+    db.session.execute(delete(Blob).where(Blob.filename == filename))
+    return True
+
+def remove_released_blobs(released):
+    """Delete the files of blobs whose last reference was just committed.
+
+    `released` holds (blob filename, every filename to delete) pairs. An
+    upload of the same content may have acquired a blob again since then.
+    Each blob row is re-created at zero references and locked, so its files
+    are only deleted if nothing took a reference, and an upload arriving
+    later waits on the row and then puts its file back.
+    """
+    for filename, filenames in released:
+        try:
+            insert_ignore(Blob, filename=filename, size=0, ref_count=0)
+            ref_count = db.session.execute(
+                select(Blob.ref_count).where(Blob.filename == filename).with_for_update()
+            ).scalar()
+            if ref_count == 0:
+                for name in filenames:
+                    blob_store.delete(name)
+                db.session.execute(delete(Blob).where(Blob.filename == filename))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print("Error removing blob:", filename, e)
+
+def photo_filenames(photo):
+    """Every file on disk that belongs to one entry of Trip.photos."""
+    filenames = [photo['filename']] if 'filename' in photo else []
+    filenames += [variant['filename'] for variant in photo.get('variants', {}).values()]
+    return filenames
+
+@app.cli.command('dedupe-uploads')
+def dedupe_uploads_command():
+    """Move trip photos uploaded before content addressing into the blob store."""
+    moved = 0
+    trip_ids = [row[0] for row in db.session.query(Trip.id).filter(Trip.photos.isnot(None))]
+    for trip_id in trip_ids:
+        trip = Trip.query.get(trip_id)
+        photos = []
+        changed = False
+        for photo in trip.photos or []:
+            photo = dict(photo)
+            filename = photo.get('filename')
+            if filename and not db.session.get(Blob, filename) and os.path.exists(blob_store.path(filename)):
+                with open(blob_store.path(filename), 'rb') as f:
+                    temp_path, blob_name, size = blob_store.write_temp(f, filename)
+                acquire_blob(blob_name, size)
+                blob_store.commit(temp_path, blob_name)
+                for old_filename in photo_filenames(photo):
+                    blob_store.delete(old_filename)
+                photo.pop('variants', None)
+                photo.update(filename=blob_name, url=f"/uploads/{blob_name}", original_filename=filename)
+                if is_image(photo.get('mimetype')):
+                    photo['status'] = 'pending'
+                changed = True
+                moved += 1
+            photos.append(photo)
+        if changed:
+            trip.photos = photos
+            db.session.commit()
+            process_trip_photos(trip_id)
+    click.echo(f"Moved {moved} upload(s) into the blob store.")
+
+@app.cli.command('process-pending-photos')
+@click.option('--min-age-minutes', default=10, show_default=True,
+              help="Skip trips younger than this, whose photos may still be queued.")
+@click.option('--batch-size', default=1000, show_default=True)
+def process_pending_photos_command(min_age_minutes, batch_size):
+    """Process trip photos left pending by a restart, and older uploads without a full-size copy."""
+    cutoff = datetime.utcnow() - timedelta(minutes=min_age_minutes)
+    processed = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Trip.id, Trip.photos).filter(
+            Trip.photos.isnot(None), Trip.created_at < cutoff, Trip.id > last_id
+        ).order_by(Trip.id).limit(batch_size).all()
+        if not rows:
+            break
+        # End the read before process_trip_photos commits from its own session
+        db.session.rollback()
+        for trip_id, photos in rows:
+            if any(photo_needs_processing(photo) for photo in photos or []):
+                process_trip_photos(trip_id)
+                processed += 1
+        last_id = rows[-1][0]
+    click.echo(f"Processed the photos of {processed} trip(s).")
+
 # ----------------------- Trip Routes -----------------------
 @app.route('/trips', methods=['POST'])
 def add_trip():
+    uploads = []
     try:
         form = request.form
         files = request.files.getlist('media')
 
+        upload_ids = form.getlist('upload_ids')
+        sessions = UploadSession.query.filter(
+            UploadSession.id.in_(upload_ids),
+            UploadSession.user_id == form['user_id'],
+            UploadSession.status == 'finalized'
+        ).all() if upload_ids else []
+        if len(sessions) != len(set(upload_ids)):
+            return jsonify({"error": "Unknown or unfinished upload"}), 400
+
         photo_metadata = []
+        # Finalized sessions already hold a blob reference; it moves to the trip.
+        sessions_by_id = {session.id: session for session in sessions}
+        for upload_id in dict.fromkeys(upload_ids):
+            session = sessions_by_id[upload_id]
+            metadata = {
+                "filename": session.blob_filename,
+                "original_filename": session.filename,
+                "url": f"/uploads/{session.blob_filename}",
+                "mimetype": session.mimetype
+            }
+            if is_image(session.mimetype):
+                metadata["status"] = "pending"
+            photo_metadata.append(metadata)
+            db.session.delete(session)
+
         for file in files:
             if file.filename:
-                filename = f"{uuid.uuid4()}_{file.filename}"
-                path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(path)
-                photo_metadata.append({
+                temp_path, filename, size = blob_store.write_temp(file.stream, file.filename)
+                uploads.append((temp_path, filename, size))
+                metadata = {
                     "filename": filename,
+                    "original_filename": file.filename,
                     "url": f"/uploads/{filename}",
                     "mimetype": file.mimetype
-                })
+                }
+                if is_image(file.mimetype):
+                    metadata["status"] = "pending"
+                photo_metadata.append(metadata)
 
+        city = get_or_create_city(form['city'], form['country'])
         new_trip = Trip(
             user_id=form['user_id'],
             city=form['city'],
             country=form['country'],
+            city_id=city.id,
             start_date=datetime.strptime(form['startDate'], '%Y-%m-%d').date(),
             end_date=datetime.strptime(form['endDate'], '%Y-%m-%d').date(),
             accommodation=form.get('accommodation'),
@@ -256,66 +1284,153 @@ def add_trip():
             photos=photo_metadata
         )
         db.session.add(new_trip)
+        db.session.flush()
+        db.session.execute(update(User).where(User.id == new_trip.user_id).values(trip_count=User.trip_count + 1))
+        fan_out_trip(new_trip)
+        for temp_path, filename, size in uploads:
+            acquire_blob(filename, size)
+            blob_store.commit(temp_path, filename)
+        needs_coordinates = city.latitude is None
         db.session.commit()
+        city_index.add(new_trip.city, new_trip.country)
+        invalidate_city(city.slug)
+        if needs_coordinates:
+            queue_geocoding(city.id)
+        if any(photo.get("status") == "pending" for photo in photo_metadata):
+            image_pool.submit(process_trip_photos, new_trip.id)
         return jsonify({"message": "Trip added!", "trip": new_trip.to_dict()}), 201
     except Exception as e:
+        db.session.rollback()
+        for temp_path, _, _ in uploads:
+            blob_store.discard(temp_path)
         print("Error adding trip:", e)
         return jsonify({"error": "Trip creation failed"}), 500
 
+def user_trip_page(user_id, position, limit):
+    """(created_at, trip_id) rows of a user's trips, newest first, read from ix_trips_user_created."""
+    query = db.session.query(Trip.created_at, Trip.id).filter(Trip.user_id == user_id)
+    if position:
+        created_at, trip_id = position
+        query = query.filter(or_(
+            Trip.created_at < created_at,
+            and_(Trip.created_at == created_at, Trip.id < trip_id)
+        ))
+    return query.order_by(Trip.created_at.desc(), Trip.id.desc()).limit(limit).all()
+
 @app.route('/trips/<int:user_id>', methods=['GET'])
+@read_only
 def get_user_trips(user_id):
-    trips = Trip.query.filter_by(user_id=user_id).all()
-    return jsonify([trip.to_dict() for trip in trips])
+    viewer_id, compact = list_options()
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        trip_ids = [row[0] for row in db.session.query(Trip.id).filter_by(user_id=user_id)]
+        return jsonify(trip_payloads(trip_ids, viewer_id=viewer_id, compact=compact))
+
+    limit = min(max(request.args.get('limit', FEED_DEFAULT_LIMIT, type=int), 1), FEED_MAX_LIMIT)
+    position = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = decode_feed_cursor(cursor)
+        if not position:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    rows = user_trip_page(user_id, position, limit + 1)
+    return jsonify({
+        'trips': trip_payloads([trip_id for _, trip_id in rows[:limit]], viewer_id=viewer_id, compact=compact),
+        'next_cursor': encode_feed_cursor(*rows[limit - 1]) if len(rows) > limit else None
+    })
 
 @app.route('/trips/<int:trip_id>', methods=['DELETE'])
 def delete_trip(trip_id):
     try:
         trip = Trip.query.get_or_404(trip_id)
-        if trip.photos:
-            for photo in trip.photos:
-                if 'filename' in photo:
-                    path = os.path.join(app.config['UPLOAD_FOLDER'], photo['filename'])
-                    if os.path.exists(path):
-                        os.remove(path)
+        released = [
+            (photo['filename'], photo_filenames(photo)) for photo in trip.photos or []
+            if 'filename' in photo and release_blob(photo['filename'])
+        ]
+        city, country = trip.city, trip.country
+        TimelineEntry.query.filter_by(trip_id=trip_id).delete(synchronize_session=False)
+        db.session.execute(update(User).where(User.id == trip.user_id).values(trip_count=User.trip_count - 1))
+        g.written_user_ids = [trip.user_id]
         db.session.delete(trip)
         db.session.commit()
+        city_index.remove(city, country)
+        invalidate_trip(trip_id)
+        invalidate_city(city_slug(city, country))
+        remove_released_blobs(released)
         return jsonify({"message": "Trip deleted successfully"}), 200
     except Exception as e:
+        db.session.rollback()
         print("Error deleting trip:", e)
         return jsonify({"error": "Failed to delete trip"}), 500
 
 # ----------------------- Feed Routes -----------------------
+FEED_DEFAULT_LIMIT = 20
+FEED_MAX_LIMIT = 100
+
+def encode_feed_cursor(created_at, trip_id):
+    raw = f"{created_at.isoformat()}|{trip_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_feed_cursor(cursor):
+    try:
+        created_at, trip_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(trip_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def load_trips_in_order(trip_ids):
+    trips = {trip.id: trip for trip in Trip.query.filter(Trip.id.in_(trip_ids))} if trip_ids else {}
+    return [trips[trip_id] for trip_id in trip_ids if trip_id in trips]
+
 @app.route('/feed/<int:user_id>', methods=['GET'])
+@read_only
 def get_following_feed(user_id):
     user = User.query.get(user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    following_ids = [u.id for u in user.following]
+    _, compact = list_options()
+
+    # Older clients still expect the full list.
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    if not paginate and app.config['FEED_LEGACY_UNPAGINATED']:
+        rows = timeline_page(user_id)
+        return jsonify(trip_payloads([trip_id for _, trip_id in rows], viewer_id=user_id, compact=compact))
 
-    trips = Trip.query.filter(Trip.user_id.in_(following_ids)).order_by(Trip.created_at.desc()).all()
+    limit = min(max(request.args.get('limit', FEED_DEFAULT_LIMIT, type=int), 1), FEED_MAX_LIMIT)
+    position = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = decode_feed_cursor(cursor)
+        if not position:
+            return jsonify({'error': 'Invalid cursor'}), 400
 
-    return jsonify([trip.to_dict() for trip in trips])
+    rows = timeline_page(user_id, position, limit + 1)
+    next_cursor = encode_feed_cursor(*rows[limit - 1]) if len(rows) > limit else None
+    return jsonify({
+        'trips': trip_payloads([trip_id for _, trip_id in rows[:limit]], viewer_id=user_id, compact=compact),
+        'next_cursor': next_cursor
+    })
 
 @app.route('/trips/<int:trip_id>/like', methods=['POST'])
 def like_trip(trip_id):
     user_id = request.json.get('user_id')
     if not user_id:
         return jsonify({'error': 'Missing user_id'}), 400
-    existing = Like.query.filter_by(user_id=user_id, trip_id=trip_id).first()
-    if not existing:
-        like = Like(user_id=user_id, trip_id=trip_id)
-        db.session.add(like)
-        db.session.commit()
+    if insert_ignore(Like, user_id=user_id, trip_id=trip_id):
+        db.session.execute(update(Trip).where(Trip.id == trip_id).values(like_count=Trip.like_count + 1))
+    db.session.commit()
+    invalidate_trip(trip_id)
     return jsonify({'message': 'Liked'})
 
 @app.route('/trips/<int:trip_id>/unlike', methods=['POST'])
 def unlike_trip(trip_id):
     user_id = request.json.get('user_id')
-    like = Like.query.filter_by(user_id=user_id, trip_id=trip_id).first()
-    if like:
-        db.session.delete(like)
-        db.session.commit()
+    removed = db.session.execute(delete(Like).where(Like.user_id == user_id, Like.trip_id == trip_id))
+    if removed.rowcount:
+        db.session.execute(update(Trip).where(Trip.id == trip_id).values(like_count=Trip.like_count - 1))
+    db.session.commit()
+    invalidate_trip(trip_id)
     return jsonify({'message': 'Unliked'})
 
 @app.route('/trips/<int:trip_id>/comment', methods=['POST'])
@@ -329,7 +1444,9 @@ def comment_trip(trip_id):
 
     new_comment = Comment(trip_id=trip_id, user_id=user_id, content=content)
     db.session.add(new_comment)
+    db.session.execute(update(Trip).where(Trip.id == trip_id).values(comment_count=Trip.comment_count + 1))
     db.session.commit()
+    invalidate_trip(trip_id)
 
     user = User.query.get(user_id)
 
@@ -342,19 +1459,21 @@ def comment_trip(trip_id):
     }), 201
 
 @app.route('/trips/<int:trip_id>/comments', methods=['GET'])
+@read_only
 def get_trip_comments(trip_id):
     trip = Trip.query.get(trip_id)
     if not trip:
         return jsonify({'error': 'Trip not found'}), 404
 
     comments = Comment.query.filter_by(trip_id=trip_id).order_by(Comment.created_at.asc()).all()
+    user_ids = {comment.user_id for comment in comments}
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids))) if user_ids else {}
     comment_data = []
     for comment in comments:
-        user = User.query.get(comment.user_id)
         comment_data.append({
             'id': comment.id,
             'user_id': comment.user_id,
-            'username': user.username if user else "Unknown",
+            'username': usernames.get(comment.user_id, "Unknown"),
             'content': comment.content,
             'created_at': comment.created_at.isoformat()
         })
@@ -366,100 +1485,555 @@ def delete_comment(comment_id):
     if not comment:
         return jsonify({'error': 'Comment not found'}), 404
 
+    g.written_user_ids = [comment.user_id]
     db.session.delete(comment)
+    db.session.execute(update(Trip).where(Trip.id == comment.trip_id).values(comment_count=Trip.comment_count - 1))
     db.session.commit()
+    invalidate_trip(comment.trip_id)
     return jsonify({'message': 'Comment deleted'}), 200
 
 @app.route('/trip/<int:trip_id>', methods=['GET'])
+@read_only
 def get_trip(trip_id):
-    trip = Trip.query.get(trip_id)
-    if not trip:
+    payloads = trip_payloads([trip_id], viewer_id=request.args.get('viewer_id', type=int))
+    if not payloads:
         return jsonify({'error': 'Trip not found'}), 404
-    return jsonify(trip.to_dict()), 200
+    return jsonify(payloads[0]), 200
 
 # ----------------------- City Routes -----------------------
-def parse_city_id(city_id):
-    try:
-        parts = city_id.split('_')
-        city = parts[0].replace('-', ' ').title()
-        country = '_'.join(parts[1:]).replace('-', ' ').title()
-        return city, country
-    except:
-        return None, None
+def backfill_trip_cities(batch_size=1000):
+    """Point trips without a city_id at their City row, one batch per commit.
+
+    Each batch only touches `batch_size` trip rows, so the trips table
+    stays writable while this runs.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Trip.id, Trip.city, Trip.country).filter(
+            Trip.city_id.is_(None), Trip.id > last_id
+        ).order_by(Trip.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        city_ids = {}
+        for trip_id, name, country in rows:
+            key = (name, country)
+            if key not in city_ids:
+                city_ids[key] = get_or_create_city(name, country).id
+            db.session.execute(update(Trip).where(Trip.id == trip_id).values(city_id=city_ids[key]))
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+@app.cli.command('backfill-trip-cities')
+@click.option('--batch-size', default=1000, show_default=True)
+def backfill_trip_cities_command(batch_size):
+    """Link trips written before trips.city_id existed to their city."""
+    click.echo(f"Linked {backfill_trip_cities(batch_size)} trip(s) to cities.")
 
 @app.route('/cities/<city_id>', methods=['GET'])
+@read_only
 def get_city(city_id):
-    city_name, country = parse_city_id(city_id)
-    if not city_name or not country:
-        return jsonify({"error": "Invalid city ID"}), 400
-    trip = Trip.query.filter_by(city=city_name, country=country).first()
-    if not trip:
+    city = City.query.filter_by(slug=city_id).first()
+    if not city:
         return jsonify({"error": "City not found"}), 404
     return jsonify({
-        "name": city_name,
-        "country": country
+        "name": city.name,
+        "country": city.country,
+        "latitude": city.latitude,
+        "longitude": city.longitude
     })
 
 @app.route('/cities/<city_id>/trips', methods=['GET'])
+@read_only
 def get_city_trips(city_id):
-    city_name, country = parse_city_id(city_id)
-    trips = Trip.query.filter_by(city=city_name, country=country).order_by(Trip.created_at.desc()).all()
-    return jsonify([trip.to_dict() for trip in trips])
+    viewer_id, compact = list_options()
+    key = f"city:{city_id}:trips"
+    trip_ids = response_cache.get_many([key]).get(key)
+    if trip_ids is None:
+        with primary_reads():
+            trip_ids = [row[0] for row in db.session.query(Trip.id).join(City, City.id == Trip.city_id).filter(
+                City.slug == city_id
+            ).order_by(Trip.created_at.desc())]
+        response_cache.set_many({key: trip_ids})
+    return jsonify(trip_payloads(trip_ids, viewer_id=viewer_id, compact=compact))
 
 @app.route('/cities/<city_id>/users', methods=['GET'])
+@read_only
 def get_city_users(city_id):
-    city_name, country = parse_city_id(city_id)
-    trips = Trip.query.filter_by(city=city_name, country=country).all()
-    user_ids = list({trip.user_id for trip in trips})
-    users = User.query.filter(User.id.in_(user_ids)).all()
-    return jsonify([{
-        "id": u.id,
-        "username": u.username,
-        "avatar_url": f"/uploads/user_{u.id}.png"
-    } for u in users])
-    
+    key = f"city:{city_id}:users"
+    users = response_cache.get_many([key]).get(key)
+    if users is None:
+        visitors = select(Trip.user_id).join(City, City.id == Trip.city_id).where(City.slug == city_id)
+        with primary_reads():
+            users = [{
+                "id": u.id,
+                "username": u.username,
+                "avatar_url": f"/uploads/user_{u.id}.png"
+            } for u in db.session.query(User.id, User.username).filter(User.id.in_(visitors))]
+        response_cache.set_many({key: users})
+    return jsonify(users)
+
+def geocode_cities(remote=None):
+    """Fill in coordinates of cities that have none. Returns (resolved, missing).
+
+    Cities are tried against the gazetteer, then `remote` if one is given.
+    Cities geocoded before the geohash column existed only get their
+    geohash. Cached payloads of trips in a resolved city are dropped so
+    the new coordinates show up before CACHE_TTL runs out.
+    """
+    resolved = missing = 0
+    for city in City.query.filter(or_(City.latitude.is_(None), City.geohash.is_(None))).order_by(City.id).all():
+        if city.latitude is not None:
+            city.set_coordinates((city.latitude, city.longitude))
+            db.session.commit()
+            continue
+        coords = gazetteer.lookup(city.name, city.country)
+        if coords is None and remote is not None:
+            coords = remote.lookup(city.name, city.country)
+        if coords is None:
+            missing += 1
+            continue
+        save_coordinates(city, coords)
+        resolved += 1
+    return resolved, missing
+
+def save_coordinates(city, coords):
+    city.set_coordinates(coords)
+    db.session.commit()
+    trip_ids = [row[0] for row in db.session.query(Trip.id).filter(Trip.city_id == city.id)]
+    response_cache.delete(*(f"trip:{trip_id}" for trip_id in trip_ids))
+
+remote_geocoder = RemoteGeocoder(app.config['GEOCODER_URL']) if app.config['GEOCODER_URL'] else None
+# One thread, so the geocoder's one-request-per-second limit holds per worker
+geocode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='geocode')
+geocode_queued = set()
+
+def queue_geocoding(city_id):
+    """Resolve a new city the gazetteer lacks through GEOCODER_URL, off the request thread.
+
+    Each worker tries a city once; `flask geocode-cities` retries the rest.
+    """
+    if remote_geocoder is None or city_id in geocode_queued:
+        return
+    geocode_queued.add(city_id)
+    geocode_pool.submit(geocode_city, city_id)
+
+def geocode_city(city_id):
+    with app.app_context():
+        city = db.session.get(City, city_id)
+        if city is None or city.latitude is not None:
+            return
+        coords = remote_geocoder.lookup(city.name, city.country)
+        if coords is not None:
+            save_coordinates(city, coords)
+
+@app.cli.command('geocode-cities')
+@click.option('--offline', is_flag=True, help="Only use the bundled gazetteer, even if GEOCODER_URL is set.")
+def geocode_cities_command(offline):
+    """Store coordinates and geohashes for cities that lack them."""
+    remote = None
+    if app.config['GEOCODER_URL'] and not offline:
+        remote = RemoteGeocoder(app.config['GEOCODER_URL'])
+    resolved, missing = geocode_cities(remote)
+    click.echo(f"Geocoded {resolved} city(ies); {missing} still without coordinates.")
+
+def load_city_counts():
+    # Runs on a background thread when the index reloads, so it brings its
+    # own context. The index is patched in place by add_trip / delete_trip;
+    # a reload from a lagging replica would undo that
+    with app.app_context(), primary_reads():
+        return db.session.query(Trip.city, Trip.country, func.count(Trip.id)).group_by(Trip.city, Trip.country).all()
+
+city_index = CityIndex(load_city_counts, max_age=app.config['CITY_INDEX_MAX_AGE'])
+
 @app.route('/cities/search', methods=['GET'])
+@read_only
 def search_cities():
     query = request.args.get('q', '').strip().lower()
     if not query:
         return jsonify([])
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
 
-    # Get all unique (city, country) pairs that match the query
-    trips = Trip.query.all()
-    matched = []
-    seen = set()
-    for trip in trips:
-        city_country = f"{trip.city}, {trip.country}".lower()
-        if query in city_country:
-            key = (trip.city.lower(), trip.country.lower())
-            if key not in seen:
-                seen.add(key)
-                matched.append({
-                    "city": trip.city,
-                    "country": trip.country,
-                    "city_id": f"{trip.city.lower().replace(' ', '-')}_{trip.country.lower().replace(' ', '-')}"
-                })
-
-    return jsonify(matched)
+    return jsonify([{
+        "city": match['city'],
+        "country": match['country'],
+        "city_id": city_slug(match['city'], match['country']),
+        "trip_count": match['count']
+    } for match in city_index.search(query, limit)])
+
+# ----------------------- Map Routes -----------------------
+MAP_CLUSTER_PREVIEW = 20
+
+def map_thumbnail(photos):
+    """URL of the thumbnail of a trip's first processed image, if it has one."""
+    for photo in photos or []:
+        if 'variants' in photo:
+            return f"http://localhost:5050{photo['variants']['thumb']['url']}"
+    return None
+
+@app.route('/map/<int:user_id>', methods=['GET'])
+@read_only
+def get_map(user_id):
+    """Map markers for a user's own trips and the trips of everyone they follow.
+
+    Optional ?bbox=west,south,east,north limits the markers to the visible
+    area. With ?zoom=<level>, markers closer together than a few dozen
+    pixels at that zoom are merged into clusters.
+    """
+    if not User.query.get(user_id):
+        return jsonify({'error': 'User not found'}), 404
+
+    query = db.session.query(
+        Trip.id, Trip.user_id, Trip.city, Trip.country, Trip.photos,
+        City.latitude, City.longitude, User.username
+    ).join(City, City.id == Trip.city_id).join(User, User.id == Trip.user_id).filter(
+        or_(Trip.user_id == user_id,
+            Trip.user_id.in_(select(Follow.followed_id).where(Follow.follower_id == user_id))),
+        City.latitude.isnot(None)
+    )
+
+    bbox = request.args.get('bbox')
+    if bbox:
+        bbox = parse_bbox(bbox)
+        if not bbox:
+            return jsonify({'error': 'Invalid bbox, expected west,south,east,north'}), 400
+        west, south, east, north = bbox
+        query = query.filter(City.latitude.between(south, north))
+        if west <= east:
+            query = query.filter(City.longitude.between(west, east))
+        else:
+            query = query.filter(or_(City.longitude >= west, City.longitude <= east))
+
+    markers = [{
+        'id': trip_id,
+        'user_id': owner_id,
+        'username': username,
+        'own': owner_id == user_id,
+        'city': city,
+        'country': country,
+        'latitude': latitude,
+        'longitude': longitude,
+        'thumbnail_url': map_thumbnail(photos)
+    } for trip_id, owner_id, city, country, photos, latitude, longitude, username
+        in query.order_by(Trip.created_at.desc(), Trip.id.desc())]
+
+    zoom = request.args.get('zoom', type=int)
+    if zoom is None:
+        return jsonify({'markers': markers, 'clusters': []})
+
+    zoom = min(max(zoom, 0), MAX_ZOOM)
+    singles, clusters = [], []
+    for latitude, longitude, members in cluster_points(
+        [(marker['latitude'], marker['longitude'], marker) for marker in markers], zoom
+    ):
+        if len(members) == 1:
+            singles.append(members[0])
+            continue
+        south, north = min(m['latitude'] for m in members), max(m['latitude'] for m in members)
+        west, east = min(m['longitude'] for m in members), max(m['longitude'] for m in members)
+        cluster = {
+            'latitude': latitude,
+            'longitude': longitude,
+            'count': len(members),
+            'own_count': sum(1 for marker in members if marker['own']),
+            'bounds': [[south, west], [north, east]]
+        }
+        # Trips in one city share its coordinates and never split apart by
+        # zooming in, so the newest of them are listed instead.
+        if south == north and west == east:
+            cluster['markers'] = members[:MAP_CLUSTER_PREVIEW]
+        clusters.append(cluster)
+    return jsonify({'markers': singles, 'clusters': clusters})
+
+NEARBY_DEFAULT_RADIUS_KM = 25
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_DEFAULT_LIMIT = 20
+NEARBY_MAX_LIMIT = 100
+NEARBY_CITY_BATCH = 50
+
+def nearby_cities(latitude, longitude, radius_km):
+    """[(distance_km, city_id)] of geocoded cities within radius_km, nearest first.
+
+    Candidates come from prefix range scans on the cities.geohash index,
+    one per covering cell; only they are measured exactly.
+    """
+    cells = covering_cells(latitude, longitude, radius_km)
+    rows = db.session.query(City.id, City.latitude, City.longitude).filter(or_(*(
+        and_(City.geohash >= cell, City.geohash < cell + GEOHASH_END) for cell in cells
+    ))).all()
+    distances = distances_km(latitude, longitude, [row[1] for row in rows], [row[2] for row in rows])
+    return sorted((distance, row[0]) for distance, row in zip(distances, rows) if distance <= radius_km)
+
+def nearest_trips(cities, limit):
+    """[(distance_km, trip_id)] of the `limit` nearest trips, newest first per city.
+
+    Cities are read in batches, nearest first. Each city contributes at
+    most the trips still needed through ix_trips_city_created, so a
+    popular city never has its whole history loaded.
+    """
+    distance_by_city = {city_id: distance for distance, city_id in cities}
+    found = []
+    for start in range(0, len(cities), NEARBY_CITY_BATCH):
+        remaining = limit - len(found)
+        if remaining <= 0:
+            break
+        per_city = [
+            select(Trip.id, Trip.city_id, Trip.created_at).where(Trip.city_id == city_id)
+            .order_by(Trip.created_at.desc(), Trip.id.desc()).limit(remaining).subquery()
+            for _, city_id in cities[start:start + NEARBY_CITY_BATCH]
+        ]
+        rows = db.session.execute(union_all(*(select(*sub.c) for sub in per_city))).all()
+        rows.sort(key=lambda row: (distance_by_city[row.city_id], -row.created_at.timestamp(), -row.id))
+        found.extend((distance_by_city[row.city_id], row.id) for row in rows[:remaining])
+    return found
+
+@app.route('/trips/nearby', methods=['GET'])
+@read_only
+def get_nearby_trips():
+    """Trips within ?radius= km (default 25) of ?lat=&lng=, nearest first."""
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    radius = request.args.get('radius', NEARBY_DEFAULT_RADIUS_KM, type=float)
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify({'error': 'lat and lng are required'}), 400
+    if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+        return jsonify({'error': f'radius must be between 0 and {NEARBY_MAX_RADIUS_KM} km'}), 400
+    limit = min(max(request.args.get('limit', NEARBY_DEFAULT_LIMIT, type=int), 1), NEARBY_MAX_LIMIT)
+    viewer_id, compact = list_options()
+
+    found = nearest_trips(nearby_cities(latitude, longitude, radius), limit)
+    payloads = trip_payloads([trip_id for _, trip_id in found], viewer_id=viewer_id, compact=compact)
+    distances = {trip_id: distance for distance, trip_id in found}
+    for data in payloads:
+        data['distance_km'] = round(distances[data['id']], 2)
+    return jsonify(payloads)
+
+# ----------------------- Upload Sessions -----------------------
+# Large or flaky uploads go through a session instead of the trip POST:
+#   POST /upload_sessions                  -> {"upload_id", "offset": 0}
+#   PUT  /upload_sessions/<id>?offset=N    raw bytes, appended at N
+#   GET  /upload_sessions/<id>             -> current offset, to resume
+#   POST /upload_sessions/<id>/finalize    -> blob filename and url; an
+#        optional {"sha256": <hex>} rejects the upload if the bytes differ
+# and the trip form then lists the finalized ids in `upload_ids`.
+
+def upload_session_dict(session):
+    return {
+        "upload_id": session.id,
+        "filename": session.filename,
+        "size": session.size,
+        "offset": session.offset,
+        "status": session.status
+    }
+
+@app.route('/upload_sessions', methods=['POST'])
+def create_upload_session():
+    data = request.get_json()
+    user_id = data.get('user_id')
+    filename = data.get('filename')
+    if not user_id or not filename:
+        return jsonify({"error": "Missing user_id or filename"}), 400
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=filename,
+        mimetype=data.get('mimetype'),
+        size=data.get('size'),
+        offset=0,
+        status='open'
+    )
+    blob_store.create_session(session.id)
+    db.session.add(session)
+    db.session.commit()
+    return jsonify(upload_session_dict(session)), 201
+
+@app.route('/upload_sessions/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(upload_session_dict(session))
+
+@app.route('/upload_sessions/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    if session.status != 'open':
+        return jsonify({"error": "Upload already finalized"}), 409
+    offset = request.args.get('offset', type=int)
+    # Re-sending the tail of an interrupted chunk is fine; gaps are not.
+    if offset is None or offset < 0 or offset > session.offset:
+        return jsonify({"error": "Offset does not match", "offset": session.offset}), 409
+
+    written = blob_store.write_chunk(upload_id, offset, request.stream)
+    new_offset = offset + written
+    if session.size is not None and new_offset > session.size:
+        return jsonify({"error": "Upload is larger than declared", "offset": session.offset}), 400
+    updated = db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.offset == session.offset)
+        .values(offset=new_offset, updated_at=datetime.utcnow())
+    )
+    db.session.commit()
+    if not updated.rowcount:
+        return jsonify({"error": "Concurrent write to upload"}), 409
+    return jsonify({"upload_id": upload_id, "offset": new_offset})
+
+@app.route('/upload_sessions/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_session(upload_id):
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    if session.status == 'open':
+        if session.size is not None and session.offset != session.size:
+            return jsonify({"error": "Upload incomplete", "offset": session.offset}), 409
+        temp_path, filename, size = blob_store.finalize_session(upload_id, session.filename, session.offset)
+        expected = ((request.get_json(silent=True) or {}).get('sha256') or '').lower()
+        if expected and os.path.splitext(filename)[0] != expected:
+            # The stored bytes can't be trusted, so the client starts over
+            session.offset = 0
+            db.session.commit()
+            return jsonify({"error": "Checksum does not match", "offset": 0}), 409
+        acquire_blob(filename, size)
+        blob_store.commit(temp_path, filename)
+        session.blob_filename = filename
+        session.status = 'finalized'
+        db.session.commit()
+    return jsonify({
+        **upload_session_dict(session),
+        "blob_filename": session.blob_filename,
+        "url": f"/uploads/{session.blob_filename}"
+    })
+
+@app.cli.command('purge-upload-sessions')
+@click.option('--max-age-hours', default=24, show_default=True)
+def purge_upload_sessions_command(max_age_hours):
+    """Delete upload sessions that were never attached to a trip."""
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    released = []
+    for session in stale:
+        if session.status == 'open':
+            blob_store.discard(blob_store.session_path(session.id))
+        elif release_blob(session.blob_filename):
+            released.append((session.blob_filename, [session.blob_filename]))
+        db.session.delete(session)
+    db.session.commit()
+    remove_released_blobs(released)
+    click.echo(f"Purged {len(stale)} upload session(s).")
 
 # ----------------------- Upload Access -----------------------
+# Blob names are a SHA-256 digest (plus variant suffixes), so their bytes
+# never change: browsers may cache them forever and the name is the ETag.
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}(\.[A-Za-z0-9]+)+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+AVATAR_NAME = re.compile(r'^user_\d+\.png$')
+# <digest>.<variant>.<ext>, written by process_trip_photos
+RENDITION_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z]+\.[A-Za-z0-9]+$')
+
+def is_public_upload(filename):
+    """Whether /uploads may serve `filename`.
+
+    Image originals keep the uploader's EXIF, GPS tags included, so the
+    only images served are avatars and the renditions made from trip
+    photos. A type Python can't name may be an image too (HEIC, say).
+    """
+    if AVATAR_NAME.match(filename) or RENDITION_NAME.match(filename):
+        return True
+    mimetype = mimetypes.guess_type(filename)[0]
+    return mimetype is not None and not is_image(mimetype)
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    if not is_public_upload(filename):
+        return jsonify({"error": "File not found"}), 404
+    immutable = bool(CONTENT_ADDRESSED_NAME.match(filename))
+    if immutable and request.if_none_match.contains(filename):
+        response = app.response_class(status=304)
+        response.set_etag(filename)
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
+    if app.config['UPLOADS_ACCEL_REDIRECT_PREFIX']:
+        # The front proxy (nginx internal location) streams the bytes and
+        # answers range requests itself.
+        if not safe_join(app.config['UPLOAD_FOLDER'], filename) or not os.path.isfile(blob_store.path(filename)):
+            return jsonify({"error": "File not found"}), 404
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = app.config['UPLOADS_ACCEL_REDIRECT_PREFIX'] + quote(filename)
+        if immutable:
+            response.set_etag(filename)
+    else:
+        # conditional=True answers If-None-Match / If-Modified-Since with a
+        # 304 and serves Range requests as 206. With USE_X_SENDFILE the body
+        # is handed to the proxy instead of streamed by this worker.
+        response = send_from_directory(
+            app.config['UPLOAD_FOLDER'], filename,
+            conditional=True,
+            etag=filename if immutable else True,
+            max_age=IMMUTABLE_MAX_AGE if immutable else 0
+        )
+
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Avatars are overwritten in place, so always revalidate them.
+        response.cache_control.no_cache = True
+    return response
 
 # ----------------------- Misc -----------------------
 @app.route('/ping')
 def ping():
     return jsonify({"message": "pong!"})
 
-# ----------------------- DB Init -----------------------
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(response_cache.info())
+
+@app.route('/follow-graph/stats')
+def follow_graph_stats():
+    return jsonify(follow_graph.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request metrics in the Prometheus text format. Keep it off the public internet."""
+    return app.response_class(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# ----------------------- App Startup -----------------------
+# The schema is owned by the migrations: run `flask db upgrade` before
+# starting a server. Nothing below creates tables.
+_started = False
+
+def create_app():
+    """Return the application with its in-memory indexes loaded.
+
+    Routes are registered on the module-level app as this file is
+    imported; this finishes startup once per process. serve.py calls it
+    in the master before forking, so every worker starts with the city
+    index and follow graph already built, in memory shared copy-on-write.
+    """
+    global _started
+    if not _started:
+        with app.app_context():
+            city_index.build()
+            follow_graph.build()
+        _started = True
+    return app
+
 RESET_DB_ON_START = False
 if __name__ == '__main__':
-    with app.app_context():
-        if RESET_DB_ON_START:
+    # Development server. Production: python3 serve.py
+    if RESET_DB_ON_START:
+        with app.app_context():
             db.drop_all()
             db.create_all()
             print("Database schema reset.")
-        else:
-            db.create_all()
-    app.run(debug=True, host="0.0.0.0", port=5050)
+    # FLASK_DEBUG=1 turns on the reloader and debugger
+    create_app().run(host="0.0.0.0", port=5050)
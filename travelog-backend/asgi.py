@@ -0,0 +1,293 @@
+"""ASGI entry point serving the same routes as app.py.
+
+Run from travelog-backend/:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5050
+
+Every request is matched against the Flask URL map and takes one of two
+paths:
+
+* Endpoints in ASYNC_ENDPOINTS (feed, trip and city reads) run on the
+  event loop. The unchanged Flask view executes inside SQLAlchemy's
+  run_sync, with db.session bound to a connection of the async engine
+  (asyncpg or aiosqlite). While a query is in flight the loop serves
+  other requests, so a slow database costs a coroutine, not a thread.
+* Everything else runs through the WSGI app on a pool of
+  ASGI_WSGI_THREADS threads, exactly as under app.run(). File bodies
+  from send_file (the /uploads route) are not read on that thread:
+  they are handed back to the loop and streamed with reads done off
+  the loop, so a slow client holds neither a thread nor the loop.
+
+The views themselves are synchronous code. Anything they do besides
+database access (the response cache, the in-memory indexes) runs on the
+loop, so only views whose other work is in memory belong in
+ASYNC_ENDPOINTS. A Redis cache backend blocks the loop for one round
+trip per lookup.
+
+The async routes always read from the primary; DATABASE_REPLICA_URLS
+only applies to the routes that go through the WSGI app.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import sys
+from tempfile import SpooledTemporaryFile
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+
+from app import app as flask_app, create_app, db
+from storage import CHUNK_SIZE
+
+# Views run on the event loop with the async driver. They only read from
+# the database and from in-memory state.
+ASYNC_ENDPOINTS = {
+    'get_following_feed',
+    'get_user_trips',
+    'get_trip',
+    'get_trip_comments',
+    'get_city',
+    'get_city_trips',
+    'get_city_users',
+    'search_cities',
+    'get_nearby_trips',
+    'get_map',
+}
+
+# Request bodies past this size are spooled to disk, as asgiref does
+BODY_SPOOL_SIZE = 64 * 1024
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url):
+    """Swap the driver of a sync database URL for its asyncio counterpart."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+async_engine = create_async_engine(
+    flask_app.config['ASYNC_DATABASE_URL'] or async_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI']),
+    pool_size=flask_app.config['ASGI_DB_POOL_SIZE'],
+    max_overflow=0,
+    pool_recycle=flask_app.config['DB_POOL_RECYCLE'],
+    pool_pre_ping=flask_app.config['DB_POOL_PRE_PING']
+)
+# Requests past the pool size wait here, on the loop, instead of timing
+# out in the pool after pool_timeout seconds with a 500.
+db_slots = asyncio.Semaphore(flask_app.config['ASGI_DB_POOL_SIZE'])
+wsgi_pool = ThreadPoolExecutor(max_workers=flask_app.config['ASGI_WSGI_THREADS'], thread_name_prefix='wsgi')
+
+
+class AsyncFileWrapper:
+    """wsgi.file_wrapper that leaves the reading to the event loop."""
+
+    def __init__(self, file, block_size=CHUNK_SIZE):
+        self.file = file
+        self.block_size = block_size
+
+    def __iter__(self):
+        # Only reached if a middleware wraps the response; read normally then
+        while True:
+            chunk = self.file.read(self.block_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+def build_environ(scope, body, size):
+    """Translate an ASGI HTTP scope and its buffered body into a WSGI environ."""
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': AsyncFileWrapper,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_LENGTH' or name == 'CONTENT_TYPE':
+            environ[name] = value
+            continue
+        if name == 'TRANSFER_ENCODING':
+            # The server already took the chunks apart
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # The whole body is buffered, so its length is known even when it came
+    # chunked; without one Werkzeug would read a chunked body as empty, and
+    # the length is what it checks against MAX_CONTENT_LENGTH.
+    environ['CONTENT_LENGTH'] = str(size)
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+
+def call_wsgi(environ, app_iter_handler):
+    """Run the WSGI app; returns (status, headers, body or AsyncFileWrapper)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    app_iter = app_iter_handler(environ, start_response)
+    if isinstance(app_iter, AsyncFileWrapper):
+        return started['status'], started['headers'], app_iter
+    try:
+        body = b''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return started['status'], started['headers'], body
+
+
+def dispatch_with_session(session, environ):
+    """Flask's wsgi_app, with db.session set to the async engine's session.
+
+    Runs inside AsyncSession.run_sync, so every query the view makes is
+    awaited on the event loop instead of blocking a thread.
+    """
+    def handler(environ, start_response):
+        ctx = flask_app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                # Scoped per app context, which ctx.push() just created
+                db.session.registry.set(session)
+                response = flask_app.full_dispatch_request()
+            except Exception as e:
+                error = e
+                response = flask_app.handle_exception(e)
+            return response(environ, start_response)
+        finally:
+            if error is not None and flask_app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    return call_wsgi(environ, handler)
+
+
+async def read_body(receive, limit=None):
+    """Buffer the request body. Returns (body, size), or None if the client left.
+
+    Reading stops as soon as the body is larger than `limit`. Its size is
+    then past MAX_CONTENT_LENGTH, so Flask answers 413 without reading it.
+    """
+    body = SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        chunk = message.get('body', b'')
+        body.write(chunk)
+        size += len(chunk)
+        if not message.get('more_body') or (limit is not None and size > limit):
+            break
+    body.seek(0)
+    return body, size
+
+
+def async_endpoint(environ):
+    try:
+        endpoint, _ = flask_app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        # Flask answers 404 / 405 / redirects itself on the WSGI path
+        return False
+    return endpoint in ASYNC_ENDPOINTS
+
+
+async def send_response(send, status, headers, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+    })
+    if not isinstance(body, AsyncFileWrapper):
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, body.file.read, body.block_size)
+            if not chunk:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await loop.run_in_executor(None, body.close)
+
+
+def warm_up():
+    # Built up front so no request ever loads them on the event loop. A
+    # no-op in workers forked by serve.py, which inherit the master's copy.
+    create_app()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await asyncio.get_running_loop().run_in_executor(wsgi_pool, warm_up)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_engine.dispose()
+            wsgi_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    buffered = await read_body(receive, flask_app.config['MAX_CONTENT_LENGTH'])
+    if buffered is None:
+        return
+    body, size = buffered
+    try:
+        environ = build_environ(scope, body, size)
+        if async_endpoint(environ):
+            async with db_slots, AsyncSession(async_engine) as session:
+                status, headers, payload = await session.run_sync(dispatch_with_session, environ)
+        else:
+            loop = asyncio.get_running_loop()
+            status, headers, payload = await loop.run_in_executor(wsgi_pool, call_wsgi, environ, flask_app.wsgi_app)
+    finally:
+        body.close()
+    await send_response(send, status, headers, payload)
@@ -0,0 +1,269 @@
+"""Compare the ways of serving the backend under load.
+
+Run from travelog-backend/:
+
+    python benchmarks/asgi_vs_wsgi.py --clients 1000 --seconds 20
+
+A throwaway SQLite database is seeded with users, follows and trips
+(pass --database-url to use Postgres instead). Each mode is then started
+as a server of its own:
+
+    wsgi        python3 app.py (Werkzeug's threaded development server)
+    asgi        uvicorn asgi:application, one process
+    serve       python3 serve.py, gthread workers (--workers, --threads)
+    serve-asgi  python3 serve.py with WEB_WORKER_CLASS=asgi
+
+--clients keep-alive connections request a mix of feed, trip and city
+pages for --seconds seconds. The script reports requests per second,
+latency percentiles, failed requests, and the peak threads and memory of
+the server's process tree. Memory is PSS, so pages that forked workers
+share with the master are counted once.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+WSGI_SERVER = """
+import app
+app.create_app().run(host='127.0.0.1', port={port})
+"""
+
+CITIES = [('Prague', 'Czech Republic'), ('Vienna', 'Austria'), ('Berlin', 'Germany'),
+          ('Paris', 'France'), ('Rome', 'Italy'), ('Lisbon', 'Portugal')]
+
+
+def seed(users, trips, follows_per_user, rnd):
+    import app as travelog
+
+    with travelog.app.app_context():
+        travelog.db.create_all()
+        session = travelog.db.session
+        session.execute(travelog.User.__table__.insert(), [
+            {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': 'x'}
+            for i in range(users)
+        ])
+        cities = [travelog.get_or_create_city(city, country) for city, country in CITIES]
+        session.flush()
+        follows = {(follower, followed) for follower in range(1, users + 1)
+                   for followed in rnd.sample(range(1, users + 1), follows_per_user) if followed != follower}
+        session.execute(travelog.Follow.__table__.insert(), [
+            {'follower_id': follower, 'followed_id': followed} for follower, followed in follows
+        ])
+        started = datetime(2024, 1, 1)
+        rows = []
+        for n in range(trips):
+            city = rnd.choice(cities)
+            rows.append({
+                'user_id': rnd.randint(1, users), 'city': city.name, 'country': city.country, 'city_id': city.id,
+                'start_date': date(2024, 1, 1), 'end_date': date(2024, 1, 5), 'photos': [],
+                'accommodation': 'Hostel', 'other_notes': 'Benchmark trip ' * 8,
+                'created_at': started + timedelta(minutes=n),
+            })
+        session.execute(travelog.Trip.__table__.insert(), rows)
+        travelog.reconcile_counters()
+        session.commit()
+        for user_id in range(1, users + 1):
+            travelog.rebuild_timeline(user_id)
+        session.commit()
+        return [city.slug for city in cities]
+
+
+def request_paths(users, trips, slugs, rnd, count=5000):
+    paths = []
+    for _ in range(count):
+        kind = rnd.random()
+        if kind < 0.4:
+            paths.append(f'/feed/{rnd.randint(1, users)}?limit=20&compact=1')
+        elif kind < 0.7:
+            paths.append(f'/trip/{rnd.randint(1, trips)}')
+        elif kind < 0.9:
+            paths.append(f'/trips/{rnd.randint(1, users)}?limit=10&compact=1')
+        else:
+            paths.append(f'/cities/{rnd.choice(slugs)}')
+    return paths
+
+
+async def fetch(reader, writer, path):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n'.encode())
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    closing = b'connection: close' in head.lower()
+    return status, closing
+
+
+async def client(port, paths, deadline, latencies, counts):
+    offset = random.randrange(len(paths))
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=1 << 22)
+            path = paths[offset % len(paths)]
+            offset += 1
+            started = time.perf_counter()
+            status, closing = await fetch(reader, writer, path)
+            latencies.append(time.perf_counter() - started)
+            counts['ok' if status == 200 else 'failed'] += 1
+            if closing:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError):
+            counts['failed'] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def sample_usage(pid, deadline, peak):
+    while time.perf_counter() < deadline:
+        threads, pss = process_usage(pid)
+        peak['threads'] = max(peak['threads'], threads)
+        peak['pss'] = max(peak['pss'], pss)
+        await asyncio.sleep(0.5)
+
+
+async def load(port, pid, clients, seconds, paths):
+    latencies, counts, peak = [], {'ok': 0, 'failed': 0}, {'threads': 0, 'pss': 0}
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(sample_usage(pid, deadline, peak),
+                         *(client(port, paths, deadline, latencies, counts) for _ in range(clients)))
+    return latencies, counts, time.perf_counter() - started, peak
+
+
+def wait_until_up(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with {process.returncode}')
+        try:
+            asyncio.run(asyncio.wait_for(ping(port), 1))
+            return
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+async def ping(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    await fetch(reader, writer, '/ping')
+    writer.close()
+
+
+def read_fields(path, names):
+    fields = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in names:
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return fields
+
+
+def process_tree(pid):
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            parent = read_fields(f'/proc/{entry}/status', ('PPid',)).get('PPid')
+            children.setdefault(parent, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def process_usage(pid):
+    """(threads, proportional set size in MiB) of a process and its children."""
+    threads = pss = 0
+    for member in process_tree(pid):
+        threads += read_fields(f'/proc/{member}/status', ('Threads',)).get('Threads', 0)
+        pss += read_fields(f'/proc/{member}/smaps_rollup', ('Pss',)).get('Pss', 0)
+    return threads, pss // 1024
+
+
+def run_mode(mode, port, args, paths, env):
+    if mode == 'wsgi':
+        command = [sys.executable, '-c', WSGI_SERVER.format(port=port)]
+    elif mode == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(port),
+                   '--backlog', str(max(2048, args.clients)), '--log-level', 'warning', '--no-access-log']
+    else:
+        command = [sys.executable, 'serve.py']
+        env = dict(env, WEB_BIND=f'127.0.0.1:{port}', WEB_WORKERS=str(args.workers), WEB_THREADS=str(args.threads),
+                   WEB_WORKER_CLASS='asgi' if mode == 'serve-asgi' else 'gthread')
+    process = subprocess.Popen(command, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port, process)
+        latencies, counts, elapsed, peak = asyncio.run(load(port, process.pid, args.clients, args.seconds, paths))
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float('nan')
+    total = counts['ok'] + counts['failed']
+    print(f"{mode:<10} req/s={counts['ok'] / elapsed:8.1f}  p50={pick(0.50):7.1f}ms  p99={pick(0.99):8.1f}ms  "
+          f"max={pick(1.0):8.1f}ms  mean={statistics.fmean(latencies) * 1000 if latencies else 0:7.1f}ms  "
+          f"failed={counts['failed'] / (total or 1):.1%}  peak threads={peak['threads']}  pss={peak['pss']}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000, help="concurrent keep-alive connections")
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--trips', type=int, default=20000)
+    parser.add_argument('--follows', type=int, default=50, help="accounts each user follows")
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi', 'serve', 'serve-asgi'],
+                        choices=['wsgi', 'asgi', 'serve', 'serve-asgi'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="serve.py worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="threads per gthread worker")
+    parser.add_argument('--port', type=int, default=5151)
+    parser.add_argument('--database-url', help="an empty database to seed; defaults to a temporary SQLite file")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-of-32-bytes-or-more')
+    env = dict(os.environ, PASSWORD_HASH_WORKERS='0', FEED_LEGACY_UNPAGINATED='false')
+
+    rnd = random.Random(args.seed)
+    slugs = seed(args.users, args.trips, min(args.follows, args.users), rnd)
+    paths = request_paths(args.users, args.trips, slugs, rnd)
+    print(f"clients={args.clients} seconds={args.seconds} users={args.users} trips={args.trips} "
+          f"cores={os.cpu_count()} db={database_url.split(':', 1)[0]}")
+    for n, mode in enumerate(args.modes):
+        run_mode(mode, args.port + n, args, paths, env)
+
+
+if __name__ == '__main__':
+    main()
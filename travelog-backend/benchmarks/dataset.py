@@ -0,0 +1,336 @@
+"""Fill a database with a seeded, realistic synthetic dataset.
+
+Run from travelog-backend/, against an empty database:
+
+    flask db upgrade
+    python benchmarks/dataset.py --size 1m
+
+The database is DATABASE_URL (or --database-url). A database without
+tables gets them from the models; stamp it with `flask db stamp head` if
+it is kept around. Photos are written to ./uploads, like the app's own.
+
+--size picks a preset by total rows across users, follows, trips, likes
+and comments (timeline entries come on top):
+
+    10k   250 users       1.5k trips
+    1m    20k users       150k trips
+    10m   200k users      1.5M trips
+
+The same --seed always gives the same rows:
+
+* follows: how many accounts a user follows is heavy-tailed, and who
+  they follow is Zipf-distributed over a shuffled popularity ranking,
+  so a few accounts have most of the followers (at the larger sizes,
+  more than TIMELINE_FANOUT_LIMIT, which exercises the pull path of feeds);
+* trips: in cities of data/gazetteer.csv, popular cities more often,
+  with creation times spread over two years in id order;
+* likes and comments: skewed toward a heavy tail of popular trips, and
+  toward trips of authors with many followers;
+* photos: --photos distinct placeholder JPEGs, stored as content-addressed
+  blobs with their resized variants, shared by 0-4 photos per trip.
+
+Every user's password is "benchmark-password".
+"""
+import argparse
+from array import array
+from bisect import bisect
+import csv
+from datetime import datetime, timedelta
+import hashlib
+import io
+import itertools
+import math
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import insert, select, update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo import geohash  # noqa: E402
+
+SIZES = {
+    '10k': {'users': 250, 'follows': 4_000, 'trips': 1_500, 'likes': 3_000, 'comments': 1_250},
+    '1m': {'users': 20_000, 'follows': 400_000, 'trips': 150_000, 'likes': 300_000, 'comments': 130_000},
+    '10m': {'users': 200_000, 'follows': 4_000_000, 'trips': 1_500_000, 'likes': 3_000_000, 'comments': 1_300_000},
+}
+PASSWORD = 'benchmark-password'
+BATCH_SIZE = 10_000
+PHOTO_SIZE = (1600, 1200)
+
+FIRST_NAMES = ['anna', 'jakub', 'eva', 'tomas', 'lucie', 'petr', 'klara', 'martin', 'sofia', 'lukas',
+               'emma', 'noah', 'mia', 'liam', 'zoe', 'adam', 'ella', 'jan', 'nina', 'david',
+               'sara', 'filip', 'lea', 'marek', 'julia', 'ondrej', 'tereza', 'max', 'ines', 'hugo']
+LAST_NAMES = ['novak', 'svoboda', 'dvorak', 'cerny', 'prochazka', 'kucera', 'vesely', 'horak',
+              'smith', 'garcia', 'muller', 'rossi', 'dubois', 'silva', 'jansen', 'kowalski']
+ACCOMMODATIONS = ['Hostel', 'Hotel', 'Airbnb', 'Friends', 'Camping', 'Guesthouse', None]
+NOTES = [
+    "Walked everywhere, the old town is small enough.",
+    "Go early, the main sights are packed by ten.",
+    "Public transport was cheap and easy to figure out.",
+    "Rained for two days, the museums saved us.",
+    "Would go back in autumn, fewer tourists.",
+    "Day trip to the countryside was the highlight.",
+]
+COMMENTS = ['Looks amazing!', 'Adding this to my list.', 'How many days would you recommend?',
+            'Was it expensive?', 'Great photos', 'I was there last year!', 'Which month did you go?']
+
+
+def zipf_sampler(n, exponent, rnd):
+    """Draw 0..n-1 with P(rank k) ~ 1 / (k + 1) ** exponent."""
+    cumulative = list(itertools.accumulate(1 / (k + 1) ** exponent for k in range(n)))
+    total = cumulative[-1]
+    return lambda: bisect(cumulative, rnd.random() * total)
+
+
+def spread(total, weights, rnd, cap=None):
+    """Split `total` into integers proportional to weights (stochastic rounding)."""
+    scale = total / (sum(weights) or 1)
+    counts = array('i')
+    for weight in weights:
+        share = weight * scale
+        count = int(share) + (rnd.random() < share - int(share))
+        counts.append(min(count, cap) if cap is not None else count)
+    return counts
+
+
+def insert_batched(session, table, rows):
+    """Insert an iterable of row dicts, committing every BATCH_SIZE rows."""
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            session.execute(table.insert(), batch)
+            session.commit()
+            inserted += len(batch)
+            batch = []
+    if batch:
+        session.execute(table.insert(), batch)
+        session.commit()
+        inserted += len(batch)
+    return inserted
+
+
+def load_cities(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row['city'], row['country'], float(row['latitude']), float(row['longitude'])) for row in csv.DictReader(f)]
+
+
+def placeholder_photos(travelog, count, rnd):
+    """Write `count` distinct placeholder JPEGs into the upload folder as blobs.
+
+    Returns a Trip.photos entry for each, with its variants already made.
+    """
+    from PIL import Image, ImageDraw
+    from images import make_variants
+
+    photos = []
+    for n in range(count):
+        image = Image.new('RGB', PHOTO_SIZE, tuple(rnd.randrange(40, 216) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = rnd.randrange(PHOTO_SIZE[0]), rnd.randrange(PHOTO_SIZE[1])
+            radius = rnd.randrange(40, 300)
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                         fill=tuple(rnd.randrange(256) for _ in range(3)))
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=85)
+        data = out.getvalue()
+
+        filename = f"{hashlib.sha256(data).hexdigest()}.jpg"
+        with open(travelog.blob_store.path(filename), 'wb') as f:
+            f.write(data)
+        variants = make_variants(travelog.app.config['UPLOAD_FOLDER'], filename)
+        photos.append({
+            'filename': filename,
+            'original_filename': f'placeholder-{n + 1}.jpg',
+            'url': f"/uploads/{variants['full']['filename']}",
+            'mimetype': 'image/jpeg',
+            'status': 'ready',
+            'variants': {name: dict(variant, url=f"/uploads/{variant['filename']}") for name, variant in variants.items()},
+            'size': len(data),
+        })
+    return photos
+
+
+def generate(counts, seed=1, photos=24, echo=print):
+    """Fill the app's (empty) database. Returns {table: rows written}."""
+    import app as travelog
+    from passwords import PasswordHasher
+
+    rnd = random.Random(seed)
+    session = travelog.db.session
+    written = {}
+
+    def step(name, fn):
+        started = time.perf_counter()
+        written[name] = fn()
+        echo(f"{name:<17} {written[name]:>10} rows  {time.perf_counter() - started:7.1f} s")
+
+    user_count = counts['users']
+    # Popularity rank -> user id, so the most followed accounts are not simply the oldest
+    by_rank = list(range(1, user_count + 1))
+    rnd.shuffle(by_rank)
+
+    # ----- users -----
+    out_degree = spread(counts['follows'], [rnd.paretovariate(1.3) for _ in range(user_count)], rnd, cap=user_count // 2)
+    trips_per_user = spread(counts['trips'], [rnd.paretovariate(1.5) for _ in range(user_count)], rnd)
+    password = PasswordHasher(method=travelog.app.config['PASSWORD_HASH_METHOD'], workers=0).hash(PASSWORD)
+
+    def users():
+        for n in range(user_count):
+            name = f"{FIRST_NAMES[n % len(FIRST_NAMES)]}{LAST_NAMES[n // len(FIRST_NAMES) % len(LAST_NAMES)]}{n + 1}"
+            yield {'username': name, 'email': f'{name}@example.com', 'password': password,
+                   'follower_count': 0, 'following_count': 0, 'trip_count': trips_per_user[n]}
+
+    step('users', lambda: insert_batched(session, travelog.User.__table__, users()))
+
+    # ----- follows -----
+    followers = array('i', bytes(4 * (user_count + 1)))
+    following = array('i', bytes(4 * (user_count + 1)))
+    popular = zipf_sampler(user_count, 1.0, rnd)
+
+    def follows():
+        for follower in range(1, user_count + 1):
+            wanted = out_degree[follower - 1]
+            targets = set()
+            attempts = 0
+            while len(targets) < wanted and attempts < 4 * wanted:
+                attempts += 1
+                target = by_rank[popular()]
+                if target != follower:
+                    targets.add(target)
+            following[follower] = len(targets)
+            for target in targets:
+                followers[target] += 1
+                yield {'follower_id': follower, 'followed_id': target}
+
+    step('follows', lambda: insert_batched(session, travelog.Follow.__table__, follows()))
+    session.execute(update(travelog.User), [
+        {'id': user_id, 'follower_count': followers[user_id], 'following_count': following[user_id],
+         'pull_on_read': followers[user_id] >= travelog.app.config['TIMELINE_FANOUT_LIMIT']}
+        for user_id in range(1, user_count + 1) if followers[user_id] or following[user_id]
+    ])
+    session.commit()
+
+    # ----- cities and photos -----
+    gazetteer = load_cities(travelog.app.config['GAZETTEER_PATH'])
+    rnd.shuffle(gazetteer)
+
+    def cities():
+        for name, country, latitude, longitude in gazetteer:
+            yield {'name': name, 'country': country, 'slug': travelog.city_slug(name, country),
+                   'latitude': latitude, 'longitude': longitude, 'geohash': geohash(latitude, longitude)}
+
+    step('cities', lambda: insert_batched(session, travelog.City.__table__, cities()))
+    city_ids = dict(session.query(travelog.City.slug, travelog.City.id))
+    pool = []
+
+    def make_photos():
+        pool.extend(placeholder_photos(travelog, photos, rnd))
+        return len(pool)
+
+    step('photos', make_photos)
+    photo_refs = [0] * len(pool)
+
+    # ----- trips -----
+    trip_count = sum(trips_per_user)
+    authors = array('i', (user_id for user_id in range(1, user_count + 1) for _ in range(trips_per_user[user_id - 1])))
+    rnd.shuffle(authors)
+    # Likes and comments go mostly to a heavy tail of trips, and more to authors with many followers
+    appeal = [rnd.paretovariate(1.1) * (1 + math.log1p(followers[author])) for author in authors]
+    likes = spread(counts['likes'], appeal, rnd, cap=user_count)
+    comments = spread(counts['comments'], [weight * rnd.uniform(0.5, 1.5) for weight in appeal], rnd)
+    city_of = zipf_sampler(len(gazetteer), 1.1, rnd)
+    started = datetime(2024, 1, 1)
+    step_seconds = 2 * 365 * 24 * 3600 / max(trip_count, 1)
+    created = [started + timedelta(seconds=n * step_seconds) for n in range(trip_count)]
+
+    def trips():
+        for n, author in enumerate(authors):
+            name, country, _, _ = gazetteer[city_of()]
+            end = (created[n] - timedelta(days=rnd.randrange(0, 60))).date()
+            chosen = []
+            for _ in range(rnd.choice((0, 0, 1, 1, 2, 3, 4)) if pool else 0):
+                index = rnd.randrange(len(pool))
+                photo_refs[index] += 1
+                chosen.append({key: value for key, value in pool[index].items() if key != 'size'})
+            yield {
+                'user_id': author, 'city': name, 'country': country, 'city_id': city_ids[travelog.city_slug(name, country)],
+                'start_date': end - timedelta(days=rnd.randrange(1, 15)), 'end_date': end,
+                'accommodation': rnd.choice(ACCOMMODATIONS),
+                'favorite_restaurants': f"A small place near the centre of {name}",
+                'favorite_attractions': f"The old town of {name}",
+                'other_notes': ' '.join(rnd.sample(NOTES, 2)),
+                'photos': chosen, 'like_count': likes[n], 'comment_count': comments[n], 'created_at': created[n],
+            }
+
+    step('trips', lambda: insert_batched(session, travelog.Trip.__table__, trips()))
+
+    # ----- likes and comments -----
+    def like_rows():
+        for n, count in enumerate(likes):
+            for user_id in rnd.sample(range(1, user_count + 1), count):
+                yield {'trip_id': n + 1, 'user_id': user_id}
+
+    def comment_rows():
+        for n, count in enumerate(comments):
+            for _ in range(count):
+                yield {'trip_id': n + 1, 'user_id': rnd.randint(1, user_count), 'content': rnd.choice(COMMENTS),
+                       'created_at': created[n] + timedelta(minutes=rnd.randrange(1, 60 * 24 * 30))}
+
+    step('likes', lambda: insert_batched(session, travelog.Like.__table__, like_rows()))
+    step('comments', lambda: insert_batched(session, travelog.Comment.__table__, comment_rows()))
+    step('blobs', lambda: insert_batched(session, travelog.Blob.__table__, (
+        {'filename': photo['filename'], 'size': photo['size'], 'ref_count': refs}
+        for photo, refs in zip(pool, photo_refs) if refs
+    )))
+
+    # ----- timelines: the fan-out add_trip would have done -----
+    def timelines():
+        Follow, Trip, User = travelog.Follow, travelog.Trip, travelog.User
+        fanned_out = select(Follow.follower_id, Trip.id, Trip.user_id, Trip.created_at).join(
+            Trip, Trip.user_id == Follow.followed_id
+        ).join(User, User.id == Trip.user_id).where(
+            ~User.pull_on_read
+        )
+        result = session.execute(insert(travelog.TimelineEntry).from_select(
+            ['user_id', 'trip_id', 'author_id', 'created_at'], fanned_out
+        ))
+        session.commit()
+        return result.rowcount
+
+    step('timeline_entries', timelines)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=SIZES, default='10k')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--photos', type=int, default=24, help="distinct placeholder images (0 for trips without photos)")
+    parser.add_argument('--database-url', help="defaults to DATABASE_URL")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-of-32-bytes-or-more')
+    import app as travelog
+    from sqlalchemy import inspect
+
+    with travelog.app.app_context():
+        if not inspect(travelog.db.engine).has_table('users'):
+            travelog.db.create_all()
+        elif travelog.db.session.query(travelog.User.id).first():
+            sys.exit("The database already has users; point --database-url at an empty one.")
+        print(f"size={args.size} seed={args.seed} db={travelog.db.engine.url.get_backend_name()}")
+        started = time.perf_counter()
+        written = generate(SIZES[args.size], seed=args.seed, photos=args.photos)
+        print(f"{'total':<17} {sum(written.values()):>10} rows  {time.perf_counter() - started:7.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+"""Benchmark every route of app.py and write the results as JSON.
+
+Run from travelog-backend/:
+
+    python benchmarks/endpoints.py --size 10k --output before.json
+    # ... change something ...
+    python benchmarks/endpoints.py --size 10k --output after.json --compare before.json
+
+Without --database-url a throwaway SQLite database and upload folder are
+filled by benchmarks/dataset.py (--size, --seed). With --database-url the
+routes run against a database filled earlier, e.g. on Postgres; the
+write routes change it, so use a copy. Run from the folder whose uploads/
+holds that dataset's photos.
+
+Requests go through Flask's test client in this process, one at a time,
+so the numbers are the cost of the route itself, without a web server;
+benchmarks/asgi_vs_wsgi.py measures serving under concurrency. Each case
+runs --requests times with ids drawn from the dataset, the same ids on
+every run with the same --seed. Write routes run after the reads, and
+undo routes (unfollow, unlike, delete) consume what the matching write
+created. The response cache warms up over the run, so compare runs made
+with the same --only.
+
+For each case the JSON holds p50/p95/p99/mean/max latency, requests per
+second, SQL statements per request and response bytes, plus the commit it
+was measured on. --compare prints the change against an earlier file and
+exits with status 1 if a case got more than --threshold slower at both
+p50 and p95 (and by at least a millisecond) or runs more statements per
+request.
+"""
+import argparse
+from datetime import datetime, timezone
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dataset  # noqa: E402
+
+# Not part of app.py's own routes
+IGNORED_ENDPOINTS = {'static'}
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, max(0, int(round(q * len(samples))) - 1))]
+
+
+class Fixtures:
+    """Ids and names drawn from whatever the database holds."""
+
+    def __init__(self, travelog):
+        session = travelog.db.session
+        User, Trip, City, Blob = travelog.User, travelog.Trip, travelog.City, travelog.Blob
+        self.users = [row[0] for row in session.query(User.id)]
+        self.usernames = [row[0] for row in session.query(User.username).limit(1000)]
+        self.popular_users = [row[0] for row in session.query(User.id).order_by(User.follower_count.desc()).limit(20)]
+        self.trips = [row[0] for row in session.query(Trip.id)]
+        self.cities = [tuple(row) for row in session.query(City.slug, City.name, City.country, City.latitude, City.longitude)]
+        self.files = [row[0] for row in session.query(Blob.filename).limit(100)]
+        if not (self.users and self.trips and self.cities):
+            sys.exit("The database needs users, trips and cities; fill it with benchmarks/dataset.py first.")
+
+
+def png_bytes(size=256):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new('RGB', (size, size), (200, 120, 40)).save(out, 'PNG')
+    return out.getvalue()
+
+
+def cases(fx, rnd):
+    """(label, endpoint, build, after) in run order.
+
+    build() returns keyword arguments for the test client's open();
+    after(response), when given, records what a write created.
+    """
+    user = lambda: rnd.choice(fx.users)
+    trip = lambda: rnd.choice(fx.trips)
+    city = lambda: rnd.choice(fx.cities)
+    photo = png_bytes()
+    created = {'follows': [], 'likes': [], 'comments': [], 'trips': [], 'uploads': [], 'finalized': [], 'signups': 0}
+
+    def get(path):
+        return {'path': path, 'method': 'GET'}
+
+    def post(path, **kwargs):
+        return {'path': path, 'method': 'POST', **kwargs}
+
+    def signup():
+        created['signups'] += 1
+        name = f"bench-{os.getpid()}-{created['signups']}"
+        return post('/signup', json={'username': name, 'email': f'{name}@example.com', 'password': dataset.PASSWORD})
+
+    def follow():
+        pair = (user(), user())
+        created['follows'].append(pair)
+        return post(f'/users/{pair[0]}/follow', json={'target_user_id': pair[1]})
+
+    def unfollow():
+        follower, followed = created['follows'].pop() if created['follows'] else (user(), user())
+        return post(f'/users/{follower}/unfollow', json={'target_user_id': followed})
+
+    def like():
+        pair = (user(), trip())
+        created['likes'].append(pair)
+        return post(f'/trips/{pair[1]}/like', json={'user_id': pair[0]})
+
+    def unlike():
+        user_id, trip_id = created['likes'].pop() if created['likes'] else (user(), trip())
+        return post(f'/trips/{trip_id}/unlike', json={'user_id': user_id})
+
+    def add_trip():
+        _, name, country, _, _ = city()
+        return post('/trips', content_type='multipart/form-data', data={
+            'user_id': str(user()), 'city': name, 'country': country,
+            'startDate': '2025-05-01', 'endDate': '2025-05-04', 'accommodation': 'Hotel',
+            'otherNotes': 'Benchmark trip',
+        })
+
+    def nearby():
+        _, _, _, latitude, longitude = city()
+        return get(f'/trips/nearby?lat={latitude}&lng={longitude}&limit=20&compact=1')
+
+    def pop_or(kind, fallback):
+        return created[kind].pop() if created[kind] else fallback
+
+    def put_chunk():
+        upload_id = pop_or('uploads', 'none')
+        created['finalized'].append(upload_id)
+        return {'path': f'/upload_sessions/{upload_id}?offset=0', 'method': 'PUT', 'data': photo,
+                'content_type': 'application/octet-stream'}
+
+    def upload_file():
+        if fx.files:
+            return get(f'/uploads/{rnd.choice(fx.files)}')
+        return get(f'/uploads/user_{user()}.png')
+
+    return [
+        # ----- reads -----
+        ('ping', 'ping', lambda: get('/ping'), None),
+        ('get_users ?q', 'get_users', lambda: get(f'/users?q={rnd.choice(fx.usernames)[:3]}&limit=20'), None),
+        ('get_user_by_username', 'get_user_by_username', lambda: get(f'/users/by-username/{rnd.choice(fx.usernames)}'), None),
+        ('get_user', 'get_user', lambda: get(f'/users/{user()}'), None),
+        ('get_profile', 'get_profile', lambda: get(f'/users/{user()}/profile?viewer_id={user()}&compact=1'), None),
+        ('get_profile_by_username', 'get_profile_by_username',
+         lambda: get(f'/users/by-username/{rnd.choice(fx.usernames)}/profile'), None),
+        ('get_followers ?limit', 'get_followers', lambda: get(f'/users/{rnd.choice(fx.popular_users)}/followers?limit=50'), None),
+        ('get_followers full', 'get_followers', lambda: get(f'/users/{user()}/followers'), None),
+        ('get_following ?limit', 'get_following', lambda: get(f'/users/{user()}/following?limit=50'), None),
+        ('check_following', 'check_following',
+         lambda: get(f"/users/{user()}/following/check?ids={','.join(str(user()) for _ in range(20))}"), None),
+        ('get_mutuals', 'get_mutuals', lambda: get(f'/users/{user()}/mutuals'), None),
+        ('get_suggestions', 'get_suggestions', lambda: get(f'/users/{user()}/suggestions?limit=10'), None),
+        ('user_has_photo', 'user_has_photo', lambda: get(f'/users/{user()}/has_photo'), None),
+        ('get_user_trips ?limit', 'get_user_trips', lambda: get(f'/trips/{user()}?limit=10&compact=1&viewer_id={user()}'), None),
+        ('get_following_feed ?limit', 'get_following_feed', lambda: get(f'/feed/{user()}?limit=20&compact=1'), None),
+        ('get_following_feed popular', 'get_following_feed',
+         lambda: get(f'/feed/{rnd.choice(fx.popular_users)}?limit=20&compact=1'), None),
+        ('get_trip', 'get_trip', lambda: get(f'/trip/{trip()}?viewer_id={user()}'), None),
+        ('get_trip_comments', 'get_trip_comments', lambda: get(f'/trips/{trip()}/comments'), None),
+        ('get_city', 'get_city', lambda: get(f'/cities/{city()[0]}'), None),
+        ('get_city_trips', 'get_city_trips', lambda: get(f'/cities/{city()[0]}/trips?compact=1'), None),
+        ('get_city_users', 'get_city_users', lambda: get(f'/cities/{city()[0]}/users'), None),
+        ('search_cities', 'search_cities', lambda: get(f'/cities/search?q={city()[1][:3]}'), None),
+        ('get_map', 'get_map', lambda: get(f'/map/{user()}'), None),
+        ('get_map ?zoom', 'get_map', lambda: get(f'/map/{user()}?zoom=4'), None),
+        ('get_nearby_trips', 'get_nearby_trips', nearby, None),
+        ('uploaded_file', 'uploaded_file', upload_file, None),
+        ('cache_stats', 'cache_stats', lambda: get('/cache/stats'), None),
+        ('follow_graph_stats', 'follow_graph_stats', lambda: get('/follow-graph/stats'), None),
+        ('prometheus_metrics', 'prometheus_metrics', lambda: get('/metrics'), None),
+        # ----- writes, then what undoes them -----
+        ('signup', 'signup', signup, None),
+        ('login', 'login', lambda: post('/login', json={'username': rnd.choice(fx.usernames), 'password': dataset.PASSWORD}), None),
+        ('follow_user', 'follow_user', follow, None),
+        ('unfollow_user', 'unfollow_user', unfollow, None),
+        ('like_trip', 'like_trip', like, None),
+        ('unlike_trip', 'unlike_trip', unlike, None),
+        ('comment_trip', 'comment_trip', lambda: post(f'/trips/{trip()}/comment', json={'user_id': user(), 'content': 'Nice!'}),
+         lambda response: created['comments'].append(response.json['id'])),
+        ('delete_comment', 'delete_comment',
+         lambda: {'path': f"/comments/{pop_or('comments', 0)}", 'method': 'DELETE'}, None),
+        ('upload_profile_photo', 'upload_profile_photo',
+         lambda: post(f'/users/{user()}/upload_photo', content_type='multipart/form-data',
+                      data={'photo': (io.BytesIO(photo), 'photo.png')}), None),
+        ('create_upload_session', 'create_upload_session',
+         lambda: post('/upload_sessions', json={'user_id': user(), 'filename': 'photo.png', 'mimetype': 'image/png',
+                                                 'size': len(photo)}),
+         lambda response: created['uploads'].append(response.json['upload_id'])),
+        ('get_upload_session', 'get_upload_session', lambda: get(f"/upload_sessions/{rnd.choice(created['uploads'] or ['none'])}"), None),
+        ('put_upload_chunk', 'put_upload_chunk', put_chunk, None),
+        ('finalize_upload_session', 'finalize_upload_session',
+         lambda: post(f"/upload_sessions/{pop_or('finalized', 'none')}/finalize"), None),
+        ('add_trip', 'add_trip', add_trip, lambda response: created['trips'].append(response.json['trip']['id'])),
+        ('delete_trip', 'delete_trip', lambda: {'path': f"/trips/{pop_or('trips', 0)}", 'method': 'DELETE'}, None),
+    ]
+
+
+def run_case(client, build, after, requests, counter):
+    latencies, queries, sizes, statuses = [], [], [], {}
+    for _ in range(requests):
+        kwargs = build()
+        counter[0] = 0
+        started = time.perf_counter()
+        response = client.open(**kwargs)
+        body = response.get_data()
+        latencies.append(time.perf_counter() - started)
+        queries.append(counter[0])
+        sizes.append(len(body))
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        if after and response.status_code < 400:
+            after(response)
+        response.close()
+
+    total = sum(latencies)
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'requests': requests,
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+        'status': statuses,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'mean_ms': ms(total / requests),
+        'max_ms': ms(latencies[-1]),
+        'throughput_rps': round(requests / total, 1) if total else None,
+        'queries_mean': round(sum(queries) / requests, 2),
+        'queries_max': max(queries),
+        'bytes_mean': round(sum(sizes) / requests),
+        'bytes_max': max(sizes),
+    }
+
+
+def git_state():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=BACKEND, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def compare(results, baseline, threshold):
+    """Print the change of each case against a baseline; returns the regressed labels."""
+    regressed = []
+    print(f"\ncompared with {(baseline['meta'].get('commit') or '?')[:12]}:")
+    for label, now in results['routes'].items():
+        before = baseline['routes'].get(label)
+        if not before:
+            print(f"  {label:<30} new")
+            continue
+        change = lambda key: (now[key] - before[key]) / before[key] if before[key] else 0
+        # Both p50 and p95, so one noisy tail doesn't count
+        slower = change('p50_ms') > threshold and change('p95_ms') > threshold and now['p95_ms'] - before['p95_ms'] >= 1
+        more_queries = now['queries_mean'] - before['queries_mean'] >= 1
+        flag = ''
+        if slower or more_queries:
+            flag = '  REGRESSION'
+            regressed.append(label)
+        print(f"  {label:<30} p50 {change('p50_ms'):+7.1%}  p95 {before['p95_ms']:9.2f} -> {now['p95_ms']:9.2f} ms ({change('p95_ms'):+7.1%})  "
+              f"queries {before['queries_mean']:6.2f} -> {now['queries_mean']:6.2f}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=dataset.SIZES, default='10k', help="dataset to generate when no --database-url")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-url', help="an already filled database (its data is changed)")
+    parser.add_argument('--requests', type=int, default=100, help="requests per case")
+    parser.add_argument('--only', help="regular expression; run only the cases whose label matches")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="slowdown at p50 and p95 counted as a regression")
+    args = parser.parse_args()
+
+    # Resolved before a generated dataset moves the working directory
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    generated = not args.database_url
+    if generated:
+        workdir = tempfile.mkdtemp(prefix='travelog-bench-')
+        os.chdir(workdir)
+        os.environ['DATABASE_URL'] = f"sqlite:///{workdir}/bench.db"
+    else:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-of-32-bytes-or-more')
+
+    import app as travelog
+    from sqlalchemy import event
+
+    with travelog.app.app_context():
+        if generated:
+            travelog.db.create_all()
+            dataset.generate(dataset.SIZES[args.size], seed=args.seed, echo=lambda line: None)
+        fixtures = Fixtures(travelog)
+        travelog.db.session.remove()
+        database = travelog.db.engine.url.get_backend_name()
+
+        counter = [0]
+        for engine in travelog.db.engines.values():
+            event.listen(engine, 'before_cursor_execute', lambda *a, **k: counter.__setitem__(0, counter[0] + 1))
+
+    travelog.create_app()
+    client = travelog.app.test_client()
+    rnd = random.Random(args.seed)
+    all_cases = cases(fixtures, rnd)
+    selected = [case for case in all_cases if not args.only or re.search(args.only, case[0])]
+
+    results = {
+        'meta': {
+            **git_state(),
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'database': database,
+            'dataset': args.size if generated else 'existing',
+            'seed': args.seed,
+            'users': len(fixtures.users),
+            'trips': len(fixtures.trips),
+            'requests_per_case': args.requests,
+        },
+        'routes': {},
+    }
+    print(f"{'case':<30} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'queries':>8} {'bytes':>9}  errors")
+    for label, endpoint, build, after in selected:
+        # Seeded per case, so a case draws the same ids whichever cases run before it
+        rnd.seed(f'{args.seed}:{label}')
+        result = run_case(client, build, after, args.requests, counter)
+        results['routes'][label] = {'endpoint': endpoint, **result}
+        print(f"{label:<30} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+              f"{result['throughput_rps']:8.1f} {result['queries_mean']:8.2f} {result['bytes_mean']:9d}  {result['errors']}")
+
+    covered = {case[1] for case in all_cases}
+    results['uncovered'] = sorted({rule.endpoint for rule in travelog.app.url_map.iter_rules()} - covered - IGNORED_ENDPOINTS)
+    if results['uncovered']:
+        print(f"routes without a case: {', '.join(results['uncovered'])}")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            if compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
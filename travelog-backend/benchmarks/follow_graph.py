@@ -0,0 +1,98 @@
+"""Benchmark the in-memory follow graph at a given edge count.
+
+Run from travelog-backend/:
+
+    python benchmarks/follow_graph.py --edges 1000000 --users 100000
+
+Edges are synthetic. Followed accounts are drawn from a skewed
+distribution, so a few users get most of the followers, as on a real
+social graph. No database is involved; the loader yields the edges from
+memory. The script reports build time, memory held by the arrays (and
+by the whole process, via tracemalloc), the cost of incremental follows
+and unfollows including compaction, and query latencies.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from follow_graph import FollowGraph  # noqa: E402
+
+
+def synthetic_edges(users, edges, seed):
+    rnd = random.Random(seed)
+    seen = set()
+    while len(seen) < edges:
+        follower = rnd.randrange(1, users + 1)
+        # Pareto-ish popularity: low ids are followed far more often
+        followed = min(users, int(rnd.paretovariate(1.2))) if rnd.random() < 0.3 else rnd.randrange(1, users + 1)
+        if follower != followed:
+            seen.add((follower, followed))
+    return list(seen)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--edges', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--updates', type=int, default=100_000, help="follows + unfollows to apply")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    edges = synthetic_edges(args.users, args.edges, args.seed)
+    graph = FollowGraph(lambda: edges, max_age=10 ** 9)
+
+    started = time.perf_counter()
+    graph.build()
+    build_seconds = time.perf_counter() - started
+    # Measured on a second build, since tracing slows allocation down
+    tracemalloc.start()
+    FollowGraph(lambda: edges).build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = graph.stats()
+    print(f"edges={args.edges} users={args.users}")
+    print(f"build            {build_seconds:8.2f} s   peak alloc {peak / 2 ** 20:7.1f} MiB")
+    print(f"arrays           {stats['bytes'] / 2 ** 20:8.1f} MiB  ({stats['bytes'] / args.edges:.1f} bytes/edge, both directions)")
+
+    rnd = random.Random(args.seed + 1)
+    ops = [(rnd.randrange(1, args.users + 1), rnd.randrange(1, args.users + 1)) for _ in range(args.updates)]
+    started = time.perf_counter()
+    for i, (a, b) in enumerate(ops):
+        if i % 2:
+            graph.unfollow(a, [b])
+        else:
+            graph.follow(a, [b])
+    update_seconds = time.perf_counter() - started
+    print(f"updates          {update_seconds / args.updates * 1e6:8.2f} us/op  (incl. compaction, {args.updates} ops)")
+
+    heavy = 1
+    typical = max(range(1, 1000), key=lambda u: -abs(len(graph.following(u)) - args.edges // args.users))
+    for name, fn in [
+        ('following', lambda: graph.following(typical)),
+        ('followers heavy', lambda: graph.followers(heavy)),
+        ('follows', lambda: graph.follows(typical, heavy)),
+        ('mutuals', lambda: graph.mutuals(typical)),
+        ('suggestions', lambda: graph.suggestions(typical, 10)),
+    ]:
+        median, worst = timed(fn, 200)
+        print(f"{name:<16} {median:8.1f} us median  {worst:9.1f} us max")
+    print(f"followers of the most followed user: {graph.follower_count(heavy)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Measure /login throughput with password hashing inline and in the process pool.
+
+Run from travelog-backend/:
+
+    python benchmarks/login_throughput.py --threads 16 --seconds 5
+
+Each configuration logs in pre-created users from --threads client
+threads for --seconds seconds through Flask's test client, against a
+throwaway SQLite database. It reports logins per second overall and per
+core used for hashing, plus the share of 503 answers.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-of-32-bytes-or-more')
+
+import app as travelog  # noqa: E402
+from passwords import PasswordHasher  # noqa: E402
+
+
+def create_users(count, method):
+    hasher = PasswordHasher(method=method, workers=0)
+    pwhash = hasher.hash('benchmark-password')
+    with travelog.app.app_context():
+        travelog.db.create_all()
+        travelog.db.session.execute(travelog.User.__table__.insert(), [
+            {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': pwhash,
+             'follower_count': 0}
+            for i in range(count)
+        ])
+        travelog.db.session.commit()
+
+
+def run(threads, seconds, users):
+    counts = {'ok': 0, 'busy': 0, 'other': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(n):
+        client = travelog.app.test_client()
+        local = {'ok': 0, 'busy': 0, 'other': 0}
+        i = n
+        while time.perf_counter() < deadline:
+            response = client.post('/login', json={'username': f'bench{i % users}', 'password': 'benchmark-password'})
+            local['ok' if response.status_code == 200 else 'busy' if response.status_code == 503 else 'other'] += 1
+            i += threads
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help="concurrent client threads")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, os.cpu_count() or 1],
+                        help="hashing processes per run; 0 hashes on the request thread")
+    parser.add_argument('--method', default=travelog.app.config['PASSWORD_HASH_METHOD'])
+    args = parser.parse_args()
+
+    create_users(args.users, args.method)
+    print(f"method={args.method} threads={args.threads} seconds={args.seconds} cores={os.cpu_count()}")
+    for workers in args.workers:
+        travelog.password_hasher = PasswordHasher(method=args.method, workers=workers,
+                                                  max_pending=max(4 * workers, args.threads))
+        counts, elapsed = run(args.threads, args.seconds, args.users)
+        travelog.password_hasher.shutdown()
+        rate = counts['ok'] / elapsed
+        cores = max(workers, 1)
+        total = sum(counts.values()) or 1
+        print(f"workers={workers:<3} logins/s={rate:8.1f}  per core={rate / cores:7.1f}  "
+              f"503s={counts['busy'] / total:.1%}  errors={counts['other']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""Response cache for read endpoints.
+
+Two interchangeable backends share one small interface (get_many,
+set_many, delete, stats):
+
+* LRUCache   - per-process OrderedDict with a TTL, the default.
+* RedisCache - any server speaking the Redis protocol (RESP), shared by
+               all workers. It talks RESP over a plain socket, so no
+               client library is required.
+
+Values are stored as JSON text in both backends. Every reader therefore
+gets its own copy and can't modify what other requests see. Keys are
+invalidated explicitly by the write routes. The TTL only bounds how
+long a missed invalidation can survive.
+"""
+from collections import OrderedDict
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.deletes = 0
+        self.errors = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'sets': self.sets,
+            'deletes': self.deletes,
+            'errors': self.errors,
+        }
+
+
+class LRUCache:
+    backend = 'memory'
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get_many(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = value
+        self.stats.add(hits=len(found), misses=len(keys) - len(found))
+        return {key: json.loads(value) for key, value in found.items()}
+
+    def set_many(self, mapping):
+        expires_at = time.monotonic() + self.ttl
+        encoded = {key: json.dumps(value) for key, value in mapping.items()}
+        with self._lock:
+            for key, value in encoded.items():
+                self._data[key] = (expires_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        self.stats.add(sets=len(mapping))
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+        self.stats.add(deletes=len(keys))
+
+    def info(self):
+        return {'backend': self.backend, 'entries': len(self._data), 'max_entries': self.max_entries,
+                'ttl': self.ttl, **self.stats.as_dict()}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    """One blocking RESP connection."""
+
+    def __init__(self, host, port, db, password, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    @staticmethod
+    def _encode(*args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RedisError(f'Unexpected reply {line!r}')
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands):
+        """Send several commands in one write and read all the replies."""
+        self.sock.sendall(b''.join(self._encode(*command) for command in commands))
+        return [self._read() for _ in commands]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisCache:
+    backend = 'redis'
+
+    def __init__(self, url, ttl=300, prefix='travelog:', timeout=0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+        self.stats = CacheStats()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = RedisConnection(self.host, self.port, self.db, self.password, self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _run(self, commands):
+        # A cache outage must never fail the request, so errors read as misses.
+        try:
+            return self._connection().pipeline(commands)
+        except (OSError, RedisError):
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                conn.close()
+                self._local.conn = None
+            self.stats.add(errors=1)
+            return None
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        replies = self._run([['MGET', *(self.prefix + key for key in keys)]])
+        values = replies[0] if replies else [None] * len(keys)
+        found = {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+        self.stats.add(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set_many(self, mapping):
+        if not mapping:
+            return
+        ttl_ms = int(self.ttl * 1000)
+        self._run([['SET', self.prefix + key, json.dumps(value), 'PX', ttl_ms] for key, value in mapping.items()])
+        self.stats.add(sets=len(mapping))
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        self._run([['DEL', *(self.prefix + key for key in keys)]])
+        self.stats.add(deletes=len(keys))
+
+    def info(self):
+        return {'backend': self.backend, 'host': self.host, 'port': self.port, 'ttl': self.ttl,
+                **self.stats.as_dict()}
+
+
+def make_cache(url, ttl=300, max_entries=10000):
+    """Build a cache from a URL: memory:// (default) or redis://host:port/db."""
+    if url and url.startswith(('redis://', 'resp://')):
+        return RedisCache(url, ttl=ttl)
+    return LRUCache(max_entries=max_entries, ttl=ttl)
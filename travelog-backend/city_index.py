@@ -0,0 +1,192 @@
+"""In-memory autocomplete index over the distinct (city, country) pairs.
+
+Every pair is stored as "city, country" in lowercase, and every suffix of
+that label goes into a sorted list. A prefix or infix query is then a
+binary search for the first suffix starting with the query, followed by a
+scan over the matching range. Suffixes that begin a word are kept apart
+from the rest. Short queries therefore only walk word starts, and infix
+matches are only considered once the query is long enough to be selective.
+The index holds one entry per distinct pair, not per trip, so lookups do
+not grow with the trips table.
+
+Each worker process reloads its copy every max_age seconds to pick up
+trips added through other workers. The reload runs on a background
+thread while requests keep searching the previous copy. Adds and removes
+made during a reload are replayed onto the new copy. A trip committed
+just before the loader read its rows can then be counted twice, which
+only nudges its ranking until the next reload.
+"""
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import heapq
+import threading
+import time
+
+MIN_INFIX_LENGTH = 3
+RESULT_CACHE_SIZE = 1024
+WORD_SEPARATORS = ' ,-'
+
+
+class CityIndex:
+    def __init__(self, loader, max_age=300):
+        # loader() returns (city, country, trip_count) rows from the database
+        self._loader = loader
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._word_starts = []
+        self._infixes = []
+        self._pairs = {}
+        self._results = OrderedDict()
+        self._built_at = None
+        self._rebuilding = False
+        # Changes seen while a build is loading, or None when none is running
+        self._replay = None
+
+    @staticmethod
+    def _label(key):
+        return f"{key[0]}, {key[1]}"
+
+    @classmethod
+    def _suffixes(cls, key):
+        """Yield (is_word_start, suffix) for every suffix of the pair's label."""
+        label = cls._label(key)
+        for i in range(len(label)):
+            if label[i] in WORD_SEPARATORS:
+                continue
+            yield i == 0 or label[i - 1] in WORD_SEPARATORS, label[i:]
+
+    def build(self):
+        """(Re)build the whole index from the loader.
+
+        Adds and removes recorded while the loader runs are replayed onto
+        the new index, so a trip is not lost if it was committed after the
+        loader read its rows.
+        """
+        with self._lock:
+            self._replay = []
+        try:
+            pairs = {}
+            for city, country, count in self._loader():
+                key = (city.lower(), country.lower())
+                if key in pairs:
+                    pairs[key]['count'] += count
+                else:
+                    pairs[key] = {'city': city, 'country': country, 'count': count}
+            word_starts, infixes = [], []
+            for key in pairs:
+                for is_word_start, suffix in self._suffixes(key):
+                    (word_starts if is_word_start else infixes).append((suffix, key))
+            word_starts.sort()
+            infixes.sort()
+        except BaseException:
+            with self._lock:
+                self._replay = None
+                self._rebuilding = False
+            raise
+        with self._lock:
+            self._pairs = pairs
+            self._word_starts = word_starts
+            self._infixes = infixes
+            for apply, city, country in self._replay:
+                apply(city, country)
+            self._results.clear()
+            self._replay = None
+            self._rebuilding = False
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            self.build()
+            return
+        # Other worker processes update their own copy, so reload
+        # periodically to pick up their writes. Stale copies keep answering
+        # while a background thread reloads.
+        if time.monotonic() - self._built_at > self._max_age and not self._rebuilding:
+            with self._lock:
+                if self._rebuilding:
+                    return
+                self._rebuilding = True
+            threading.Thread(target=self.build, name='city-index-build', daemon=True).start()
+
+    def _add(self, city, country):
+        key = (city.lower(), country.lower())
+        self._results.clear()
+        if key in self._pairs:
+            self._pairs[key]['count'] += 1
+            return
+        self._pairs[key] = {'city': city, 'country': country, 'count': 1}
+        for is_word_start, suffix in self._suffixes(key):
+            insort(self._word_starts if is_word_start else self._infixes, (suffix, key))
+
+    def _remove(self, city, country):
+        key = (city.lower(), country.lower())
+        pair = self._pairs.get(key)
+        if not pair:
+            return
+        self._results.clear()
+        pair['count'] -= 1
+        if pair['count'] > 0:
+            return
+        del self._pairs[key]
+        for is_word_start, suffix in self._suffixes(key):
+            entries = self._word_starts if is_word_start else self._infixes
+            pos = bisect_left(entries, (suffix, key))
+            if pos < len(entries) and entries[pos] == (suffix, key):
+                del entries[pos]
+
+    def add(self, city, country):
+        """Record one more trip to (city, country)."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._add, city, country))
+            if self._built_at is not None:
+                self._add(city, country)
+
+    def remove(self, city, country):
+        """Record that one trip to (city, country) was deleted."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._remove, city, country))
+            if self._built_at is not None:
+                self._remove(city, country)
+
+    @staticmethod
+    def _scan(entries, query):
+        pos = bisect_left(entries, (query,))
+        while pos < len(entries) and entries[pos][0].startswith(query):
+            yield entries[pos]
+            pos += 1
+
+    def search(self, query, limit=10):
+        """Return up to `limit` pairs containing `query`, best matches first.
+
+        City-name prefix matches rank first, then matches at the start of
+        any other word, then (for queries of MIN_INFIX_LENGTH or more)
+        other substring matches. Ties are broken by trip count and then
+        alphabetically.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        self._ensure_fresh()
+        with self._lock:
+            cached = self._results.get((query, limit))
+            if cached is not None:
+                self._results.move_to_end((query, limit))
+                return [dict(self._pairs[key]) for key in cached]
+
+            ranked = {}
+            for suffix, key in self._scan(self._word_starts, query):
+                tier = 0 if len(suffix) == len(self._label(key)) else 1
+                if key not in ranked or tier < ranked[key][0]:
+                    ranked[key] = (tier, -self._pairs[key]['count'], self._label(key))
+            if len(query) >= MIN_INFIX_LENGTH:
+                for _, key in self._scan(self._infixes, query):
+                    if key not in ranked:
+                        ranked[key] = (2, -self._pairs[key]['count'], self._label(key))
+
+            best = [key for key, _ in heapq.nsmallest(limit, ranked.items(), key=lambda item: item[1])]
+            self._results[(query, limit)] = best
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return [dict(self._pairs[key]) for key in best]
@@ -0,0 +1,158 @@
+"""Engine options, statement timeouts and read-replica routing.
+
+Reads of GET routes marked @read_only go to a replica. The replica is
+picked round-robin per request from DATABASE_REPLICA_URLS, which are
+registered as Flask-SQLAlchemy binds named replica_0, replica_1, ...
+Everything else goes to the primary: writes, flushes, requests that are
+not read-only, and reads made inside `with primary_reads():`.
+
+Read-your-writes: after a successful write request, the users it names
+are marked in a store. For the next READ_YOUR_WRITES_SECONDS, GET
+requests naming one of them read from the primary, so nobody sees their
+own change disappear because a replica lags. The store (see
+make_write_marks) is kept apart from the response cache: marks never
+show up in /cache/stats and are not evicted to make room for cached
+pages. They are only seen by other workers when the store is shared,
+i.e. with a Redis CACHE_URL.
+
+statement_timeout (DB_STATEMENT_TIMEOUT_MS, or an endpoint's entry in
+DB_ROUTE_STATEMENT_TIMEOUTS) is set with SET LOCAL at the start of each
+transaction, so it never outlives the request on a pooled connection.
+Only Postgres has one; on SQLite the setting is ignored.
+"""
+from contextlib import contextmanager
+import itertools
+import threading
+import time
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+from cache import RedisCache
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+def engine_options(url, pool_size, max_overflow, pool_timeout, pool_recycle, pre_ping):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL."""
+    options = {'pool_pre_ping': pre_ping, 'pool_recycle': pool_recycle}
+    parsed = make_url(url) if url else None
+    # In-memory SQLite runs on a StaticPool, which takes no sizing
+    if parsed is None or not (parsed.drivername.startswith('sqlite') and parsed.database in (None, '', ':memory:')):
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    return options
+
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries for a comma-separated list of replica URLs."""
+    urls = [url.strip() for url in (urls or '').split(',') if url.strip()]
+    return {f'{REPLICA_BIND_PREFIX}{n}': url for n, url in enumerate(urls)}
+
+
+def read_only(view):
+    """Mark a GET view as safe to serve from a replica."""
+    view.read_only = True
+    return view
+
+
+def parse_route_timeouts(value):
+    """"endpoint=ms,endpoint=ms" -> {endpoint: ms}"""
+    timeouts = {}
+    for part in (value or '').split(','):
+        endpoint, _, ms = part.partition('=')
+        if endpoint.strip() and ms.strip():
+            timeouts[endpoint.strip()] = int(ms)
+    return timeouts
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside this block, e.g. to fill a cache."""
+    previous = g.get('replica_bind')
+    g.replica_bind = None
+    try:
+        yield
+    finally:
+        g.replica_bind = previous
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and not self._flushing and not isinstance(clause, UpdateBase):
+            replica = g.get('replica_bind')
+            if replica:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def apply_statement_timeout(session, transaction, connection):
+    """after_begin listener: SET LOCAL the timeout the request asked for."""
+    if connection.dialect.name != 'postgresql' or not has_app_context():
+        return
+    ms = g.get('statement_timeout')
+    if ms:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(ms)}")
+
+
+class LocalWriteMarks:
+    """Per-process {key: time of the write} store for read-your-writes.
+
+    Marks only ever expire, `window` seconds after they are set. Expired
+    ones are swept at most once per window, when marks are added.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._marks = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def get_many(self, keys):
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            return {key: self._marks[key][1] for key in keys if key in self._marks and self._marks[key][0] > cutoff}
+
+    def set_many(self, mapping):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in mapping.items():
+                self._marks[key] = (now, value)
+            if now - self._swept_at > self.window:
+                self._marks = {key: mark for key, mark in self._marks.items() if mark[0] > now - self.window}
+                self._swept_at = now
+
+
+def make_write_marks(cache_url, window):
+    """Store for ReplicaRouter: Redis next to a redis:// CACHE_URL, else per process."""
+    if cache_url and cache_url.startswith(('redis://', 'resp://')):
+        # Its own client, so marks stay out of the response cache's stats
+        return RedisCache(cache_url, ttl=window)
+    return LocalWriteMarks(window)
+
+
+class ReplicaRouter:
+    def __init__(self, binds, store, window=5):
+        self.binds = list(binds)
+        self.store = store
+        self.window = window
+        self._cycle = itertools.cycle(self.binds)
+        self._lock = threading.Lock()
+
+    def choose(self, user_ids):
+        """Bind name of the replica to read from, or None for the primary."""
+        if not self.binds:
+            return None
+        if user_ids and self.window:
+            marks = self.store.get_many([f"wrote:{user_id}" for user_id in user_ids])
+            now = time.time()
+            if any(now - written_at < self.window for written_at in marks.values()):
+                return None
+        with self._lock:
+            return next(self._cycle)
+
+    def record_write(self, user_ids):
+        if self.binds and user_ids and self.window:
+            now = time.time()
+            self.store.set_many({f"wrote:{user_id}": now for user_id in user_ids})
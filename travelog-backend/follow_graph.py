@@ -0,0 +1,280 @@
+"""In-memory follow graph in compressed sparse row (CSR) form.
+
+Each direction of the graph is two flat integer arrays. targets holds
+every edge's far end, grouped by user and sorted within each group.
+offsets[u] : offsets[u + 1] is the slice of targets belonging to user u.
+User ids index offsets directly, so a lookup is two array reads and a
+slice, and an edge costs 4 bytes per direction.
+
+The arrays are never modified in place. Follows and unfollows made after
+a build go into small per-user overlays (added / removed sets), which
+every query merges in. Once the overlays grow past COMPACT_RATIO of the
+edge count, they are folded into fresh arrays. That is done in memory
+and never touches the database.
+
+Each worker process keeps its own copy and reloads it from the loader
+every max_age seconds, so it picks up writes made by other workers. The
+reload runs on a background thread; requests keep reading the previous
+copy until the new one is swapped in.
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+import heapq
+import threading
+import time
+
+COMPACT_RATIO = 0.05
+MIN_COMPACT_EDGES = 1024
+# Followed accounts whose own follows are walked for a suggestion
+SUGGESTION_FANOUT = 500
+
+
+class _Adjacency:
+    """One direction of the graph: CSR arrays plus the pending overlay."""
+
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+        self.added = defaultdict(set)
+        self.removed = defaultdict(set)
+        self.pending = 0
+
+    @classmethod
+    def from_edges(cls, sources, destinations, size):
+        """Pack (source, destination) pairs into CSR arrays.
+
+        Each pair is packed into one integer, source in the high bits, and
+        a single sort of those orders the targets by source and then by
+        destination, so every group comes out sorted. Sorting plain ints is
+        several times faster than sorting tuples.
+        """
+        keys = sorted([(source << 32) | destination for source, destination in zip(sources, destinations)])
+        targets = array('i', [key & 0xFFFFFFFF for key in keys])
+        degrees = Counter(sources)
+        offsets = array('l', [0]) * (size + 1)
+        total = 0
+        for node in range(size):
+            total += degrees.get(node, 0)
+            offsets[node + 1] = total
+        return cls(offsets, targets)
+
+    def _base(self, node):
+        if node + 1 >= len(self.offsets) or node < 0:
+            return self.targets[0:0]
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def _base_has(self, node, other):
+        if node + 1 >= len(self.offsets) or node < 0:
+            return False
+        start, end = self.offsets[node], self.offsets[node + 1]
+        pos = bisect_left(self.targets, other, start, end)
+        return pos < end and self.targets[pos] == other
+
+    def neighbours(self, node):
+        base = self._base(node)
+        added, removed = self.added.get(node), self.removed.get(node)
+        if not added and not removed:
+            return base
+        result = set(base)
+        if removed:
+            result -= removed
+        if added:
+            result |= added
+        return array('i', sorted(result))
+
+    def degree(self, node):
+        base = len(self._base(node))
+        return base + len(self.added.get(node, ())) - len(self.removed.get(node, ()))
+
+    def has(self, node, other):
+        if other in self.added.get(node, ()):
+            return True
+        if other in self.removed.get(node, ()):
+            return False
+        return self._base_has(node, other)
+
+    def add(self, node, other):
+        if other in self.removed.get(node, ()):
+            self.removed[node].discard(other)
+            self.pending -= 1
+        elif not self._base_has(node, other) and other not in self.added[node]:
+            self.added[node].add(other)
+            self.pending += 1
+
+    def remove(self, node, other):
+        if other in self.added.get(node, ()):
+            self.added[node].discard(other)
+            self.pending -= 1
+        elif self._base_has(node, other) and other not in self.removed[node]:
+            self.removed[node].add(other)
+            self.pending += 1
+
+    def compacted(self):
+        """Fold the overlay into new CSR arrays."""
+        size = len(self.offsets) - 1
+        for node in self.added:
+            size = max(size, node + 1)
+        offsets = array('l', [0]) * (size + 1)
+        targets = array('i')
+        for node in range(size):
+            if node in self.added or node in self.removed:
+                targets.extend(self.neighbours(node))
+            else:
+                targets.extend(self._base(node))
+            offsets[node + 1] = len(targets)
+        return _Adjacency(offsets, targets)
+
+    def nbytes(self):
+        return self.offsets.itemsize * len(self.offsets) + self.targets.itemsize * len(self.targets)
+
+
+class FollowGraph:
+    def __init__(self, loader, max_age=60):
+        # loader() returns (follower_id, followed_id) rows from the database
+        self._loader = loader
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._following = _Adjacency(array('l', [0]), array('i'))
+        self._followers = _Adjacency(array('l', [0]), array('i'))
+        self._built_at = None
+        self._rebuilding = False
+        # Changes seen while a build is loading, or None when none is running
+        self._replay = None
+
+    def build(self):
+        """(Re)build the whole graph from the loader.
+
+        Follows and unfollows recorded while the loader runs are replayed
+        onto the new arrays, so a change is not lost if it was committed
+        after the loader read its snapshot.
+        """
+        with self._lock:
+            self._replay = []
+        followers, followed = array('i'), array('i')
+        try:
+            for follower_id, followed_id in self._loader():
+                followers.append(follower_id)
+                followed.append(followed_id)
+            size = max(max(followers, default=0), max(followed, default=0)) + 1
+            following = _Adjacency.from_edges(followers, followed, size)
+            reverse = _Adjacency.from_edges(followed, followers, size)
+        except BaseException:
+            with self._lock:
+                self._replay = None
+                self._rebuilding = False
+            raise
+        with self._lock:
+            self._following = following
+            self._followers = reverse
+            for apply, follower_id, followed_ids in self._replay:
+                apply(follower_id, followed_ids)
+            self._replay = None
+            self._rebuilding = False
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            self.build()
+            return
+        # Stale copies keep answering while a background thread reloads
+        if time.monotonic() - self._built_at > self._max_age and not self._rebuilding:
+            with self._lock:
+                if self._rebuilding:
+                    return
+                self._rebuilding = True
+            threading.Thread(target=self.build, name='follow-graph-build', daemon=True).start()
+
+    def _maybe_compact(self):
+        edges = len(self._following.targets)
+        if self._following.pending > max(MIN_COMPACT_EDGES, edges * COMPACT_RATIO):
+            self._following = self._following.compacted()
+            self._followers = self._followers.compacted()
+
+    def _follow(self, follower_id, followed_ids):
+        for followed_id in followed_ids:
+            self._following.add(follower_id, followed_id)
+            self._followers.add(followed_id, follower_id)
+        self._maybe_compact()
+
+    def _unfollow(self, follower_id, followed_ids):
+        for followed_id in followed_ids:
+            self._following.remove(follower_id, followed_id)
+            self._followers.remove(followed_id, follower_id)
+        self._maybe_compact()
+
+    def follow(self, follower_id, followed_ids):
+        """Record follows that were just committed."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._follow, follower_id, list(followed_ids)))
+            if self._built_at is not None:
+                self._follow(follower_id, followed_ids)
+
+    def unfollow(self, follower_id, followed_ids):
+        """Record unfollows that were just committed."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._unfollow, follower_id, list(followed_ids)))
+            if self._built_at is not None:
+                self._unfollow(follower_id, followed_ids)
+
+    def following(self, user_id):
+        """Sorted ids of the users `user_id` follows."""
+        self._ensure_fresh()
+        with self._lock:
+            return list(self._following.neighbours(user_id))
+
+    def followers(self, user_id):
+        self._ensure_fresh()
+        with self._lock:
+            return list(self._followers.neighbours(user_id))
+
+    def follower_count(self, user_id):
+        self._ensure_fresh()
+        with self._lock:
+            return self._followers.degree(user_id)
+
+    def follows(self, follower_id, followed_id):
+        self._ensure_fresh()
+        with self._lock:
+            return self._following.has(follower_id, followed_id)
+
+    def mutuals(self, user_id):
+        """Sorted ids of users who follow `user_id` and are followed back."""
+        self._ensure_fresh()
+        with self._lock:
+            return [other for other in self._following.neighbours(user_id) if self._following.has(other, user_id)]
+
+    def suggestions(self, user_id, limit=10):
+        """Rank friends of friends for `user_id`: [(user_id, mutual_count)].
+
+        A candidate scores one point per followed account that follows it.
+        Ties go to the candidate with more followers, then the lower id.
+        Only the SUGGESTION_FANOUT most followed accounts are walked, which
+        bounds the cost for users who follow thousands of people.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            following = self._following.neighbours(user_id)
+            walked = heapq.nlargest(SUGGESTION_FANOUT, following, key=self._followers.degree)
+            scores = Counter()
+            for friend in walked:
+                scores.update(self._following.neighbours(friend))
+            excluded = set(following)
+            excluded.add(user_id)
+            ranked = heapq.nsmallest(
+                limit,
+                ((-score, -self._followers.degree(candidate), candidate)
+                 for candidate, score in scores.items() if candidate not in excluded)
+            )
+        return [(candidate, -score) for score, _, candidate in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'compacted_edges': len(self._following.targets),
+                'pending_changes': self._following.pending,
+                'bytes': self._following.nbytes() + self._followers.nbytes(),
+                'age': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+            }
@@ -0,0 +1,179 @@
+"""Geometry helpers for the map and nearby endpoints.
+
+Markers are clustered on a grid in Web Mercator space, the projection
+Leaflet draws in. A cell is CLUSTER_RADIUS screen pixels wide at the
+requested zoom level. Points that land in one cell render as a single
+cluster, so the number of objects sent to the browser is bounded by the
+viewport size, not by how many trips it contains.
+
+Proximity search uses geohashes. Every geocoded city stores the geohash
+of its coordinates in an indexed column. All points inside a geohash
+cell share its prefix, so the candidates near a location come from a
+handful of index range scans, one per covering cell. Only those
+candidates are then ranked by great-circle distance.
+"""
+import math
+
+TILE_SIZE = 256
+CLUSTER_RADIUS = 60
+MAX_ZOOM = 22
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.05112878
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+# Sorts after every geohash character, closing a prefix range scan
+GEOHASH_END = '~'
+# Upper bound on covering cells, i.e. on range scans per nearby query
+MAX_COVER_CELLS = 16
+
+
+def mercator(latitude, longitude):
+    """Project to (x, y) in [0, 1], with y growing southwards like screen pixels."""
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    sin_lat = math.sin(math.radians(latitude))
+    x = (longitude + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def parse_bbox(value):
+    """Parse "west,south,east,north" (Leaflet's toBBoxString()) or return None.
+
+    west may be greater than east when the box crosses the antimeridian.
+    """
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        return None
+    if not (-90 <= south <= north <= 90):
+        return None
+    # Leaflet keeps counting past +/-180 when the map is panned around the world
+    if east - west >= 360:
+        return -180.0, south, 180.0, north
+    wrap = lambda lng: (lng + 180.0) % 360.0 - 180.0
+    return wrap(west), south, wrap(east), north
+
+
+def cluster_points(points, zoom, radius=CLUSTER_RADIUS):
+    """Group (latitude, longitude, item) tuples by screen grid cell.
+
+    Returns a list of (latitude, longitude, items) with the mean position
+    of each group, in the order groups are first seen.
+    """
+    cell = radius / (TILE_SIZE * 2 ** zoom)
+    groups = {}
+    for latitude, longitude, item in points:
+        x, y = mercator(latitude, longitude)
+        groups.setdefault((int(x // cell), int(y // cell)), []).append((latitude, longitude, item))
+
+    result = []
+    for members in groups.values():
+        latitude = sum(member[0] for member in members) / len(members)
+        longitude = sum(member[1] for member in members) / len(members)
+        result.append((latitude, longitude, [member[2] for member in members]))
+    return result
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode a point, e.g. Prague (50.0755, 14.4378) -> "u2fkbecqc"."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        bounds, point = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if point >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """(height, width) in degrees of a geohash cell of this length."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def _cover(south, west, north, east, precision):
+    height, width = _cell_size(precision)
+    cells = set()
+    lat = math.floor((south + 90.0) / height) * height - 90.0
+    while lat <= north:
+        lng = math.floor((west + 180.0) / width) * width - 180.0
+        while lng <= east:
+            center_lat = min(max(lat + height / 2, -90.0), 90.0)
+            center_lng = (lng + width / 2 + 180.0) % 360.0 - 180.0
+            cells.add(geohash(center_lat, center_lng, precision))
+            lng += width
+        lat += height
+    return cells
+
+
+def covering_cells(latitude, longitude, radius_km, max_cells=MAX_COVER_CELLS):
+    """Geohash prefixes whose cells together contain the circle.
+
+    The longest prefixes are picked whose count stays within max_cells,
+    so small circles scan small cells and large ones fewer, larger cells.
+    """
+    south, north, west, east = bounding_box(latitude, longitude, radius_km)
+    boxes = [(south, west, north, east)]
+    if west > east:
+        boxes = [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+    best = {''}
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        cells = set()
+        for box in boxes:
+            cells |= _cover(*box, precision)
+            if len(cells) > max_cells:
+                return sorted(best)
+        best = cells
+    return sorted(best)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(south, north, west, east) of a circle; west > east across the antimeridian."""
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = latitude - delta_lat, latitude + delta_lat
+    if south <= -90.0 or north >= 90.0:
+        return max(south, -90.0), min(north, 90.0), -180.0, 180.0
+    delta_lng = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)))))
+    if delta_lng >= 180.0:
+        return south, north, -180.0, 180.0
+    west = (longitude - delta_lng + 180.0) % 360.0 - 180.0
+    east = (longitude + delta_lng + 180.0) % 360.0 - 180.0
+    return south, north, west, east
+
+
+def distances_km(latitude, longitude, latitudes, longitudes):
+    """Haversine distance from one point to many, as a list.
+
+    The origin's trigonometry is computed once. Each candidate then goes
+    through one scalar haversine in a plain Python loop, with the math
+    functions bound to locals, so ranking costs a few float operations per
+    candidate city.
+    """
+    lat0 = math.radians(latitude)
+    lng0 = math.radians(longitude)
+    cos_lat0 = math.cos(lat0)
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+    lats = [math.radians(lat) for lat in latitudes]
+    lngs = [math.radians(lng) for lng in longitudes]
+    return [
+        2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(
+            sin((lat - lat0) / 2) ** 2 + cos_lat0 * cos(lat) * sin((lng - lng0) / 2) ** 2
+        )))
+        for lat, lng in zip(lats, lngs)
+    ]
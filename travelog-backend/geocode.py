@@ -0,0 +1,119 @@
+"""Resolve (city, country) pairs to coordinates.
+
+The lookup is offline first. data/gazetteer.csv ships with the backend
+and covers capitals and the cities people travel to most. It is loaded
+once per process into a dict keyed by normalized names. Cities it does
+not know can be resolved through a Nominatim-compatible service. When a
+new trip creates such a city, the app queues the lookup on a background
+thread right after the trip is saved, so the request never waits on it.
+`flask geocode-cities` retries whatever is still missing. Remote calls
+are rate limited either way.
+
+Results are stored on the City row, so every trip in a city shares one
+lookup, and a city is never resolved twice.
+"""
+import csv
+import json
+import threading
+import time
+import unicodedata
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+# Spellings people type for a country -> the name used in the gazetteer
+COUNTRY_ALIASES = {
+    'usa': 'united states',
+    'us': 'united states',
+    'u s a': 'united states',
+    'u s': 'united states',
+    'united states of america': 'united states',
+    'america': 'united states',
+    'uk': 'united kingdom',
+    'u k': 'united kingdom',
+    'great britain': 'united kingdom',
+    'britain': 'united kingdom',
+    'england': 'united kingdom',
+    'scotland': 'united kingdom',
+    'wales': 'united kingdom',
+    'northern ireland': 'united kingdom',
+    'czechia': 'czech republic',
+    'holland': 'netherlands',
+    'the netherlands': 'netherlands',
+    'uae': 'united arab emirates',
+    'korea': 'south korea',
+    'republic of korea': 'south korea',
+    'turkiye': 'turkey',
+    'macedonia': 'north macedonia',
+    'bosnia': 'bosnia and herzegovina',
+    'vatican': 'vatican city',
+    'holy see': 'vatican city',
+}
+
+
+def normalize(text):
+    """Casefold, drop accents and punctuation: "Kraków " -> "krakow"."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = ''.join(ch if ch.isalnum() else ' ' for ch in text)
+    return ' '.join(text.split())
+
+
+def normalize_country(country):
+    country = normalize(country)
+    return COUNTRY_ALIASES.get(country, country)
+
+
+class Gazetteer:
+    def __init__(self, path):
+        self.path = path
+        self._places = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        places = {}
+        with open(self.path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                key = (normalize(row['city']), normalize_country(row['country']))
+                places[key] = (float(row['latitude']), float(row['longitude']))
+        return places
+
+    @property
+    def places(self):
+        if self._places is None:
+            with self._lock:
+                if self._places is None:
+                    self._places = self._load()
+        return self._places
+
+    def lookup(self, city, country):
+        """Return (latitude, longitude), or None if the city is not listed."""
+        return self.places.get((normalize(city), normalize_country(country)))
+
+
+class RemoteGeocoder:
+    """Nominatim-style /search client, at most one request per `interval` seconds."""
+
+    def __init__(self, url, user_agent='travelog-backend', interval=1.0, timeout=10):
+        self.url = url.rstrip('/')
+        self.user_agent = user_agent
+        self.interval = interval
+        self.timeout = timeout
+        self._last_call = 0.0
+
+    def lookup(self, city, country):
+        wait = self._last_call + self.interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_call = time.monotonic()
+
+        query = urlencode({'city': city, 'country': country, 'format': 'json', 'limit': 1})
+        req = Request(f"{self.url}/search?{query}", headers={'User-Agent': self.user_agent})
+        try:
+            with urlopen(req, timeout=self.timeout) as response:
+                results = json.load(response)
+        except (OSError, ValueError) as e:
+            print(f"Geocoding {city}, {country} failed: {e}")
+            return None
+        if not results:
+            return None
+        return float(results[0]['lat']), float(results[0]['lon'])
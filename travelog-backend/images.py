@@ -0,0 +1,86 @@
+"""Responsive variants for uploaded trip photos.
+
+Each original is decoded once, rotated according to its EXIF orientation
+and written out as WebP at a few fixed widths, plus one full-size copy in
+the original's own format. None of them carries EXIF or XMP, so camera
+and GPS metadata never leave the server; the full-size copy is what
+trip payloads link as a photo's url instead of the upload itself.
+"""
+import os
+
+from PIL import Image, ImageOps
+
+# name -> longest edge in pixels
+VARIANTS = {
+    'thumb': 320,
+    'medium': 960,
+    'large': 1920,
+}
+VARIANT_FORMAT = 'WEBP'
+VARIANT_EXTENSION = 'webp'
+VARIANT_QUALITY = 80
+
+# Formats the full-size copy keeps, with their extension and the modes they
+# can store. Anything else (TIFF, BMP, HEIC, ...) is written as PNG.
+FULL_FORMATS = {
+    'JPEG': ('jpg', ('L', 'RGB', 'CMYK')),
+    'PNG': ('png', ('1', 'L', 'LA', 'P', 'RGB', 'RGBA')),
+    'WEBP': ('webp', ('RGB', 'RGBA')),
+}
+FULL_QUALITY = 92
+
+
+def is_image(mimetype):
+    return bool(mimetype) and mimetype.startswith('image/')
+
+
+def variant_filename(filename, name):
+    return f"{os.path.splitext(filename)[0]}.{name}.{VARIANT_EXTENSION}"
+
+
+def save_full(image, folder, filename, source_format, icc_profile):
+    """Write the upright, metadata-free full-size copy of `filename`."""
+    fmt = source_format if source_format in FULL_FORMATS else 'PNG'
+    extension, modes = FULL_FORMATS[fmt]
+    out_name = f"{os.path.splitext(filename)[0]}.full.{extension}"
+    out_path = os.path.join(folder, out_name)
+    if not os.path.exists(out_path):
+        full = image if image.mode in modes else image.convert('RGBA' if 'A' in image.getbands() and 'RGBA' in modes else 'RGB')
+        full = full.copy()
+        # Plugins fall back to image.info for exif/xmp, so drop all of it
+        full.info = {}
+        options = {'icc_profile': icc_profile} if icc_profile else {}
+        if fmt != 'PNG':
+            options['quality'] = FULL_QUALITY
+        full.save(out_path, fmt, **options)
+    return {'filename': out_name, 'width': image.width, 'height': image.height}
+
+
+def make_variants(folder, filename):
+    """Write every variant of `folder/filename` next to it.
+
+    Returns {name: {"filename", "width", "height"}}, including 'full'. A
+    variant is never upscaled, so small originals produce variants at
+    their own size.
+    """
+    with Image.open(os.path.join(folder, filename)) as original:
+        image = ImageOps.exif_transpose(original)
+        variants = {'full': save_full(image, folder, filename, original.format, original.info.get('icc_profile'))}
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        # Largest first, so each smaller variant resamples fewer pixels.
+        for name, size in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+            image = image.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+            out_name = variant_filename(filename, name)
+            out_path = os.path.join(folder, out_name)
+            # Identical uploads share a blob, so their variants may exist already
+            if not os.path.exists(out_path):
+                image.save(out_path, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            variants[name] = {
+                'filename': out_name,
+                'width': image.width,
+                'height': image.height,
+            }
+        return variants
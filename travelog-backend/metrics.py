@@ -0,0 +1,346 @@
+"""Per-request database and serialization timings, exported for Prometheus.
+
+Every request carries a RequestStats (in flask.g). It counts the SQL
+statements the request runs and the time spent in them, through cursor
+events on every engine, and the time spent encoding JSON through
+TimedJSONProvider. app.py reports the totals in a Server-Timing header
+and adds them to the per-route histograms of a MetricsRegistry, which
+renders the Prometheus text format for GET /metrics.
+
+Statements are also grouped by shape: the SQL text with the values of
+IN lists folded together. A request that runs one shape many times is
+usually loading rows one at a time in a loop (an N+1 query).
+
+Each process keeps its own registry. With several worker processes, give
+them a shared directory (METRICS_DIR). Every worker then writes a
+snapshot there once a second while it has new requests, and /metrics,
+whichever worker answers it, adds up the snapshots. A worker that exits
+adds its counts to exited.json and removes its own snapshot, under a
+lock on the directory, so the directory holds one file per live worker
+plus that total and the counters never go backwards when a worker is
+recycled. A worker killed before it could do that leaves its last
+snapshot behind; it keeps being counted, and a later worker that gets
+the same pid adds it to the total before writing its own.
+"""
+import atexit
+from collections import Counter as Tally
+from contextlib import contextmanager
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from flask import g, has_app_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no forking workers, so nothing shares the directory
+    fcntl = None
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Counts of the workers that have exited, in METRICS_DIR
+EXITED_SNAPSHOT = 'exited.json'
+
+# A parenthesised list of bind parameters in any DBAPI's paramstyle
+PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+))*\s*\)")
+
+
+def statement_shape(statement):
+    """The statement with IN lists of any length written the same way."""
+    return PARAMETER_LIST.sub('(?)', statement)
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_seconds', 'serialize_seconds', 'shapes')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.shapes = Tally()
+
+    def add_query(self, statement, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        """(shape, count) of the shapes that ran more than threshold times."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, elapsed):
+        noun = 'query' if self.queries == 1 else 'queries'
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} {noun}", '
+                f'serialize;dur={self.serialize_seconds * 1000:.1f}, '
+                f'total;dur={elapsed * 1000:.1f}')
+
+
+def current_stats():
+    return g.get('request_stats') if has_app_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    started = getattr(context, '_query_started', None)
+    if stats is not None and started is not None:
+        stats.add_query(statement, time.perf_counter() - started)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, adding encoding time to the request's stats."""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.serialize_seconds += time.perf_counter() - started
+
+
+class Metric:
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.series = {}
+
+    def snapshot(self):
+        return {'type': self.type, 'help': self.description, 'labels': list(self.labels),
+                'series': [[list(key), value] for key, value in self.series.items()]}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, description, labels, buckets):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        # [count per bucket..., count above the last bucket, sum]
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[n] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def snapshot(self):
+        return dict(super().snapshot(), buckets=list(self.buckets))
+
+
+def label_text(names, values, extra=''):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    pairs = [f'{name}="{value}"' for name, value in zip(names, escaped)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def merge(snapshots):
+    """Add snapshots up. Series come back as a {labels tuple: value} dict."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, series={}))
+            for labels, value in metric['series']:
+                key = tuple(labels)
+                if key not in target['series']:
+                    target['series'][key] = value if metric['type'] == 'counter' else list(value)
+                elif metric['type'] == 'counter':
+                    target['series'][key] += value
+                else:
+                    target['series'][key] = [a + b for a, b in zip(target['series'][key], value)]
+    return merged
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.metrics = {}
+        self.directory = directory or None
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # Serializes this process's flushes with its exit
+        self._file_lock = threading.Lock()
+        self._dirty = False
+        self._flusher_pid = None
+        self._written_pid = None
+        self._retired = False
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            # Covers recycled workers, whose counts must outlive them
+            atexit.register(self.retire)
+
+    def counter(self, name, description, labels=()):
+        self.metrics[name] = Counter(name, description, labels)
+        return self.metrics[name]
+
+    def histogram(self, name, description, labels=(), buckets=DURATION_BUCKETS):
+        self.metrics[name] = Histogram(name, description, labels, buckets)
+        return self.metrics[name]
+
+    def record(self, *observations):
+        """Apply (metric, labels, value) observations under one lock."""
+        with self._lock:
+            for metric, labels, value in observations:
+                if isinstance(metric, Histogram):
+                    metric.observe(labels, value)
+                else:
+                    metric.inc(labels, value)
+            self._dirty = True
+            # Threads don't survive a fork, so every worker starts its own
+            if self.directory and self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    @contextmanager
+    def _directory_lock(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as f:
+            # Released when the file is closed
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def _own_path(self):
+        return os.path.join(self.directory, f'{os.getpid()}.json')
+
+    def _write(self, path, snapshot):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, path)
+
+    def _fold(self, path, snapshot):
+        """Add a snapshot to the exited workers' total and remove `path`. Needs the exclusive lock."""
+        exited_path = os.path.join(self.directory, EXITED_SNAPSHOT)
+        total = merge([read_snapshot(exited_path) or {}, snapshot])
+        self._write(exited_path, {
+            name: dict(metric, series=[[list(key), value] for key, value in metric['series'].items()])
+            for name, metric in total.items()
+        })
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _adopt_stale(self):
+        """Fold in a snapshot a killed worker left under this pid. Needs the exclusive lock."""
+        self._written_pid = os.getpid()
+        stale = read_snapshot(self._own_path())
+        if stale is not None:
+            self._fold(self._own_path(), stale)
+
+    def flush(self):
+        """Write this process's snapshot into the shared directory."""
+        if not self.directory:
+            return
+        with self._file_lock:
+            if self._retired:
+                return
+            self._dirty = False
+            if self._written_pid != os.getpid():
+                with self._directory_lock(exclusive=True):
+                    self._adopt_stale()
+            self._write(self._own_path(), self.snapshot())
+
+    def retire(self):
+        """At exit: add this process's counts to the exited workers' total."""
+        if not self.directory:
+            return
+        with self._file_lock:
+            if self._retired:
+                return
+            self._retired = True
+            with self._directory_lock(exclusive=True):
+                if self._written_pid != os.getpid():
+                    self._adopt_stale()
+                snapshot = self.snapshot()
+                if any(metric['series'] for metric in snapshot.values()):
+                    self._fold(self._own_path(), snapshot)
+
+    def snapshots(self):
+        """Snapshots to add up: this process's, plus every other one in the directory."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            # A file under our pid that we didn't write is a killed worker's
+            own = f'{os.getpid()}.json' if self._written_pid == os.getpid() else None
+            # Shared, so no worker is halfway through folding its counts in
+            with self._directory_lock(exclusive=False):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith('.json') and entry.name != own:
+                        snapshot = read_snapshot(entry.path)
+                        if snapshot is not None:
+                            snapshots.append(snapshot)
+        return snapshots
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        merged = merge(self.snapshots())
+
+        lines = []
+        for name, metric in merged.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in sorted(metric['series'].items()):
+                if metric['type'] == 'counter':
+                    lines.append(f"{name}{label_text(metric['labels'], key)} {number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + ['+Inf'], value):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{label_text(metric['labels'], key, le)} {cumulative}")
+                lines.append(f"{name}_sum{label_text(metric['labels'], key)} {number(value[-1])}")
+                lines.append(f"{name}_count{label_text(metric['labels'], key)} {cumulative}")
+        return '\n'.join(lines) + '\n'
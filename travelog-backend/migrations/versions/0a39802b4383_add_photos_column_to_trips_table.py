@@ -1,7 +1,7 @@
 """Add photos column to trips table
 
 Revision ID: 0a39802b4383
-Revises: 
+Revises: 1f0c9e6b2d57
 Create Date: 2025-04-28 18:52:20.446757
 
 """
@@ -11,15 +11,20 @@ from sqlalchemy.dialects import postgresql
 
 # revision identifiers, used by Alembic.
 revision = '0a39802b4383'
-down_revision = None
+down_revision = '1f0c9e6b2d57'
 branch_labels = None
 depends_on = None
 
 
 def upgrade():
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_table('post')
-    op.drop_table('user')
+    # Left over from an earlier prototype; databases built by the previous
+    # revision never had them
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'post' in tables:
+        op.drop_table('post')
+    if 'user' in tables:
+        op.drop_table('user')
     with op.batch_alter_table('trips', schema=None) as batch_op:
         batch_op.add_column(sa.Column('photos', sa.JSON(), nullable=True))
 
@@ -31,6 +36,9 @@ def downgrade():
     with op.batch_alter_table('trips', schema=None) as batch_op:
         batch_op.drop_column('photos')
 
+    # The prototype tables only ever existed on Postgres
+    if op.get_bind().dialect.name != 'postgresql':
+        return
     op.create_table('user',
     sa.Column('id', sa.INTEGER(), server_default=sa.text("nextval('user_id_seq'::regclass)"), autoincrement=True, nullable=False),
     sa.Column('username', sa.VARCHAR(length=80), autoincrement=False, nullable=False),
@@ -0,0 +1,68 @@
+"""Add hot-path indexes and unique constraints on likes and follows
+
+Revision ID: 453d8e93031b
+Revises: bbff6e019fda
+Create Date: 2026-10-18 15:40:03.118925
+
+On Postgres every index is built CONCURRENTLY, so reads and writes keep
+flowing while it runs. The unique constraints are then attached to their
+already-built indexes. Duplicate likes and follows left behind by the old
+check-then-insert race are removed first, and the counters that depend on
+them are recomputed.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '453d8e93031b'
+down_revision = 'bbff6e019fda'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_comments_trip_created', 'comments', ['trip_id', 'created_at']),
+    ('ix_trips_user_created', 'trips', ['user_id', 'created_at']),
+    ('ix_trips_country_city', 'trips', ['country', 'city']),
+]
+
+UNIQUE_CONSTRAINTS = [
+    ('uq_likes_trip_user', 'likes', ['trip_id', 'user_id']),
+    ('uq_follows_follower_followed', 'follows', ['follower_id', 'followed_id']),
+]
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM likes WHERE id NOT IN "
+        "(SELECT MIN(id) FROM likes GROUP BY trip_id, user_id)"
+    )
+    op.execute(
+        "DELETE FROM follows WHERE id NOT IN "
+        "(SELECT MIN(id) FROM follows GROUP BY follower_id, followed_id)"
+    )
+    op.execute("UPDATE trips SET like_count = (SELECT COUNT(*) FROM likes WHERE likes.trip_id = trips.id)")
+    op.execute("UPDATE users SET follower_count = (SELECT COUNT(*) FROM follows WHERE follows.followed_id = users.id)")
+
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+            for name, table, columns in UNIQUE_CONSTRAINTS:
+                op.create_index(name, table, columns, unique=True, postgresql_concurrently=True)
+                op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.create_unique_constraint(name, columns)
+
+
+def downgrade():
+    for name, table, columns in UNIQUE_CONSTRAINTS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
+    for name, table, columns in INDEXES:
+        op.drop_index(name, table_name=table)
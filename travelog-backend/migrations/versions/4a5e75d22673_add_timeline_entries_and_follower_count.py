@@ -0,0 +1,52 @@
+"""Add timeline_entries table and users.follower_count
+
+Revision ID: 4a5e75d22673
+Revises: 0a39802b4383
+Create Date: 2026-10-18 14:05:12.301447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a5e75d22673'
+down_revision = '0a39802b4383'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE users SET follower_count = "
+        "(SELECT COUNT(*) FROM follows WHERE follows.followed_id = users.id)"
+    )
+
+    op.create_table('timeline_entries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('trip_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['trip_id'], ['trips.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'trip_id')
+    )
+    with op.batch_alter_table('timeline_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_timeline_entries_user_created', ['user_id', 'created_at', 'trip_id'], unique=False)
+        batch_op.create_index('ix_timeline_entries_trip_id', ['trip_id'], unique=False)
+
+    # Timelines are filled by `flask rebuild-timeline` after upgrading.
+
+
+def downgrade():
+    with op.batch_alter_table('timeline_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_timeline_entries_trip_id')
+        batch_op.drop_index('ix_timeline_entries_user_created')
+
+    op.drop_table('timeline_entries')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('follower_count')
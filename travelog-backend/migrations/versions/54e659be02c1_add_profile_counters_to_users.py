@@ -0,0 +1,44 @@
+"""Add following_count, trip_count and photo_version to users
+
+Revision ID: 54e659be02c1
+Revises: a725755de813
+Create Date: 2026-10-18 22:05:41.530217
+
+photo_version starts out empty. Profile photos live in the upload folder,
+not in the database, so `flask reconcile-counters` fills it in for users
+who uploaded one before this revision.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '54e659be02c1'
+down_revision = 'a725755de813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('trip_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('photo_version', sa.BigInteger(), nullable=True))
+
+    op.execute(
+        "UPDATE users SET "
+        "following_count = (SELECT COUNT(*) FROM follows WHERE follows.follower_id = users.id), "
+        "trip_count = (SELECT COUNT(*) FROM trips WHERE trips.user_id = users.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('photo_version')
+        batch_op.drop_column('trip_count')
+        batch_op.drop_column('following_count')
+
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite drops columns by copying the table, which loses expression indexes
+        op.create_index('uq_users_username_lower', 'users', [sa.text('lower(username)')], unique=True, if_not_exists=True)
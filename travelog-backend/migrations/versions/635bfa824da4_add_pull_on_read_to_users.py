@@ -0,0 +1,49 @@
+"""Add users.pull_on_read
+
+Revision ID: 635bfa824da4
+Revises: 54e659be02c1
+Create Date: 2026-10-19 09:12:40.118305
+
+Until this revision an author counted as heavy whenever their live
+follower count was at or above TIMELINE_FANOUT_LIMIT. Authors at or above
+it now are switched to pull mode, which matches what their existing trips
+got: they were never fanned out.
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '635bfa824da4'
+down_revision = '54e659be02c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Not batch mode: SQLite adds the column in place instead of copying the
+    # table, which would lose uq_users_username_lower
+    op.add_column('users', sa.Column('pull_on_read', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Each predicate is written the way that dialect compiles a filter on the
+    # column, which is what lets the planner use the partial index.
+    pull_on_read = sa.column('pull_on_read', sa.Boolean())
+    op.create_index('ix_users_pull_on_read', 'users', ['id'], unique=False,
+                    postgresql_where=pull_on_read, sqlite_where=pull_on_read == sa.true())
+
+    users = sa.table('users', sa.column('follower_count', sa.Integer()), pull_on_read)
+    limit = int(os.getenv("TIMELINE_FANOUT_LIMIT", "10000"))
+    op.execute(users.update().where(users.c.follower_count >= limit).values(pull_on_read=True))
+
+
+def downgrade():
+    op.drop_index('ix_users_pull_on_read', table_name='users')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('pull_on_read')
+
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite drops columns by copying the table, which loses expression indexes
+        op.create_index('uq_users_username_lower', 'users', [sa.text('lower(username)')], unique=True, if_not_exists=True)
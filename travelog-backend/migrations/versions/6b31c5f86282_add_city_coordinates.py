@@ -0,0 +1,31 @@
+"""Add latitude and longitude to cities
+
+Revision ID: 6b31c5f86282
+Revises: 3862da8ca679
+Create Date: 2026-10-18 17:24:10.318842
+
+Existing cities start without coordinates. Run `flask geocode-cities`
+to fill them in from the bundled gazetteer.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b31c5f86282'
+down_revision = '3862da8ca679'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('cities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('cities', schema=None) as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
@@ -0,0 +1,34 @@
+"""Add like_count and comment_count counters to trips
+
+Revision ID: 739d18ad950c
+Revises: 4a5e75d22673
+Create Date: 2026-10-18 14:31:47.918204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '739d18ad950c'
+down_revision = '4a5e75d22673'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trips', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE trips SET "
+        "like_count = (SELECT COUNT(*) FROM likes WHERE likes.trip_id = trips.id), "
+        "comment_count = (SELECT COUNT(*) FROM comments WHERE comments.trip_id = trips.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('trips', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,38 @@
+"""Order the username index byte by byte on Postgres
+
+Revision ID: 8c1f5d2e7a43
+Revises: 635bfa824da4
+Create Date: 2026-10-19 14:03:27.551902
+
+User search scans ranges of lower(username) that only hold under code
+point order, so the index is rebuilt with COLLATE "C" (see lower_bytewise
+in app.py). The new index is built CONCURRENTLY next to the old one, so
+usernames stay unique throughout. SQLite already compares bytes and is
+left alone.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1f5d2e7a43'
+down_revision = '635bfa824da4'
+branch_labels = None
+depends_on = None
+
+
+def rebuild(expression):
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE UNIQUE INDEX CONCURRENTLY uq_users_username_lower_new ON users (({expression}))")
+        op.execute("DROP INDEX CONCURRENTLY uq_users_username_lower")
+        op.execute("ALTER INDEX uq_users_username_lower_new RENAME TO uq_users_username_lower")
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        rebuild('lower(username) COLLATE "C"')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        rebuild('lower(username)')
@@ -0,0 +1,33 @@
+"""Add blobs table for content-addressed uploads
+
+Revision ID: 99f75ed932ae
+Revises: 453d8e93031b
+Create Date: 2026-10-18 16:20:54.671302
+
+Existing uploads keep working under their old names. Run
+`flask dedupe-uploads` to move them into the blob store.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '99f75ed932ae'
+down_revision = '453d8e93031b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blobs',
+    sa.Column('filename', sa.String(length=100), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('filename')
+    )
+
+
+def downgrade():
+    op.drop_table('blobs')
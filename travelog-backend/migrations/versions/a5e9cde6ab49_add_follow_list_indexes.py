@@ -0,0 +1,38 @@
+"""Add keyset indexes for follower and following lists
+
+Revision ID: a5e9cde6ab49
+Revises: df27d16edf6c
+Create Date: 2026-10-18 18:21:05.977413
+
+On Postgres the indexes are built CONCURRENTLY.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5e9cde6ab49'
+down_revision = 'df27d16edf6c'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_follows_followed', 'follows', ['followed_id', 'id']),
+    ('ix_follows_follower', 'follows', ['follower_id', 'id']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,48 @@
+"""Make usernames unique regardless of case
+
+Revision ID: a725755de813
+Revises: a5e9cde6ab49
+Create Date: 2026-10-18 18:55:42.108327
+
+Accounts whose names differ only in case (e.g. "Alice" and "alice") can
+exist from before this revision. Renaming them would lock people out of
+their accounts, so the upgrade stops and lists them instead; rename all
+but one of each group by hand, then run it again. On Postgres the index
+is built CONCURRENTLY.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a725755de813'
+down_revision = 'a5e9cde6ab49'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    clashes = bind.execute(sa.text(
+        "SELECT id, username FROM users u WHERE EXISTS ("
+        "SELECT 1 FROM users o WHERE lower(o.username) = lower(u.username) AND o.id <> u.id) "
+        "ORDER BY lower(username), id"
+    )).fetchall()
+    if clashes:
+        listed = "\n".join(f"  {user_id}: {username!r}" for user_id, username in clashes)
+        raise RuntimeError(
+            "These usernames differ only in case and cannot all be kept; rename all but one "
+            f"of each group, then upgrade again:\n{listed}"
+        )
+
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index('uq_users_username_lower', 'users', [sa.text('lower(username)')],
+                            unique=True, postgresql_concurrently=True)
+    else:
+        op.create_index('uq_users_username_lower', 'users', [sa.text('lower(username)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_users_username_lower', table_name='users')
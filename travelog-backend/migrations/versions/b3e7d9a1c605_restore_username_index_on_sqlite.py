@@ -0,0 +1,44 @@
+"""Restore uq_users_username_lower on SQLite
+
+Revision ID: b3e7d9a1c605
+Revises: 8c1f5d2e7a43
+Create Date: 2026-10-20 10:21:54.307118
+
+635bfa824da4 used to add users.pull_on_read in batch mode, which on
+SQLite copies the table and left it without the case-insensitive
+username index. Databases upgraded through that version get it back
+here. Names that clashed in the meantime are listed, as in a725755de813.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e7d9a1c605'
+down_revision = '8c1f5d2e7a43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        return
+    clashes = bind.execute(sa.text(
+        "SELECT id, username FROM users u WHERE EXISTS ("
+        "SELECT 1 FROM users o WHERE lower(o.username) = lower(u.username) AND o.id <> u.id) "
+        "ORDER BY lower(username), id"
+    )).fetchall()
+    if clashes:
+        listed = "\n".join(f"  {user_id}: {username!r}" for user_id, username in clashes)
+        raise RuntimeError(
+            "These usernames differ only in case and cannot all be kept; rename all but one "
+            f"of each group, then upgrade again:\n{listed}"
+        )
+    op.create_index('uq_users_username_lower', 'users', [sa.text('lower(username)')], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    # The index belongs to a725755de813; nothing to undo
+    pass
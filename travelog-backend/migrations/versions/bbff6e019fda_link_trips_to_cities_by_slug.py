@@ -0,0 +1,105 @@
+"""Link trips to cities and add a unique city slug
+
+Revision ID: bbff6e019fda
+Revises: 739d18ad950c
+Create Date: 2026-10-18 15:02:39.550713
+
+The backfill runs in batches of BATCH_SIZE trip rows. On Postgres each
+batch commits on its own and the trips.city_id index is built
+CONCURRENTLY, so the trips table stays readable and writable throughout.
+Trips written by old code during a rollout can be linked afterwards with
+`flask backfill-trip-cities`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bbff6e019fda'
+down_revision = '739d18ad950c'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def city_slug(name, country):
+    return f"{'-'.join(name.lower().split())}_{'-'.join(country.lower().split())}"
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    if not sa.inspect(bind).has_table('cities'):
+        op.create_table('cities',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('country', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    with op.batch_alter_table('cities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slug', sa.String(length=255), nullable=True))
+
+    # Nothing referenced cities before this revision, so duplicate rows can go.
+    seen = set()
+    for city_id, name, country in bind.execute(sa.text("SELECT id, name, country FROM cities ORDER BY id")).fetchall():
+        slug = city_slug(name, country)
+        if slug in seen:
+            bind.execute(sa.text("DELETE FROM cities WHERE id = :id"), {"id": city_id})
+        else:
+            seen.add(slug)
+            bind.execute(sa.text("UPDATE cities SET slug = :slug WHERE id = :id"), {"slug": slug, "id": city_id})
+
+    with op.batch_alter_table('cities', schema=None) as batch_op:
+        batch_op.alter_column('slug', existing_type=sa.String(length=255), nullable=False)
+        batch_op.create_index('ix_cities_slug', ['slug'], unique=True)
+
+    # Adding a nullable column without a default does not rewrite the table.
+    with op.batch_alter_table('trips', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('city_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('trips_city_id_fkey', 'cities', ['city_id'], ['id'])
+
+    if is_postgres:
+        with op.get_context().autocommit_block():
+            op.create_index('ix_trips_city_id', 'trips', ['city_id'], unique=False, postgresql_concurrently=True)
+            backfill(bind)
+    else:
+        op.create_index('ix_trips_city_id', 'trips', ['city_id'], unique=False)
+        backfill(bind)
+
+
+def backfill(bind):
+    # Inside autocommit_block every batch UPDATE commits as it runs.
+    city_ids = dict(bind.execute(sa.text("SELECT slug, id FROM cities")).fetchall())
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, city, country FROM trips "
+            "WHERE city_id IS NULL AND id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        updates = []
+        for trip_id, name, country in rows:
+            slug = city_slug(name, country)
+            if slug not in city_ids:
+                city_ids[slug] = bind.execute(sa.text(
+                    "INSERT INTO cities (name, country, slug) VALUES (:name, :country, :slug) RETURNING id"
+                ), {"name": name.strip(), "country": country.strip(), "slug": slug}).scalar()
+            updates.append({"id": trip_id, "city_id": city_ids[slug]})
+        bind.execute(sa.text("UPDATE trips SET city_id = :city_id WHERE id = :id"), updates)
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    op.drop_index('ix_trips_city_id', table_name='trips')
+    with op.batch_alter_table('trips', schema=None) as batch_op:
+        batch_op.drop_constraint('trips_city_id_fkey', type_='foreignkey')
+        batch_op.drop_column('city_id')
+
+    with op.batch_alter_table('cities', schema=None) as batch_op:
+        batch_op.drop_index('ix_cities_slug')
+        batch_op.drop_column('slug')
@@ -0,0 +1,45 @@
+"""Add cities.geohash and spatial lookup indexes
+
+Revision ID: df27d16edf6c
+Revises: 6b31c5f86282
+Create Date: 2026-10-18 17:52:37.640195
+
+cities.geohash is filled in by `flask geocode-cities` for cities that
+were geocoded before this revision. On Postgres the indexes are built
+CONCURRENTLY.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'df27d16edf6c'
+down_revision = '6b31c5f86282'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_cities_geohash', 'cities', ['geohash']),
+    ('ix_trips_city_created', 'trips', ['city_id', 'created_at']),
+]
+
+
+def upgrade():
+    with op.batch_alter_table('cities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in INDEXES:
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table('cities', schema=None) as batch_op:
+        batch_op.drop_column('geohash')
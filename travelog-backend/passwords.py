@@ -0,0 +1,98 @@
+"""Password hashing off the request threads.
+
+Hashing is CPU bound by design. Run on a request thread it holds the GIL
+for tens of milliseconds, and logins queue up behind each other. Here
+the work runs in a process pool, so it can use every core, and request
+threads only wait for the result.
+
+The number of hashes in flight is capped. Past the cap a request fails
+at once with PasswordHasherBusy, which the routes turn into a 503, so a
+login burst cannot queue up more work than the pool can finish.
+
+Hashes are Werkzeug's "<method>$<salt>$<hash>" strings. A login with a
+hash made under other parameters returns a fresh hash to store.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+import multiprocessing
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_method_prefixes = {}
+
+
+def _method_prefix(method):
+    # Werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1"), so the
+    # stored prefix for a method is learned from one real hash.
+    if method not in _method_prefixes:
+        _method_prefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _method_prefixes[method]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password, method):
+    """Return (matches, new_hash). new_hash is None unless the parameters changed."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if pwhash.split('$', 1)[0] == _method_prefix(method):
+        return True, None
+    return True, generate_password_hash(password, method=method)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', workers=2, max_pending=8, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        # Started on first use, so CLI commands never spawn workers
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # Forking a threaded server copies locks other threads
+                    # may hold; the forkserver starts hashers from a clean
+                    # single-threaded process instead.
+                    context = None
+                    if 'forkserver' in multiprocessing.get_all_start_methods():
+                        context = multiprocessing.get_context('forkserver')
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot stays taken until the worker is done, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password. Returns (matches, new_hash_to_store_or_None)."""
+        return self._run(_verify, pwhash, password, self.method)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
@@ -0,0 +1,137 @@
+"""Production server for the backend, built on gunicorn.
+
+Run from travelog-backend/, after `flask db upgrade`:
+
+    python3 serve.py
+
+Settings come from the environment (see .env.example):
+
+    WEB_BIND                  address to listen on (0.0.0.0:5050)
+    WEB_WORKERS               worker processes (one per core)
+    WEB_THREADS               threads per worker (8)
+    WEB_WORKER_CLASS          gthread (WSGI, app.py) or asgi (asgi.py
+                              under uvicorn's worker)
+    WEB_MAX_REQUESTS          recycle a worker after this many requests,
+                              +/- WEB_MAX_REQUESTS_JITTER so they don't
+                              all restart at once (0 disables)
+    WEB_TIMEOUT               seconds before a silent worker is killed
+    WEB_GRACEFUL_TIMEOUT      seconds a stopping worker gets to finish
+    WEB_PIDFILE               where to write the master's pid
+    METRICS_DIR               where workers leave their request metrics
+                              for /metrics to add up (a new temporary
+                              directory each start when unset)
+    CACHE_URL                 with more than one worker, use redis://;
+                              a memory:// cache has its CACHE_TTL capped
+                              at MEMORY_CACHE_MAX_TTL seconds, since each
+                              worker only drops its own stale entries
+
+The app is loaded once in the master (preload), which also builds the
+city index and the follow graph. Workers are forked from it and start
+with those already in memory, sharing the pages copy-on-write until
+they rebuild. Database connections are never carried across the fork.
+
+Signals to the master:
+
+    HUP   start fresh workers with the current settings, then stop the
+          old ones gracefully. Code is not reloaded, because it was
+          loaded before the fork.
+    USR2  start a second master running the new code; send WINCH and
+          then QUIT to the old one once it is up.
+    TERM  stop after the in-flight requests finish (WEB_GRACEFUL_TIMEOUT).
+
+Photo processing runs on a thread pool inside each worker, so a worker
+that is recycled or killed drops the photos still queued there; they stay
+pending until `flask process-pending-photos` runs (from cron, say).
+"""
+import gc
+import os
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+load_dotenv()
+
+WORKER_CLASSES = {
+    'gthread': 'gthread',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+
+# A memory:// cache is per worker and only sees that worker's invalidations,
+# so with several workers its entries may be this many seconds stale.
+MEMORY_CACHE_MAX_TTL = 5
+
+
+def settings():
+    worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")
+    return {
+        'bind': os.getenv("WEB_BIND", "0.0.0.0:5050"),
+        'workers': int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1))),
+        'threads': int(os.getenv("WEB_THREADS", "8")),
+        'worker_class': WORKER_CLASSES.get(worker_class, worker_class),
+        'max_requests': int(os.getenv("WEB_MAX_REQUESTS", "10000")),
+        'max_requests_jitter': int(os.getenv("WEB_MAX_REQUESTS_JITTER", "1000")),
+        'timeout': int(os.getenv("WEB_TIMEOUT", "30")),
+        'graceful_timeout': int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30")),
+        'pidfile': os.getenv("WEB_PIDFILE") or None,
+        'preload_app': True,
+        'when_ready': when_ready,
+        'post_fork': post_fork,
+    }
+
+
+def when_ready(server):
+    # Everything allocated so far is shared with the workers. Moving it out
+    # of the collector's reach stops a collection in a worker from touching
+    # (and so copying) those pages.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app as travelog
+
+    # Pooled connections opened in the master belong to the master; drop
+    # them without closing, so each worker opens its own.
+    with travelog.app.app_context():
+        for engine in travelog.db.engines.values():
+            engine.dispose(close=False)
+    if server.cfg.worker_class_str == WORKER_CLASSES['asgi']:
+        import asgi
+        asgi.async_engine.sync_engine.dispose(close=False)
+
+
+class TravelogServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import create_app
+
+        app = create_app()
+        if self.cfg.worker_class_str == WORKER_CLASSES['asgi']:
+            import asgi
+            return asgi.application
+        return app
+
+
+if __name__ == '__main__':
+    options = settings()
+    # app.py splits the cores between the workers' password hashing pools
+    os.environ['WEB_WORKERS'] = str(options['workers'])
+    # Each worker only sees its own requests; /metrics needs all of them
+    if options['workers'] > 1 and not os.getenv("METRICS_DIR"):
+        os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='travelog-metrics-')
+    if options['workers'] > 1 and os.getenv("CACHE_URL", "memory://").startswith('memory://'):
+        ttl = min(int(os.getenv("CACHE_TTL", "300")), MEMORY_CACHE_MAX_TTL)
+        os.environ['CACHE_TTL'] = str(ttl)
+        print(f"CACHE_URL is memory:// with {options['workers']} workers, which don't see each other's "
+              f"invalidations; CACHE_TTL is capped at {ttl}s. Set a redis:// CACHE_URL to share the cache.",
+              file=sys.stderr)
+    TravelogServer(options).run()
@@ -0,0 +1,115 @@
+"""Content-addressed file storage for uploads.
+
+A blob is named after the SHA-256 of its bytes plus the lowercase
+extension of the uploaded filename. Uploading the same photo twice
+therefore yields the same name, and the file exists on disk once.
+Reference counts live in the database (see the Blob model in app.py), so
+they are shared by every worker process. Resumable upload sessions are
+staged under .sessions/ and moved into the store when they are finalized.
+"""
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    def __init__(self, folder):
+        self.folder = folder
+
+    def path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    def _blob_name(self, digest, original_name):
+        extension = os.path.splitext(original_name or '')[1].lower()
+        return f"{digest.hexdigest()}{extension}"
+
+    def write_temp(self, stream, original_name):
+        """Stream an upload to a temporary file, hashing it on the way.
+
+        Returns (temp_path, blob_filename, size). Nothing is visible under
+        the blob name until commit() is called.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            self.discard(temp_path)
+            raise
+        return temp_path, self._blob_name(digest, original_name), size
+
+    def commit(self, temp_path, filename):
+        """Move a temporary upload into place under its blob name.
+
+        Identical content may already be stored; replacing it is atomic
+        and leaves the same bytes behind.
+        """
+        os.replace(temp_path, self.path(filename))
+
+    # ----- resumable upload sessions -----
+    def session_path(self, session_id):
+        return os.path.join(self.folder, '.sessions', session_id)
+
+    def create_session(self, session_id):
+        path = self.session_path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+    def write_chunk(self, session_id, offset, stream):
+        """Write a request body into a session file at `offset`.
+
+        The body is copied CHUNK_SIZE bytes at a time, so memory use does
+        not depend on the chunk size the client picked. Returns the number
+        of bytes written.
+        """
+        written = 0
+        with open(self.session_path(session_id), 'r+b') as out:
+            out.seek(offset)
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                written += len(chunk)
+            out.truncate(offset + written)
+        return written
+
+    def finalize_session(self, session_id, original_name, size):
+        """Hash a completed session file and return (temp_path, blob_filename, size).
+
+        The file is first cut to `size`, the last acknowledged offset, so a
+        rejected chunk cannot leak into the blob. The session file itself
+        becomes the temporary file, so commit() moves it into place without
+        copying it.
+        """
+        path = self.session_path(session_id)
+        os.truncate(path, size)
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+        return path, self._blob_name(digest, original_name), size
+
+    def discard(self, temp_path):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    def delete(self, filename):
+        path = self.path(filename)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,81 @@
+"""The app on two throwaway SQLite files: a primary and one read replica.
+
+app.py reads its configuration when it is imported, so the environment is
+set before the first import. Every test starts with empty tables, an empty
+response cache and empty in-memory indexes. GET routes marked @read_only
+read from the replica, so call replicate() once the primary holds what a
+test is going to read. Read-your-writes marks start empty as well.
+"""
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+DATABASE_DIR = tempfile.mkdtemp(prefix='travelog-tests-')
+PRIMARY_PATH = os.path.join(DATABASE_DIR, 'primary.db')
+REPLICA_PATH = os.path.join(DATABASE_DIR, 'replica.db')
+
+os.environ.update(
+    DATABASE_URL=f'sqlite:///{PRIMARY_PATH}',
+    DATABASE_REPLICA_URLS=f'sqlite:///{REPLICA_PATH}',
+    JWT_SECRET_KEY='test-secret-key-that-is-long-enough',
+    CACHE_URL='memory://',
+    METRICS_DIR='',
+    # Hash on the calling thread instead of starting a process pool
+    PASSWORD_HASH_WORKERS='0',
+)
+
+import app as travelog  # noqa: E402
+from cache import make_cache  # noqa: E402
+from db_routing import LocalWriteMarks  # noqa: E402
+
+
+def replicate():
+    """Copy the primary onto the replica, as streaming replication would."""
+    source = sqlite3.connect(PRIMARY_PATH)
+    target = sqlite3.connect(REPLICA_PATH)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def refresh_indexes():
+    """Reload the follow graph and city index from the primary."""
+    with travelog.app.app_context():
+        travelog.follow_graph.build()
+        travelog.city_index.build()
+
+
+class DeferredPool:
+    """Stands in for an executor, running submitted jobs when the test says so."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def run(self):
+        for fn, args in self.jobs:
+            fn(*args)
+        self.jobs = []
+
+
+@pytest.fixture
+def app(monkeypatch):
+    with travelog.app.app_context():
+        travelog.db.drop_all()
+        travelog.db.create_all()
+    replicate()
+    monkeypatch.setattr(travelog, 'response_cache', make_cache('memory://'))
+    monkeypatch.setattr(travelog.replica_router, 'store', LocalWriteMarks(travelog.replica_router.window))
+    refresh_indexes()
+    return travelog.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
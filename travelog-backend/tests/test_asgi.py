@@ -0,0 +1,56 @@
+"""Request bodies on the ASGI entry point."""
+import asyncio
+import json
+
+import pytest
+
+import app as travelog
+import asgi
+
+
+def scope(path):
+    return {
+        'type': 'http', 'method': 'POST', 'path': path, 'root_path': '', 'query_string': b'',
+        'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        # Chunked: no Content-Length
+        'headers': [(b'content-type', b'application/json'), (b'transfer-encoding', b'chunked')],
+    }
+
+
+def call(path, chunks):
+    """Send `chunks` as the body of a POST; returns (status, body, messages received)."""
+    received = []
+    sent = []
+
+    async def receive():
+        if len(received) == len(chunks):
+            raise AssertionError('read past the end of the body')
+        received.append(chunks[len(received)])
+        return {'type': 'http.request', 'body': received[-1], 'more_body': len(received) < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.application(scope(path), receive, send))
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return sent[0]['status'], body, len(received)
+
+
+@pytest.fixture
+def account(client):
+    response = client.post('/signup', json={'username': 'chunky', 'email': 'chunky@example.com', 'password': 'secret'})
+    assert response.status_code == 201
+
+
+def test_chunked_body_reaches_the_view(account):
+    payload = json.dumps({'username': 'chunky', 'password': 'secret'}).encode()
+    status, body, _ = call('/login', [payload[:10], payload[10:20], payload[20:]])
+    assert status == 200, body
+    assert json.loads(body)['user']['username'] == 'chunky'
+
+
+def test_body_past_max_content_length_is_refused_unread(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 100)
+    status, _, received = call('/login', [b' ' * 64] * 10)
+    assert status == 413
+    assert received == 2
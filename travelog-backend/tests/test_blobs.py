@@ -0,0 +1,94 @@
+"""Reference counting of content-addressed trip uploads."""
+import io
+import os
+
+import pytest
+
+from conftest import DeferredPool
+from storage import BlobStore
+import app as travelog
+
+PDF = b'%PDF-1.4 itinerary'
+
+
+@pytest.fixture
+def uploads(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(travelog, 'blob_store', BlobStore(str(tmp_path)))
+    monkeypatch.setattr(travelog, 'image_pool', DeferredPool())
+    with app.app_context():
+        user = travelog.User(username='traveller', email='traveller@example.com', password='x')
+        travelog.db.session.add(user)
+        travelog.db.session.commit()
+        return tmp_path, user.id
+
+
+def post_trip(client, user_id, name):
+    response = client.post('/trips', data={
+        'user_id': str(user_id), 'city': 'Prague', 'country': 'Czech Republic',
+        'startDate': '2024-01-01', 'endDate': '2024-01-03',
+        'media': (io.BytesIO(PDF), name, 'application/pdf'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['trip']['id']
+
+
+def blob(filename):
+    with travelog.app.app_context():
+        row = travelog.db.session.get(travelog.Blob, filename)
+        return row and row.ref_count
+
+
+def blob_filename(trip_id):
+    with travelog.app.app_context():
+        return travelog.db.session.get(travelog.Trip, trip_id).photos[0]['filename']
+
+
+def test_a_shared_blob_outlives_one_of_its_trips(client, uploads):
+    folder, user_id = uploads
+    first = post_trip(client, user_id, 'itinerary.pdf')
+    second = post_trip(client, user_id, 'copy of itinerary.PDF')
+    filename = blob_filename(first)
+    assert blob_filename(second) == filename
+    assert blob(filename) == 2
+    assert sorted(os.listdir(folder)) == [filename]
+
+    assert client.delete(f'/trips/{first}').status_code == 200
+    assert blob(filename) == 1
+    assert (folder / filename).read_bytes() == PDF
+
+    assert client.delete(f'/trips/{second}').status_code == 200
+    assert blob(filename) is None
+    assert os.listdir(folder) == []
+
+
+def test_files_stay_when_the_delete_fails(client, uploads, monkeypatch):
+    folder, user_id = uploads
+    trip_id = post_trip(client, user_id, 'itinerary.pdf')
+    filename = blob_filename(trip_id)
+
+    def fail():
+        raise RuntimeError('database went away')
+    with monkeypatch.context() as patch:
+        patch.setattr(travelog.db.session, 'commit', fail)
+        assert client.delete(f'/trips/{trip_id}').status_code == 500
+
+    assert (folder / filename).exists()
+    assert blob(filename) == 1
+    with travelog.app.app_context():
+        assert travelog.db.session.get(travelog.Trip, trip_id)
+
+
+def test_a_blob_acquired_again_after_its_release_is_kept(client, uploads):
+    folder, user_id = uploads
+    trip_id = post_trip(client, user_id, 'itinerary.pdf')
+    filename = blob_filename(trip_id)
+    with travelog.app.app_context():
+        assert travelog.release_blob(filename)
+        travelog.db.session.commit()
+        # Another upload of the same bytes committed before the files went
+        travelog.acquire_blob(filename, len(PDF))
+        travelog.db.session.commit()
+        travelog.remove_released_blobs([(filename, [filename])])
+    assert (folder / filename).exists()
+    assert blob(filename) == 1
@@ -0,0 +1,202 @@
+"""The Redis cache backend against a RESP stand-in, and the keys each write route drops."""
+from datetime import date
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from cache import RedisCache
+import app as travelog
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line[:1] == b'*'
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, args):
+        server = self.server
+        name = args[0].upper()
+        if server.broken:
+            return b'-ERR stand-in is broken\r\n'
+        if name in (b'PING', b'AUTH', b'SELECT'):
+            return b'+OK\r\n'
+        if name == b'SET':
+            expires_at = None
+            if len(args) > 3 and args[3].upper() == b'PX':
+                expires_at = time.monotonic() + int(args[4]) / 1000
+            server.data[args[1]] = (args[2], expires_at)
+            return b'+OK\r\n'
+        if name == b'MGET':
+            parts = [b'*%d\r\n' % (len(args) - 1)]
+            for key in args[1:]:
+                value, expires_at = server.data.get(key, (None, None))
+                if value is None or (expires_at is not None and expires_at < time.monotonic()):
+                    parts.append(b'$-1\r\n')
+                else:
+                    parts.append(b'$%d\r\n%s\r\n' % (len(value), value))
+            return b''.join(parts)
+        if name == b'DEL':
+            return b':%d\r\n' % sum(server.data.pop(key, None) is not None for key in args[1:])
+        return b'-ERR unknown command\r\n'
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            self.wfile.write(self.reply(args))
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """Just enough of the Redis protocol for RedisCache: SET PX, MGET, DEL."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.data = {}
+        self.broken = False
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self.server_address[1]}/0'
+
+    def keys(self):
+        return {key.decode() for key in self.data}
+
+
+@pytest.fixture
+def resp_server():
+    server = RespServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_set_delete(resp_server):
+    cache = RedisCache(resp_server.url, ttl=60)
+    cache.set_many({'trip:1': {'id': 1}, 'trip:2': [1, 2]})
+    assert cache.get_many(['trip:1', 'trip:2', 'trip:3']) == {'trip:1': {'id': 1}, 'trip:2': [1, 2]}
+    assert resp_server.keys() == {'travelog:trip:1', 'travelog:trip:2'}
+
+    cache.delete('trip:1')
+    assert cache.get_many(['trip:1', 'trip:2']) == {'trip:2': [1, 2]}
+    assert cache.info()['hits'] == 3 and cache.info()['misses'] == 2
+
+
+def test_entries_expire_after_the_ttl(resp_server):
+    cache = RedisCache(resp_server.url, ttl=0.05)
+    cache.set_many({'trip:1': 1})
+    time.sleep(0.1)
+    assert cache.get_many(['trip:1']) == {}
+
+
+def test_error_replies_read_as_misses(resp_server):
+    cache = RedisCache(resp_server.url, ttl=60)
+    cache.set_many({'trip:1': 1})
+    resp_server.broken = True
+    assert cache.get_many(['trip:1']) == {}
+    cache.set_many({'trip:2': 2})
+    cache.delete('trip:1')
+    assert cache.info()['errors'] == 3
+
+    # The next call reconnects
+    resp_server.broken = False
+    assert cache.get_many(['trip:1']) == {'trip:1': 1}
+
+
+def test_unreachable_server_reads_as_misses():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    cache = RedisCache(f'redis://127.0.0.1:{port}/0', ttl=60, timeout=0.2)
+    assert cache.get_many(['trip:1']) == {}
+    cache.set_many({'trip:1': 1})
+    cache.delete('trip:1')
+    assert cache.info()['errors'] == 3
+
+
+# ----------------------- Invalidation by the write routes -----------------------
+
+@pytest.fixture
+def cached(app, monkeypatch, resp_server):
+    """A trip in Prague by `author`, a second user `fan`, and every read key cached."""
+    monkeypatch.setattr(travelog, 'response_cache', RedisCache(resp_server.url, ttl=60))
+    with app.app_context():
+        author = travelog.User(username='author', email='author@example.com', password='x')
+        fan = travelog.User(username='fan', email='fan@example.com', password='x')
+        travelog.db.session.add_all([author, fan])
+        travelog.db.session.flush()
+        city = travelog.get_or_create_city('Prague', 'Czech Republic')
+        trip = travelog.Trip(user_id=author.id, city='Prague', country='Czech Republic', city_id=city.id,
+                             start_date=date(2024, 1, 1), end_date=date(2024, 1, 3))
+        travelog.db.session.add(trip)
+        travelog.db.session.commit()
+        ids = {'author': author.id, 'fan': fan.id, 'trip': trip.id, 'city': city.slug}
+    keys = [f"trip:{ids['trip']}", f"city:{ids['city']}:trips", f"city:{ids['city']}:users",
+            f"user:{ids['author']}:followers", 'trip:999']
+    travelog.response_cache.set_many({key: 'cached' for key in keys})
+    return ids, resp_server
+
+
+def dropped(resp_server, ids):
+    everything = {f"trip:{ids['trip']}", f"city:{ids['city']}:trips", f"city:{ids['city']}:users",
+                  f"user:{ids['author']}:followers", 'trip:999'}
+    return everything - {key[len('travelog:'):] for key in resp_server.keys()}
+
+
+def test_like_and_unlike_drop_the_trip(client, cached):
+    ids, server = cached
+    assert client.post(f"/trips/{ids['trip']}/like", json={'user_id': ids['fan']}).status_code == 200
+    assert dropped(server, ids) == {f"trip:{ids['trip']}"}
+    travelog.response_cache.set_many({f"trip:{ids['trip']}": 'cached'})
+    assert client.post(f"/trips/{ids['trip']}/unlike", json={'user_id': ids['fan']}).status_code == 200
+    assert dropped(server, ids) == {f"trip:{ids['trip']}"}
+
+
+def test_comment_and_its_deletion_drop_the_trip(client, cached):
+    ids, server = cached
+    response = client.post(f"/trips/{ids['trip']}/comment", json={'user_id': ids['fan'], 'content': 'Lovely'})
+    assert response.status_code == 201
+    assert dropped(server, ids) == {f"trip:{ids['trip']}"}
+    travelog.response_cache.set_many({f"trip:{ids['trip']}": 'cached'})
+    assert client.delete(f"/comments/{response.get_json()['id']}").status_code == 200
+    assert dropped(server, ids) == {f"trip:{ids['trip']}"}
+
+
+def test_add_trip_drops_its_city(client, cached):
+    ids, server = cached
+    response = client.post('/trips', data={
+        'user_id': str(ids['author']), 'city': 'Prague', 'country': 'Czech Republic',
+        'startDate': '2024-02-01', 'endDate': '2024-02-03'
+    })
+    assert response.status_code == 201
+    assert dropped(server, ids) == {f"city:{ids['city']}:trips", f"city:{ids['city']}:users"}
+
+
+def test_delete_trip_drops_the_trip_and_its_city(client, cached):
+    ids, server = cached
+    assert client.delete(f"/trips/{ids['trip']}").status_code == 200
+    assert dropped(server, ids) == {f"trip:{ids['trip']}", f"city:{ids['city']}:trips", f"city:{ids['city']}:users"}
+
+
+def test_follow_and_unfollow_drop_the_followers_list(client, cached):
+    ids, server = cached
+    followers = f"user:{ids['author']}:followers"
+    assert client.post(f"/users/{ids['fan']}/follow", json={'target_user_id': ids['author']}).status_code == 200
+    assert dropped(server, ids) == {followers}
+    travelog.response_cache.set_many({followers: 'cached'})
+    assert client.post(f"/users/{ids['fan']}/unfollow", json={'target_user_id': ids['author']}).status_code == 200
+    assert dropped(server, ids) == {followers}
@@ -0,0 +1,65 @@
+"""Reloading the city index off the request path."""
+import threading
+import time
+
+import pytest
+
+from city_index import CityIndex
+
+
+def join_builds():
+    for thread in threading.enumerate():
+        if thread.name == 'city-index-build':
+            thread.join(5)
+
+
+def test_stale_index_reloads_in_background_and_keeps_concurrent_adds():
+    rows = [('Prague', 'Czech Republic', 3)]
+    calls = []
+    loading, release = threading.Event(), threading.Event()
+
+    def loader():
+        calls.append(1)
+        snapshot = list(rows)
+        if len(calls) == 2:
+            # The first reload stalls until the test lets it go
+            loading.set()
+            release.wait(5)
+        return snapshot
+
+    index = CityIndex(loader, max_age=0)
+    index.build()
+    time.sleep(0.01)
+
+    started = time.monotonic()
+    assert [match['city'] for match in index.search('pra')] == ['Prague']
+    assert time.monotonic() - started < 1
+    assert loading.wait(5)
+
+    # Committed after the reload read its rows
+    rows.append(('Paris', 'France', 1))
+    index.add('Paris', 'France')
+    release.set()
+    join_builds()
+
+    assert [(match['city'], match['count']) for match in index.search('par')] == [('Paris', 1)]
+    join_builds()
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_failed_reload_keeps_the_previous_index():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError('database went away')
+        return [('Lisbon', 'Portugal', 2)]
+
+    index = CityIndex(loader, max_age=0)
+    index.build()
+    time.sleep(0.01)
+    index.search('lis')
+    join_builds()
+    assert [match['city'] for match in index.search('lis')] == ['Lisbon']
+    join_builds()
@@ -0,0 +1,65 @@
+"""Read-only GETs go to the replica, except for users who just wrote."""
+import pytest
+
+from cache import make_cache
+from conftest import replicate
+import app as travelog
+
+
+@pytest.fixture
+def users(app):
+    with app.app_context():
+        users = [travelog.User(username=name, email=f'{name}@example.com', password='x') for name in ('writer', 'reader')]
+        travelog.db.session.add_all(users)
+        travelog.db.session.commit()
+        ids = [user.id for user in users]
+    replicate()
+    return ids
+
+
+def post_trip(client, user_id):
+    response = client.post('/trips', data={
+        'user_id': str(user_id), 'city': 'Prague', 'country': 'Czech Republic',
+        'startDate': '2024-01-01', 'endDate': '2024-01-03'
+    })
+    assert response.status_code == 201
+
+
+def trip_count(client, user_id, viewer_id):
+    return len(client.get(f'/trips/{user_id}', query_string={'viewer_id': viewer_id}).get_json())
+
+
+def test_reads_go_to_the_replica(client, users):
+    writer, _ = users
+    with travelog.app.app_context():
+        travelog.db.session.add(travelog.User(username='late', email='late@example.com', password='x'))
+        travelog.db.session.commit()
+    assert client.get('/users/by-username/late').status_code == 404
+    replicate()
+    assert client.get('/users/by-username/late').status_code == 200
+
+
+def test_writer_reads_own_writes_until_the_window_ends(client, users, monkeypatch):
+    writer, _ = users
+    post_trip(client, writer)
+    # Read from the primary, ahead of the replica
+    assert trip_count(client, writer, writer) == 1
+
+    monkeypatch.setattr(travelog.replica_router, 'window', 0)
+    assert trip_count(client, writer, writer) == 0
+    replicate()
+    assert trip_count(client, writer, writer) == 1
+
+
+def test_marks_stay_out_of_the_response_cache(client, users, monkeypatch):
+    writer, _ = users
+    response_cache = make_cache('memory://', max_entries=2)
+    monkeypatch.setattr(travelog, 'response_cache', response_cache)
+    before = client.get('/cache/stats').get_json()
+    post_trip(client, writer)
+    stats = client.get('/cache/stats').get_json()
+    assert stats['sets'] == before['sets'] and stats['hits'] == before['hits'] and stats['misses'] == before['misses']
+
+    # Filling the cache past max_entries doesn't evict the writer's mark
+    response_cache.set_many({f'filler:{n}': n for n in range(10)})
+    assert trip_count(client, writer, writer) == 1
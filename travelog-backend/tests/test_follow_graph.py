@@ -0,0 +1,86 @@
+"""The in-memory follow graph: overlays, compaction, reloads and queries."""
+import threading
+
+import follow_graph
+from follow_graph import FollowGraph
+
+
+def test_overlay_is_folded_into_the_arrays_past_the_ratio(monkeypatch):
+    monkeypatch.setattr(follow_graph, 'MIN_COMPACT_EDGES', 2)
+    graph = FollowGraph(lambda: [(1, 2), (1, 3), (2, 3)])
+    graph.build()
+
+    graph.follow(1, [4])
+    graph.unfollow(1, [2])
+    assert graph.stats()['pending_changes'] == 2
+    assert graph.stats()['compacted_edges'] == 3
+    assert graph.following(1) == [3, 4]
+
+    # The third pending change crosses MIN_COMPACT_EDGES
+    graph.follow(5, [1])
+    assert graph.stats()['pending_changes'] == 0
+    assert graph.stats()['compacted_edges'] == 4
+    assert graph.following(1) == [3, 4]
+    assert graph.following(5) == [1]
+    assert graph.followers(2) == []
+    assert graph.followers(3) == [1, 2]
+    assert graph.follower_count(1) == 1
+    assert graph.follows(1, 4) and not graph.follows(1, 2)
+
+
+def test_undoing_a_change_clears_it_from_the_overlay():
+    graph = FollowGraph(lambda: [(1, 2)])
+    graph.build()
+    graph.unfollow(1, [2])
+    graph.follow(1, [2])
+    graph.follow(1, [3])
+    graph.unfollow(1, [3])
+    assert graph.stats()['pending_changes'] == 0
+    assert graph.following(1) == [2]
+
+
+def test_changes_made_during_a_reload_are_replayed():
+    rows = [(1, 2)]
+    loading, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        snapshot = list(rows)
+        if len(calls) == 2:
+            loading.set()
+            release.wait(5)
+        return snapshot
+
+    graph = FollowGraph(loader)
+    graph.build()
+    reload = threading.Thread(target=graph.build)
+    reload.start()
+    assert loading.wait(5)
+
+    # Committed after the reload read its rows
+    rows.append((1, 3))
+    graph.follow(1, [3])
+    graph.unfollow(1, [2])
+    rows.remove((1, 2))
+    release.set()
+    reload.join(5)
+
+    assert graph.following(1) == [3]
+    assert graph.followers(2) == []
+
+
+def test_mutuals_and_suggestions():
+    graph = FollowGraph(lambda: [
+        (1, 2), (2, 1), (1, 3),
+        # 2 and 3 both follow 4; only 2 follows 5; 6 has more followers than 5
+        (2, 4), (3, 4), (2, 5), (3, 6), (7, 6),
+        # 3 is already followed, and 2 -> 1 is the user themself
+        (2, 3),
+    ])
+    assert graph.mutuals(1) == [2]
+    assert graph.mutuals(2) == [1]
+    assert graph.mutuals(3) == []
+    assert graph.suggestions(1) == [(4, 2), (6, 1), (5, 1)]
+    assert graph.suggestions(1, limit=1) == [(4, 2)]
+    assert graph.suggestions(99) == []
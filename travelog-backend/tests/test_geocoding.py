@@ -0,0 +1,59 @@
+"""Cities the gazetteer doesn't know are geocoded in the background."""
+import pytest
+
+from conftest import DeferredPool, replicate
+import app as travelog
+
+
+class FakeGeocoder:
+    def __init__(self):
+        self.calls = []
+
+    def lookup(self, city, country):
+        self.calls.append((city, country))
+        return (-8.5069, 115.2625)
+
+
+@pytest.fixture
+def geocoding(app, monkeypatch):
+    geocoder, pool = FakeGeocoder(), DeferredPool()
+    monkeypatch.setattr(travelog, 'remote_geocoder', geocoder)
+    monkeypatch.setattr(travelog, 'geocode_pool', pool)
+    monkeypatch.setattr(travelog, 'geocode_queued', set())
+    with app.app_context():
+        user = travelog.User(username='traveller', email='traveller@example.com', password='x')
+        travelog.db.session.add(user)
+        travelog.db.session.commit()
+        return geocoder, pool, user.id
+
+
+def post_trip(client, user_id, city, country):
+    response = client.post('/trips', data={
+        'user_id': str(user_id), 'city': city, 'country': country,
+        'startDate': '2024-01-01', 'endDate': '2024-01-03'
+    })
+    assert response.status_code == 201
+
+
+def latitudes(client, user_id):
+    replicate()
+    return [trip['latitude'] for trip in client.get(f'/trips/{user_id}').get_json()]
+
+
+def test_new_city_is_geocoded_after_the_trip_is_saved(client, geocoding):
+    geocoder, pool, user_id = geocoding
+    post_trip(client, user_id, 'Tirta Gangga', 'Indonesia')
+    post_trip(client, user_id, 'Tirta Gangga', 'Indonesia')
+    assert latitudes(client, user_id) == [None, None]
+
+    pool.run()
+    assert geocoder.calls == [('Tirta Gangga', 'Indonesia')]
+    assert latitudes(client, user_id) == [-8.5069, -8.5069]
+
+
+def test_gazetteer_cities_are_not_sent_to_the_geocoder(client, geocoding):
+    geocoder, pool, user_id = geocoding
+    post_trip(client, user_id, 'Prague', 'Czech Republic')
+    pool.run()
+    assert geocoder.calls == []
+    assert latitudes(client, user_id)[0] is not None
@@ -0,0 +1,42 @@
+"""Worker metrics shared through METRICS_DIR across recycled and killed workers."""
+import os
+
+from metrics import MetricsRegistry
+
+
+def worker(directory, count):
+    """A registry as one worker process has it, after `count` requests."""
+    registry = MetricsRegistry(directory)
+    requests = registry.counter('requests_total', 'Requests.', ('route',))
+    registry.record((requests, ('feed',), count))
+    return registry
+
+
+def total(registry):
+    return registry.render().splitlines()[-1]
+
+
+def test_exiting_worker_folds_its_counts_into_one_file(tmp_path):
+    first = worker(tmp_path, 3)
+    first.flush()
+    first.retire()
+    first.retire()
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.json')) == ['exited.json']
+
+    # The next worker may get the same pid; nothing is lost either way
+    second = worker(tmp_path, 2)
+    assert total(second) == 'requests_total{route="feed"} 5'
+    second.flush()
+    assert total(second) == 'requests_total{route="feed"} 5'
+
+
+def test_worker_reusing_a_killed_workers_pid_keeps_its_counts(tmp_path):
+    killed = worker(tmp_path, 3)
+    killed.flush()
+
+    reused = worker(tmp_path, 2)
+    assert total(reused) == 'requests_total{route="feed"} 5'
+    reused.flush()
+    assert total(reused) == 'requests_total{route="feed"} 5'
+    reused.retire()
+    assert total(MetricsRegistry(tmp_path)) == 'requests_total{route="feed"} 5'
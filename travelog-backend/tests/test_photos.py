@@ -0,0 +1,102 @@
+"""Trip photos are only linked once a copy without EXIF metadata exists."""
+from datetime import datetime, timedelta
+import io
+import os
+
+from PIL import Image
+import pytest
+
+from conftest import DeferredPool, replicate
+from storage import BlobStore
+import app as travelog
+
+GPS_IFD = 0x8825
+ORIENTATION = 0x0112
+
+
+@pytest.fixture
+def uploads(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(travelog, 'blob_store', BlobStore(str(tmp_path)))
+    pool = DeferredPool()
+    monkeypatch.setattr(travelog, 'image_pool', pool)
+    with app.app_context():
+        user = travelog.User(username='traveller', email='traveller@example.com', password='x')
+        travelog.db.session.add(user)
+        travelog.db.session.commit()
+        return tmp_path, pool, user.id
+
+
+def geotagged_jpeg():
+    """A 40x20 JPEG that is displayed rotated, with a GPS position."""
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    exif.get_ifd(GPS_IFD).update({1: 'N', 2: (50.0, 5.0, 0.0), 3: 'E', 4: (14.0, 25.0, 0.0)})
+    out = io.BytesIO()
+    Image.new('RGB', (40, 20), 'red').save(out, 'JPEG', exif=exif)
+    out.seek(0)
+    return out
+
+
+def post_trip(client, user_id):
+    response = client.post('/trips', data={
+        'user_id': str(user_id), 'city': 'Prague', 'country': 'Czech Republic',
+        'startDate': '2024-01-01', 'endDate': '2024-01-03',
+        'media': (geotagged_jpeg(), 'holiday.jpg', 'image/jpeg'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['trip']
+
+
+def test_url_points_at_a_copy_without_exif(client, uploads):
+    folder, pool, user_id = uploads
+    trip = post_trip(client, user_id)
+    assert trip['photos'][0]['status'] == 'pending'
+    assert 'url' not in trip['photos'][0]
+
+    pool.run()
+    replicate()
+    photo = client.get(f'/trips/{user_id}').get_json()[0]['photos'][0]
+    assert photo['status'] == 'ready'
+    assert photo['url'] == photo['variants']['full']['url']
+    with Image.open(os.path.join(folder, os.path.basename(photo['url']))) as full:
+        assert full.format == 'JPEG'
+        assert full.size == (20, 40)
+        assert not full.getexif()
+    assert 'filename' not in photo
+    with travelog.app.app_context():
+        original = travelog.db.session.get(travelog.Trip, trip['id']).photos[0]['filename']
+    assert client.get(f'/uploads/{original}').status_code == 404
+    assert client.get(photo['url'].replace('http://localhost:5050', '')).status_code == 200
+
+
+def test_process_pending_photos_picks_up_lost_jobs(client, uploads):
+    folder, pool, user_id = uploads
+    trip_id = post_trip(client, user_id)['id']
+    # The worker restarted before the job ran
+    pool.jobs = []
+
+    runner = travelog.app.test_cli_runner()
+    assert 'of 0 trip(s)' in runner.invoke(args=['process-pending-photos']).output
+    with travelog.app.app_context():
+        trip = travelog.db.session.get(travelog.Trip, trip_id)
+        trip.created_at = datetime.utcnow() - timedelta(hours=1)
+        travelog.db.session.commit()
+    assert 'of 1 trip(s)' in runner.invoke(args=['process-pending-photos']).output
+    with travelog.app.app_context():
+        photo = travelog.db.session.get(travelog.Trip, trip_id).photos[0]
+        assert photo['status'] == 'ready'
+        assert set(photo['variants']) == {'full', 'thumb', 'medium', 'large'}
+
+
+@pytest.mark.parametrize('filename, public', [
+    ('user_7.png', True),
+    (f"{'a' * 64}.thumb.webp", True),
+    (f"{'a' * 64}.full.jpg", True),
+    (f"{'a' * 64}.mp4", True),
+    (f"{'a' * 64}.jpg", False),
+    (f"{'a' * 64}.heic", False),
+    ('0b5e6f1c-legacy_holiday.jpg', False),
+])
+def test_only_renditions_of_images_are_public(filename, public):
+    assert travelog.is_public_upload(filename) is public
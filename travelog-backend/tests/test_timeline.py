@@ -0,0 +1,88 @@
+"""Home timelines across an author's switches between fan-out and pull mode."""
+import pytest
+
+from conftest import replicate
+import app as travelog
+
+
+@pytest.fixture
+def users(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'TIMELINE_FANOUT_LIMIT', 2)
+    with app.app_context():
+        users = [travelog.User(username=name, email=f'{name}@example.com', password='x')
+                 for name in ('author', 'reader', 'passerby')]
+        travelog.db.session.add_all(users)
+        travelog.db.session.commit()
+        return [user.id for user in users]
+
+
+def post_trip(client, author):
+    response = client.post('/trips', data={
+        'user_id': str(author), 'city': 'Prague', 'country': 'Czech Republic',
+        'startDate': '2024-01-01', 'endDate': '2024-01-03'
+    })
+    assert response.status_code == 201
+    return response.get_json()['trip']['id']
+
+
+def feed(client, user_id):
+    replicate()
+    return [trip['id'] for trip in client.get(f'/feed/{user_id}').get_json()]
+
+
+def fanned_out(user_id):
+    with travelog.app.app_context():
+        return sorted(row[0] for row in travelog.db.session.query(travelog.TimelineEntry.trip_id).filter_by(user_id=user_id))
+
+
+def test_trips_posted_in_pull_mode_survive_a_drop_in_followers(client, users):
+    author, reader, passerby = users
+    client.post(f'/users/{reader}/follow', json={'target_user_id': author})
+    first = post_trip(client, author)
+
+    # Reaching the limit switches the author to pull mode
+    client.post(f'/users/{passerby}/follow', json={'target_user_id': author})
+    second = post_trip(client, author)
+    assert fanned_out(reader) == [first]
+    assert feed(client, reader) == [second, first]
+
+    # Dropping below it doesn't hide what was posted in pull mode
+    client.post(f'/users/{passerby}/unfollow', json={'target_user_id': author})
+    assert feed(client, reader) == [second, first]
+
+    # The next post switches back and fans out the pull-mode trips too
+    third = post_trip(client, author)
+    assert fanned_out(reader) == [first, second, third]
+    assert feed(client, reader) == [third, second, first]
+    with travelog.app.app_context():
+        assert not travelog.db.session.get(travelog.User, author).pull_on_read
+
+
+def test_rebuild_skips_pull_mode_authors(client, users):
+    author, reader, passerby = users
+    client.post(f'/users/{reader}/follow', json={'target_user_id': author})
+    client.post(f'/users/{passerby}/follow', json={'target_user_id': author})
+    trip = post_trip(client, author)
+    with travelog.app.app_context():
+        travelog.rebuild_timeline(reader)
+        travelog.db.session.commit()
+    assert fanned_out(reader) == []
+    assert feed(client, reader) == [trip]
+
+
+def test_follows_made_by_another_worker_show_up_before_the_graph_reloads(client, users):
+    author, reader, passerby = users
+    client.post(f'/users/{passerby}/follow', json={'target_user_id': author})
+    client.post(f'/users/{reader}/follow', json={'target_user_id': author})
+    trip = post_trip(client, author)
+    client.post(f'/users/{reader}/unfollow', json={'target_user_id': author})
+    assert feed(client, reader) == []
+
+    # Committed through another worker, so this one's follow graph never heard of it
+    with travelog.app.app_context():
+        travelog.db.session.add(travelog.Follow(follower_id=reader, followed_id=author))
+        travelog.db.session.commit()
+    assert not travelog.follow_graph.follows(reader, author)
+    assert feed(client, reader) == [trip]
+    markers = client.get(f'/map/{reader}').get_json()['markers']
+    assert [marker['id'] for marker in markers] == [trip]
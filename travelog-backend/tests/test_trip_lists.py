@@ -0,0 +1,88 @@
+"""Trip list routes run a fixed number of queries however many trips they return."""
+from datetime import date, datetime, timedelta
+
+from flask import g
+import pytest
+
+from cache import make_cache
+from conftest import refresh_indexes, replicate
+import app as travelog
+
+FANS = 3
+
+
+@pytest.fixture
+def accounts(app):
+    """An author, a follower and FANS users who like and comment on every trip."""
+    with app.app_context():
+        users = [travelog.User(username=name, email=f'{name}@example.com', password='x')
+                 for name in ['author', 'follower'] + [f'fan{n}' for n in range(FANS)]]
+        travelog.db.session.add_all(users)
+        travelog.db.session.flush()
+        author, follower, *fans = [user.id for user in users]
+        travelog.db.session.add(travelog.Follow(follower_id=follower, followed_id=author))
+        travelog.db.session.commit()
+    return author, follower, fans
+
+
+def add_trips(author, fans, count):
+    with travelog.app.app_context():
+        city = travelog.get_or_create_city('Prague', 'Czech Republic')
+        start = datetime(2024, 1, 1) + timedelta(days=travelog.db.session.query(travelog.Trip).count())
+        for n in range(count):
+            trip = travelog.Trip(
+                user_id=author, city='Prague', country='Czech Republic', city_id=city.id,
+                start_date=date(2024, 1, 1), end_date=date(2024, 1, 3), created_at=start + timedelta(hours=n)
+            )
+            travelog.db.session.add(trip)
+            travelog.db.session.flush()
+            for fan in fans:
+                travelog.db.session.add(travelog.Like(user_id=fan, trip_id=trip.id))
+                travelog.db.session.add(travelog.Comment(user_id=fan, trip_id=trip.id, content='Lovely'))
+            travelog.fan_out_trip(trip)
+        travelog.db.session.commit()
+        return city.slug
+
+
+def query_count(client, monkeypatch, url):
+    """Statements run by one cold-cache GET of url, counted by the cursor events of metrics.py."""
+    monkeypatch.setattr(travelog, 'response_cache', make_cache('memory://'))
+    with client:
+        response = client.get(url)
+        assert response.status_code == 200
+        return g.request_stats.queries
+
+
+@pytest.mark.parametrize('route', [
+    '/feed/{follower}',
+    '/feed/{follower}?limit=100',
+    '/trips/{author}',
+    '/trips/{author}?limit=100',
+    '/cities/{city}/trips',
+    '/users/{author}/profile?trip_limit=100',
+])
+def test_query_count_is_constant(client, monkeypatch, accounts, route):
+    author, follower, fans = accounts
+    counts = {}
+    total = 0
+    for count in (1, 10, 40):
+        city = add_trips(author, fans, count - total)
+        total = count
+        replicate()
+        refresh_indexes()
+        url = route.format(author=author, follower=follower, city=city)
+        counts[count] = query_count(client, monkeypatch, url)
+    assert counts[1] == counts[10] == counts[40], counts
+
+
+def test_payloads_list_likes_and_comments(client, accounts):
+    author, follower, fans = accounts
+    add_trips(author, fans, 2)
+    replicate()
+    refresh_indexes()
+    trips = client.get(f'/feed/{follower}').get_json()
+    assert len(trips) == 2
+    for trip in trips:
+        assert trip['username'] == 'author'
+        assert sorted(trip['likes']) == sorted(fans)
+        assert [comment['username'] for comment in trip['comments']] == [f'fan{n}' for n in range(FANS)]
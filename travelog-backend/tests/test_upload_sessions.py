@@ -0,0 +1,106 @@
+"""Resumable upload sessions: offsets, finalizing and purging."""
+from datetime import datetime, timedelta
+import hashlib
+import os
+
+import pytest
+
+from storage import BlobStore
+import app as travelog
+
+BODY = b'0123456789'
+
+
+@pytest.fixture
+def uploads(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(travelog, 'blob_store', BlobStore(str(tmp_path)))
+    with app.app_context():
+        user = travelog.User(username='traveller', email='traveller@example.com', password='x')
+        travelog.db.session.add(user)
+        travelog.db.session.commit()
+        return tmp_path, user.id
+
+
+def create(client, user_id, size=len(BODY)):
+    response = client.post('/upload_sessions', json={
+        'user_id': user_id, 'filename': 'notes.txt', 'mimetype': 'text/plain', 'size': size
+    })
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def put(client, upload_id, offset, body):
+    return client.put(f'/upload_sessions/{upload_id}?offset={offset}', data=body)
+
+
+def test_chunks_must_start_at_or_before_the_offset(client, uploads):
+    _, user_id = uploads
+    upload_id = create(client, user_id)
+    assert put(client, upload_id, 0, BODY[:5]).get_json()['offset'] == 5
+
+    gap = put(client, upload_id, 7, BODY[7:])
+    assert gap.status_code == 409
+    assert gap.get_json()['offset'] == 5
+
+    # An interrupted chunk is resent from its start
+    assert put(client, upload_id, 3, BODY[3:8]).get_json()['offset'] == 8
+    assert client.get(f'/upload_sessions/{upload_id}').get_json()['offset'] == 8
+
+    too_long = put(client, upload_id, 8, BODY[8:] + b'!')
+    assert too_long.status_code == 400
+    assert too_long.get_json()['offset'] == 8
+
+
+def test_finalize_checks_size_and_checksum(client, uploads):
+    folder, user_id = uploads
+    upload_id = create(client, user_id)
+    put(client, upload_id, 0, BODY[:8])
+    incomplete = client.post(f'/upload_sessions/{upload_id}/finalize')
+    assert incomplete.status_code == 409
+    assert incomplete.get_json()['offset'] == 8
+
+    put(client, upload_id, 8, BODY[8:])
+    mismatch = client.post(f'/upload_sessions/{upload_id}/finalize', json={'sha256': hashlib.sha256(b'other').hexdigest()})
+    assert mismatch.status_code == 409
+    assert client.get(f'/upload_sessions/{upload_id}').get_json() == {
+        'upload_id': upload_id, 'filename': 'notes.txt', 'size': len(BODY), 'offset': 0, 'status': 'open'
+    }
+    with travelog.app.app_context():
+        assert travelog.Blob.query.count() == 0
+
+    put(client, upload_id, 0, BODY)
+    digest = hashlib.sha256(BODY).hexdigest()
+    finalized = client.post(f'/upload_sessions/{upload_id}/finalize', json={'sha256': digest.upper()})
+    assert finalized.status_code == 200
+    assert finalized.get_json()['blob_filename'] == f'{digest}.txt'
+    assert (folder / f'{digest}.txt').read_bytes() == BODY
+    # Finalizing again is a no-op
+    assert client.post(f'/upload_sessions/{upload_id}/finalize').get_json()['blob_filename'] == f'{digest}.txt'
+    with travelog.app.app_context():
+        assert travelog.db.session.get(travelog.Blob, f'{digest}.txt').ref_count == 1
+
+
+def test_purge_removes_expired_sessions_and_their_blobs(client, uploads):
+    folder, user_id = uploads
+    abandoned = create(client, user_id)
+    put(client, abandoned, 0, BODY[:4])
+    unattached = create(client, user_id)
+    put(client, unattached, 0, BODY)
+    client.post(f'/upload_sessions/{unattached}/finalize')
+    recent = create(client, user_id)
+    blob = f'{hashlib.sha256(BODY).hexdigest()}.txt'
+
+    with travelog.app.app_context():
+        travelog.db.session.execute(travelog.update(travelog.UploadSession).where(
+            travelog.UploadSession.id.in_([abandoned, unattached])
+        ).values(updated_at=datetime.utcnow() - timedelta(hours=25)))
+        travelog.db.session.commit()
+
+    output = travelog.app.test_cli_runner().invoke(args=['purge-upload-sessions']).output
+    assert 'Purged 2 upload session(s).' in output
+    with travelog.app.app_context():
+        assert [session.id for session in travelog.UploadSession.query] == [recent]
+        assert travelog.db.session.get(travelog.Blob, blob) is None
+    assert not (folder / blob).exists()
+    assert os.listdir(folder / '.sessions') == [recent]
@@ -0,0 +1,38 @@
+"""Username prefix search runs over lower_bytewise, on SQLite and Postgres alike."""
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from conftest import replicate
+import app as travelog
+
+NAMES = ['ab', 'Ab-x', 'a.b', 'a_b', 'abc', 'ABD', 'b', 'aa']
+
+
+def search(client, **params):
+    names, cursor = [], None
+    while True:
+        if cursor:
+            params['cursor'] = cursor
+        page = client.get('/users', query_string=params).get_json()
+        names += [user['username'] for user in page['users']]
+        cursor = page['next_cursor']
+        if not cursor:
+            return names
+
+
+def test_prefix_pages_follow_code_point_order(client, app):
+    with app.app_context():
+        travelog.db.session.add_all(travelog.User(username=name, email=f'{n}@example.com', password='x')
+                                    for n, name in enumerate(NAMES))
+        travelog.db.session.commit()
+    replicate()
+    assert search(client, q='AB', limit=1) == ['ab', 'Ab-x', 'abc', 'ABD']
+    assert search(client, q='a', limit=3) == ['a.b', 'a_b', 'aa', 'ab', 'Ab-x', 'abc', 'ABD']
+
+
+def test_postgres_index_and_ranges_share_the_c_collation():
+    dialect = postgresql.dialect()
+    index = next(index for index in travelog.User.__table__.indexes if index.name == 'uq_users_username_lower')
+    key = travelog.lower_bytewise(travelog.User.username)
+    assert 'ON users ((lower(username) COLLATE "C"))' in str(CreateIndex(index).compile(dialect=dialect))
+    assert '(lower(users.username) COLLATE "C") >=' in str((key >= 'ab').compile(dialect=dialect))
@@ -96,7 +96,7 @@ const CityDetail = () => {
           <TripsGrid>
             {trips.map(trip => (
               <TripCard key={trip.id}>
-                <TripImage src={trip.photos?.[0]?.url || defaultAvatar} alt={trip.city} />
+                <TripImage src={trip.photos?.[0]?.variants?.thumb?.url || trip.photos?.[0]?.url || defaultAvatar} alt={trip.city} />
                 <TripInfo>
                   <TripUser>{trip.username || 'Unknown User'}</TripUser>
                   <TripDate>
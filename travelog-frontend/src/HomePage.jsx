@@ -21,6 +21,7 @@ const fadeIn = keyframes`
 
 const HomePage = () => {
   const [feed, setFeed] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [selectedTrip, setSelectedTrip] = useState(null);
   const [commentMap, setCommentMap] = useState({});
   const navigate = useNavigate();
@@ -28,35 +29,46 @@ const HomePage = () => {
   const user = JSON.parse(localStorage.getItem('user') || '{}');
   const username = user?.username;
   const userId = user?.id;
+  const FEED_PAGE = 20;
+
+  // Cards only need counters, so pages are compact; the detail view loads the rest
+  const loadFeedPage = async (cursor) => {
+    try {
+      const res = await axios.get(`${BACKEND_URL}/feed/${userId}`, {
+        params: { limit: FEED_PAGE, compact: 1, ...(cursor ? { cursor } : {}) }
+      });
+      setFeed((prev) => (cursor ? [...prev, ...res.data.trips] : res.data.trips));
+      setNextCursor(res.data.next_cursor);
+    } catch (err) {
+      console.error('Failed to fetch feed', err);
+    }
+  };
 
   useEffect(() => {
-    const fetchFeed = async () => {
-      if (!userId) return;
-      try {
-        const res = await axios.get(`${BACKEND_URL}/feed/${userId}`);
-        setFeed(res.data);
-      } catch (err) {
-        console.error('Failed to fetch feed', err);
-      }
-    };
-    fetchFeed();
+    if (userId) loadFeedPage(null);
   }, [userId]);
 
-  const toggleLike = async (tripId) => {
+  const updateTrip = (tripId, changes) => {
+    setFeed((prev) => prev.map((t) => (t.id === tripId ? { ...t, ...changes(t) } : t)));
+  };
+
+  const openTrip = async (trip) => {
     try {
-      await axios.post(`${BACKEND_URL}/trips/${tripId}/like`, { user_id: userId });
-      setFeed((prev) =>
-        prev.map((t) =>
-          t.id === tripId
-            ? {
-                ...t,
-                likes: t.likes.includes(userId)
-                  ? t.likes.filter((id) => id !== userId)
-                  : [...t.likes, userId]
-              }
-            : t
-        )
-      );
+      const res = await axios.get(`${BACKEND_URL}/trip/${trip.id}`, { params: { viewer_id: userId } });
+      setSelectedTrip(res.data);
+    } catch (err) {
+      console.error('Failed to fetch trip', err);
+    }
+  };
+
+  const toggleLike = async (trip) => {
+    try {
+      const action = trip.liked_by_viewer ? 'unlike' : 'like';
+      await axios.post(`${BACKEND_URL}/trips/${trip.id}/${action}`, { user_id: userId });
+      updateTrip(trip.id, (t) => ({
+        liked_by_viewer: !t.liked_by_viewer,
+        like_count: t.like_count + (t.liked_by_viewer ? -1 : 1)
+      }));
     } catch (err) {
       console.error('Failed to like/unlike', err);
     }
@@ -71,42 +83,15 @@ const HomePage = () => {
         user_id: userId,
         content: comment
       });
-
-      setFeed((prev) =>
-        prev.map((t) =>
-          t.id === tripId
-            ? {
-                ...t,
-                comments: [
-                  ...t.comments,
-                  {
-                    id: Math.random(),
-                    user_id: userId,
-                    username,
-                    content: comment
-                  }
-                ]
-              }
-            : t
-        )
-      );
+      updateTrip(tripId, (t) => ({ comment_count: t.comment_count + 1 }));
       setCommentMap((prev) => ({ ...prev, [tripId]: '' }));
     } catch (err) {
       console.error('Failed to comment', err);
     }
   };
 
-  const handleCommentAdd = (tripId, comment) => {
-    setFeed((prevFeed) =>
-      prevFeed.map((trip) =>
-        trip.id === tripId
-          ? {
-              ...trip,
-              comments: [...trip.comments, comment]
-            }
-          : trip
-      )
-    );
+  const handleCommentAdd = (tripId) => {
+    updateTrip(tripId, (t) => ({ comment_count: t.comment_count + 1 }));
   };
 
   return (
@@ -123,10 +108,10 @@ const HomePage = () => {
         ) : (
           <FeedGrid>
             {feed.map((trip) => (
-              <FeedCard key={trip.id} onClick={() => setSelectedTrip(trip)}>
+              <FeedCard key={trip.id} onClick={() => openTrip(trip)}>
                 {trip.photos?.[0]?.url && (
                   <FeedImage
-                    src={trip.photos[0].url}
+                    src={trip.photos[0].variants?.medium?.url || trip.photos[0].url}
                     alt={trip.city}
                   />
                 )}
@@ -167,10 +152,10 @@ const HomePage = () => {
                         />
                         <LikeButton onClick={(e) => {
                           e.stopPropagation();
-                          toggleLike(trip.id);
+                          toggleLike(trip);
                         }}>
-                          {trip.likes?.includes(userId) ? <FaHeart color="red" /> : <FaRegHeart />}
-                          <span>{trip.likes?.length || 0}</span>
+                          {trip.liked_by_viewer ? <FaHeart color="red" /> : <FaRegHeart />}
+                          <span>{trip.like_count || 0}</span>
                         </LikeButton>
                         <SubmitComment onClick={(e) => {
                           e.stopPropagation();
@@ -179,17 +164,20 @@ const HomePage = () => {
                           <FaCommentDots />
                         </SubmitComment>
                       </CommentInputRow>
-                      {trip.comments?.map((comment) => (
-                        <Comment key={comment.id}>
-                          <strong>{comment.username}:</strong> {comment.content}
+                      {trip.comment_count > 0 && (
+                        <Comment onClick={() => openTrip(trip)}>
+                          View {trip.comment_count} comment{trip.comment_count === 1 ? '' : 's'}
                         </Comment>
-                      ))}
+                      )}
                   </CommentSection>
                 </FeedInfo>
               </FeedCard>
             ))}
           </FeedGrid>
         )}
+        {nextCursor && (
+          <LoadMoreButton onClick={() => loadFeedPage(nextCursor)}>Load more</LoadMoreButton>
+        )}
       </SectionCard>
 
       <SectionCard>
@@ -203,16 +191,7 @@ const HomePage = () => {
           onClose={() => setSelectedTrip(null)}
           onDelete={() => {}}
           onCommentDelete={(deletedCommentId, tripId) => {
-            setFeed((prevFeed) =>
-              prevFeed.map((t) =>
-                t.id === tripId
-                  ? {
-                      ...t,
-                      comments: t.comments.filter((c) => c.id !== deletedCommentId)
-                    }
-                  : t
-              )
-            );
+            updateTrip(tripId, (t) => ({ comment_count: t.comment_count - 1 }));
           }}
           onCommentAdd={handleCommentAdd}
         />
@@ -341,6 +320,17 @@ const Comment = styled.div`
   font-size: 14px;
   margin-bottom: 4px;
   color: #333;
+  cursor: pointer;
+`;
+
+const LoadMoreButton = styled.button`
+  margin-top: 16px;
+  background-color: #1976d2;
+  color: white;
+  padding: 8px 16px;
+  border: none;
+  border-radius: 6px;
+  cursor: pointer;
 `;
 
 const CommentInput = styled.input`
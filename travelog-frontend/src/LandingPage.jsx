@@ -12,8 +12,8 @@ const LandingPage = () => {
     async function fetchUsers() {
       console.log("➡️ Making API request to /users...");
       try {
-        const response = await axios.get('http://localhost:5050/users');
-        setUsers(response.data);
+        const response = await axios.get('http://localhost:5050/users', { params: { limit: 50 } });
+        setUsers(response.data.users);
       } catch (error) {
         console.error('Error fetching users', error);
       }
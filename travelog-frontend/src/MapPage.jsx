@@ -1,5 +1,5 @@
-import React, { useEffect, useState } from 'react';
-import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
+import React, { useEffect, useRef, useState } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, useMap, useMapEvents } from 'react-leaflet';
 import 'leaflet/dist/leaflet.css';
 import L from 'leaflet';
 import styled from 'styled-components';
@@ -28,6 +28,26 @@ const greenIcon = new L.Icon({
 });
 
 
+// Reloads markers for the visible area whenever the map stops moving
+const ViewportWatcher = ({ onChange }) => {
+  const map = useMapEvents({
+    moveend: () => onChange(map),
+  });
+
+  useEffect(() => {
+    onChange(map);
+  }, [map]);
+
+  return null;
+};
+
+const clusterIcon = (cluster) => new L.DivIcon({
+  html: `<div>${cluster.count}</div>`,
+  className: cluster.own_count === cluster.count ? 'map-cluster map-cluster-own' : 'map-cluster',
+  iconSize: [36, 36]
+});
+
+
 const MapPage = () => {
 
   useEffect(() => {
@@ -41,107 +61,78 @@ const MapPage = () => {
   // const navigate = useNavigate();
   const [selectedTrip, setSelectedTrip] = useState(null);
 
-  
-
-
-
-  const [tripMarkers, setTripMarkers] = useState([]);
-
-
-  const [mapReady, setMapReady] = useState(false);
+  const [markers, setMarkers] = useState([]);
+  const [clusters, setClusters] = useState([]);
+  const requestRef = useRef(null);
 
 
   useEffect(() => {
     document.title = 'Travelog Map';
-    fetchTrips();
   }, []);
 
-  const fetchTrips = async () => {
+  const fetchMarkers = async (map) => {
     const user = JSON.parse(localStorage.getItem('user'));
     const userId = user?.id;
-  
+
     if (!userId) return;
-  
+
+    // Only the latest viewport matters; drop responses for earlier ones
+    requestRef.current?.abort();
+    const controller = new AbortController();
+    requestRef.current = controller;
+
+    const params = new URLSearchParams({
+      bbox: map.getBounds().toBBoxString(),
+      zoom: map.getZoom()
+    });
+
     try {
-      const [myTripsRes, feedRes] = await Promise.all([
-        fetch(`http://localhost:5050/trips/${userId}`),
-        fetch(`http://localhost:5050/feed/${userId}`)
-      ]);
-  
-      const myTrips = myTripsRes.ok ? await myTripsRes.json() : [];
-      const feedTrips = feedRes.ok ? await feedRes.json() : [];
-  
-      const markers = [];
-  
-      // Geocode and add your own trips
-      for (const trip of myTrips) {
-        const coords = await geocodeCity(trip.city);
-        if (coords) {
-          markers.push({
-            position: coords,
-            icon: blueIcon,
-            popup: (
-              <PopupContent>
-                <strong>{trip.city}, {trip.country}</strong><br />
-                by <a href={`/user/${trip.username}`}>You</a>
-              </PopupContent>
-            )
-          });
-        }
-      }
-  
-      // Geocode and add followed users' trips
-      for (const trip of feedTrips) {
-        const coords = await geocodeCity(trip.city);
-        if (coords) {
-          markers.push({
-            position: coords,
-            icon: greenIcon,
-            popup: (
-              <PopupContent>
-                <strong>{trip.city}, {trip.country}</strong><br />
-                <UserRow>
-                  <span>by <a href={`/user/${trip.username}`}>{trip.username}</a></span>
-                  <ViewPostButton onClick={(e) => {
-                    e.preventDefault();
-                    e.stopPropagation();
-                    setSelectedTrip(trip);
-                  }}>View Post</ViewPostButton>
-                </UserRow>
-              </PopupContent>
-            )
-          });
-        }
-      }
-  
-      setTripMarkers(markers);
-      setMapReady(true);  // optional if you're conditionally rendering
+      const res = await fetch(`http://localhost:5050/map/${userId}?${params}`, { signal: controller.signal });
+      if (!res.ok) return;
+      const data = await res.json();
+      setMarkers(data.markers);
+      setClusters(data.clusters);
     } catch (err) {
-      console.error('Error fetching trips:', err);
+      if (err.name !== 'AbortError') {
+        console.error('Error fetching map markers:', err);
+      }
     }
   };
-  
 
-  const geocodeCity = async (city) => {
+  const openTrip = async (tripId) => {
     try {
-      const response = await fetch(`https://nominatim.openstreetmap.org/search?city=${encodeURIComponent(city)}&format=json`);
-      const data = await response.json();
-      if (data.length > 0) {
-        return [parseFloat(data[0].lat), parseFloat(data[0].lon)];
+      const res = await fetch(`http://localhost:5050/trip/${tripId}`);
+      if (res.ok) {
+        setSelectedTrip(await res.json());
       }
     } catch (err) {
-      console.error('Geocoding error:', err);
+      console.error('Error fetching trip:', err);
     }
-    return null;
   };
 
-  
-  
+  const markerPopup = (marker) => (
+    <PopupContent>
+      <strong>{marker.city}, {marker.country}</strong><br />
+      {marker.thumbnail_url && <Thumbnail src={marker.thumbnail_url} alt={marker.city} loading="lazy" />}
+      {marker.own ? (
+        <>by <a href={`/user/${marker.username}`}>You</a></>
+      ) : (
+        <UserRow>
+          <span>by <a href={`/user/${marker.username}`}>{marker.username}</a></span>
+          <ViewPostButton onClick={(e) => {
+            e.preventDefault();
+            e.stopPropagation();
+            openTrip(marker.id);
+          }}>View Post</ViewPostButton>
+        </UserRow>
+      )}
+    </PopupContent>
+  );
+
 
   return (
     
     <MapWrapper>
-  {mapReady && (
     <MapContainer
       center={[20, 0]}
       zoom={2}
@@ -151,13 +142,20 @@ const MapPage = () => {
         attribution='&copy; OpenStreetMap contributors'
         url='https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png'
       />
-      {tripMarkers.map((marker, idx) => (
-        <Marker key={idx} position={marker.position} icon={marker.icon}>
-          <Popup>{marker.popup}</Popup>
+      <ViewportWatcher onChange={fetchMarkers} />
+      {markers.map((marker) => (
+        <Marker
+          key={marker.id}
+          position={[marker.latitude, marker.longitude]}
+          icon={marker.own ? blueIcon : greenIcon}
+        >
+          <Popup>{markerPopup(marker)}</Popup>
         </Marker>
       ))}
+      {clusters.map((cluster) => (
+        <ClusterMarker key={`${cluster.latitude},${cluster.longitude}`} cluster={cluster} renderPopup={markerPopup} />
+      ))}
     </MapContainer>
-  )}
 
   {selectedTrip && (
     <TripDetail trip={selectedTrip} onClose={() => setSelectedTrip(null)} />
@@ -168,6 +166,38 @@ const MapPage = () => {
   );
 };
 
+// A cluster zooms in on click. Trips that share one city can't be split
+// by zooming, so those list their trips in a popup instead.
+const ClusterMarker = ({ cluster, renderPopup }) => {
+  const map = useMap();
+  const position = [cluster.latitude, cluster.longitude];
+
+  if (cluster.markers) {
+    return (
+      <Marker position={position} icon={clusterIcon(cluster)}>
+        <Popup>
+          <ClusterList>
+            {cluster.markers.map((marker) => (
+              <li key={marker.id}>{renderPopup(marker)}</li>
+            ))}
+            {cluster.count > cluster.markers.length && (
+              <li>and {cluster.count - cluster.markers.length} more</li>
+            )}
+          </ClusterList>
+        </Popup>
+      </Marker>
+    );
+  }
+
+  return (
+    <Marker
+      position={position}
+      icon={clusterIcon(cluster)}
+      eventHandlers={{ click: () => map.fitBounds(cluster.bounds, { padding: [40, 40] }) }}
+    />
+  );
+};
+
 export default MapPage;
 
 const PopupContent = styled.div`
@@ -196,6 +226,46 @@ const MapWrapper = styled.div`
   width: 100%;
   margin-top: 64px;
   background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
+
+  .map-cluster div {
+    width: 36px;
+    height: 36px;
+    line-height: 36px;
+    border-radius: 50%;
+    text-align: center;
+    font-weight: 600;
+    color: white;
+    background-color: rgba(47, 158, 68, 0.85);
+    box-shadow: 0 0 0 4px rgba(47, 158, 68, 0.3);
+  }
+
+  .map-cluster-own div {
+    background-color: rgba(66, 99, 235, 0.85);
+    box-shadow: 0 0 0 4px rgba(66, 99, 235, 0.3);
+  }
+`;
+
+const Thumbnail = styled.img`
+  display: block;
+  width: 160px;
+  height: 100px;
+  object-fit: cover;
+  border-radius: 6px;
+  margin: 6px 0;
+`;
+
+const ClusterList = styled.ul`
+  list-style: none;
+  margin: 0;
+  padding: 0;
+  max-height: 260px;
+  overflow-y: auto;
+
+  li + li {
+    margin-top: 10px;
+    padding-top: 10px;
+    border-top: 1px solid #e9ecef;
+  }
 `;
 
 const UserRow = styled.div`
@@ -81,7 +81,7 @@ const MyLog = () => {
             <TripCard key={trip.id} onClick={() => handleTripClick(trip)}>
               <TripImage $hasImage={trip.photos && trip.photos.length > 0}>
                 {trip.photos && trip.photos.length > 0 ? (
-                  <img src={trip.photos[0].url} alt={`${trip.city} trip`} />
+                  <img src={trip.photos[0].variants?.medium?.url || trip.photos[0].url} alt={`${trip.city} trip`} />
                 ) : (
                   <MapIcon><FaMapMarkerAlt /></MapIcon>
                 )}
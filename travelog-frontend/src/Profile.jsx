@@ -18,15 +18,16 @@ const Profile = () => {
   const navigate = useNavigate();
   const [storedUser, setStoredUser] = useState(null);
   const [userData, setUserData] = useState(null);
-  const [followers, setFollowers] = useState([]);
-  const [following, setFollowing] = useState([]);
+  const [listUsers, setListUsers] = useState([]);
+  const [listCursor, setListCursor] = useState(null);
   const [isEditing, setIsEditing] = useState(false);
   const [newPhoto, setNewPhoto] = useState(null);
   const [previewUrl, setPreviewUrl] = useState(null);
-  const [photoVersion, setPhotoVersion] = useState(Date.now());
   const [avatarSrc, setAvatarSrc] = useState(defaultAvatar);
   const [showModal, setShowModal] = useState(false);
   const [modalType, setModalType] = useState('followers');
+  const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
+  const FOLLOW_LIST_PAGE = 50;
 
   useEffect(() => {
     const user = JSON.parse(localStorage.getItem("user"));
@@ -38,28 +39,16 @@ const Profile = () => {
     if (!storedUser) return;
     const fetchProfileData = async () => {
       try {
-        const [userRes, followersRes, followingRes] = await Promise.all([
-          axios.get(`/users/${storedUser.id}`),
-          axios.get(`/users/${storedUser.id}/followers`),
-          axios.get(`/users/${storedUser.id}/following`)
-        ]);
-        setUserData(userRes.data);
-        setFollowers(followersRes.data || []);
-        setFollowing(followingRes.data || []);
-        setPhotoVersion(Date.now());
+        // Identity, counts and avatar version come back in one response
+        const res = await axios.get(`/users/${storedUser.id}/profile`, { params: { trip_limit: 1 } });
+        setUserData(res.data);
+        setAvatarSrc(`${BACKEND_URL}${res.data.avatar_url}`);
       } catch (err) {
         console.error("Failed to load profile data", err);
       }
     };
     fetchProfileData();
-  }, [storedUser]);
-
-  useEffect(() => {
-    if (storedUser) {
-      const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
-      setAvatarSrc(`${BACKEND_URL}/uploads/user_${storedUser.id}.png?v=${photoVersion}`);
-    }
-  }, [storedUser, photoVersion]);
+  }, [storedUser, BACKEND_URL]);
 
   const handleSignOut = () => {
     localStorage.removeItem("user");
@@ -78,11 +67,11 @@ const Profile = () => {
     const formData = new FormData();
     formData.append('photo', newPhoto);
     try {
-      await axios.post(`/users/${storedUser.id}/upload_photo`, formData);
+      const res = await axios.post(`/users/${storedUser.id}/upload_photo`, formData);
       setIsEditing(false);
       setNewPhoto(null);
       setPreviewUrl(null);
-      setPhotoVersion(Date.now());
+      setAvatarSrc(`${BACKEND_URL}${res.data.photo_url}`);
     } catch (err) {
       console.error("Photo upload failed", err);
     }
@@ -93,9 +82,25 @@ const Profile = () => {
     setPreviewUrl(null);
   };
 
+  // Follower lists are only fetched when opened, a page at a time
+  const loadListPage = async (type, cursor) => {
+    try {
+      const res = await axios.get(`/users/${storedUser.id}/${type}`, {
+        params: { limit: FOLLOW_LIST_PAGE, ...(cursor ? { cursor } : {}) }
+      });
+      setListUsers((prev) => (cursor ? [...prev, ...res.data.users] : res.data.users));
+      setListCursor(res.data.next_cursor);
+    } catch (err) {
+      console.error(`Failed to load ${type}`, err);
+    }
+  };
+
   const openModal = (type) => {
     setModalType(type);
+    setListUsers([]);
+    setListCursor(null);
     setShowModal(true);
+    loadListPage(type, null);
   };
 
   const closeModal = () => setShowModal(false);
@@ -107,9 +112,6 @@ const Profile = () => {
 
   if (!userData) return <div>Loading profile...</div>;
 
-  const listToShow = modalType === 'followers' ? followers : following;
-  const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
-
   return (
     <PageContainer>
       <ProfileCard>
@@ -143,13 +145,17 @@ const Profile = () => {
 
           <Stats>
             <Stat onClick={() => openModal('followers')}>
-              <Number>{followers.length}</Number>
+              <Number>{userData.follower_count}</Number>
               <Label>Followers</Label>
             </Stat>
             <Stat onClick={() => openModal('following')}>
-              <Number>{following.length}</Number>
+              <Number>{userData.following_count}</Number>
               <Label>Following</Label>
             </Stat>
+            <Stat>
+              <Number>{userData.trip_count}</Number>
+              <Label>Trips</Label>
+            </Stat>
           </Stats>
         </ProfileContent>
       </ProfileCard>
@@ -158,11 +164,11 @@ const Profile = () => {
         <ModalOverlay>
           <ModalContent>
             <h2>{modalType === 'followers' ? 'Followers' : 'Following'}</h2>
-            {listToShow.length === 0 ? (
+            {listUsers.length === 0 ? (
               <p>No {modalType} yet.</p>
             ) : (
               <UserList>
-                {listToShow.map((user) => (
+                {listUsers.map((user) => (
                   <UserItem key={user.id} onClick={() => handleUserClick(user.username)} style={{ cursor: 'pointer' }}>
                     <UserAvatar
                       src={`${BACKEND_URL}/uploads/user_${user.id}.png`}
@@ -174,6 +180,9 @@ const Profile = () => {
                 ))}
               </UserList>
             )}
+            {listCursor && (
+              <LoadMoreButton onClick={() => loadListPage(modalType, listCursor)}>Load more</LoadMoreButton>
+            )}
             <CloseButton onClick={closeModal}>Close</CloseButton>
           </ModalContent>
         </ModalOverlay>
@@ -346,4 +355,15 @@ const CloseButton = styled.button`
   border: none;
   border-radius: 6px;
   cursor: pointer;
-`;
\ No newline at end of file
+`;
+
+const LoadMoreButton = styled.button`
+  margin-top: 16px;
+  margin-right: 8px;
+  background-color: #1976d2;
+  color: white;
+  padding: 8px 16px;
+  border: none;
+  border-radius: 6px;
+  cursor: pointer;
+`;
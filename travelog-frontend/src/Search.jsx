@@ -18,17 +18,15 @@ const fadeIn = keyframes`
 
 const Search = () => {
   const [query, setQuery] = useState('');
-  const [users, setUsers] = useState([]);
-  const [filteredUsers, setFilteredUsers] = useState([]);
   const [displayedUsers, setDisplayedUsers] = useState([]);
-  const [page, setPage] = useState(1);
+  const [nextCursor, setNextCursor] = useState(null);
   const [hasMore, setHasMore] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
   const observer = useRef();
   const USERS_PER_PAGE = 5;
   const MAX_VISIBLE_HEIGHT = 6; // Number of users visible at once
   const [trips, setTrips] = useState([]);
-  const [following, setFollowing] = useState([]);
+  const [followingIds, setFollowingIds] = useState(new Set());
   const [currentUser, setCurrentUser] = useState(null);
   const [recentSearches, setRecentSearches] = useState([]);
   const [searchType, setSearchType] = useState('users');
@@ -48,39 +46,55 @@ const Search = () => {
     }
   }, []);
 
-  useEffect(() => {
-    if (!currentUser) return;
-    const fetchUsers = async () => {
-      try {
-        const [usersRes, followingRes] = await Promise.all([
-          axios.get('/users'),
-          axios.get(`/users/${currentUser.id}/following`)
-        ]);
-        const validUsers = Array.isArray(usersRes.data) ? usersRes.data : [];
-        setUsers(validUsers);
-        setFilteredUsers(validUsers);
-        setFollowing(Array.isArray(followingRes.data) ? followingRes.data : []);
-      } catch (error) {
-        console.error("Error loading users/following", error);
-      }
-    };
-    fetchUsers();
+  // Ask only about the users on screen, in one request per page
+  const loadFollowState = useCallback(async (userIds) => {
+    if (!currentUser || userIds.length === 0) return;
+    try {
+      const res = await axios.get(`/users/${currentUser.id}/following/check`, {
+        params: { ids: userIds.join(',') }
+      });
+      setFollowingIds((prev) => {
+        const next = new Set(prev);
+        userIds.forEach((id) => (res.data[id] ? next.add(id) : next.delete(id)));
+        return next;
+      });
+    } catch (error) {
+      console.error("Error loading following state", error);
+    }
   }, [currentUser]);
 
+  const fetchUserPage = useCallback(async (text, cursor) => {
+    const res = await axios.get('/users', {
+      params: { q: text, limit: USERS_PER_PAGE, ...(cursor ? { cursor } : {}) }
+    });
+    const page = res.data.users.filter((u) => u.id !== currentUser?.id);
+    loadFollowState(page.map((u) => u.id));
+    return { page, cursor: res.data.next_cursor };
+  }, [currentUser, loadFollowState]);
+
   useEffect(() => {
     if (query) {
       if (searchType === 'users') {
-        const lower = query.toLowerCase();
-        const filtered = users.filter(
-          (u) => u.id !== currentUser?.id && u.username.toLowerCase().includes(lower)
-        );
-        setFilteredUsers(filtered);
-        
-        const initialUsers = filtered.slice(0, USERS_PER_PAGE);
-        setDisplayedUsers(initialUsers);
-        
-        setHasMore(filtered.length > USERS_PER_PAGE);
-        setPage(1);
+        // Wait for a pause in typing before asking the server
+        let cancelled = false;
+        setIsLoading(true);
+        const timer = setTimeout(async () => {
+          try {
+            const { page, cursor } = await fetchUserPage(query.trim(), null);
+            if (cancelled) return;
+            setDisplayedUsers(page);
+            setNextCursor(cursor);
+            setHasMore(Boolean(cursor));
+          } catch (error) {
+            console.error("Error searching users:", error);
+          } finally {
+            if (!cancelled) setIsLoading(false);
+          }
+        }, 250);
+        return () => {
+          cancelled = true;
+          clearTimeout(timer);
+        };
       } else {
           const searchCities = async () => {
             try {
@@ -94,29 +108,27 @@ const Search = () => {
           searchCities();
       }
     } else {
-      setFilteredUsers([]);
       setDisplayedUsers([]);
-      setPage(1);
+      setNextCursor(null);
       setHasMore(false);
     }
-  }, [query, users, currentUser, searchType]);
+  }, [query, currentUser, searchType, fetchUserPage]);
 
-  const loadMoreUsers = useCallback(() => {
+  const loadMoreUsers = useCallback(async () => {
     if (isLoading || !hasMore) return;
-    
+
     setIsLoading(true);
-    setTimeout(() => {
-      const nextPage = page + 1;
-      const startIndex = (nextPage - 1) * USERS_PER_PAGE;
-      const endIndex = startIndex + USERS_PER_PAGE;
-      const nextUsers = filteredUsers.slice(startIndex, endIndex);
-      
-      setDisplayedUsers(prev => [...prev, ...nextUsers]);
-      setPage(nextPage);
-      setHasMore(endIndex < filteredUsers.length);
+    try {
+      const { page, cursor } = await fetchUserPage(query.trim(), nextCursor);
+      setDisplayedUsers(prev => [...prev, ...page]);
+      setNextCursor(cursor);
+      setHasMore(Boolean(cursor));
+    } catch (error) {
+      console.error("Error loading more users:", error);
+    } finally {
       setIsLoading(false);
-    }, 300);
-  }, [page, filteredUsers, hasMore, isLoading]);
+    }
+  }, [query, nextCursor, hasMore, isLoading, fetchUserPage]);
 
   const lastUserElementRef = useCallback(node => {
     if (isLoading) return;
@@ -135,13 +147,17 @@ const Search = () => {
     if (node) observer.current.observe(node);
   }, [hasMore, isLoading, loadMoreUsers]);
 
-  const isFollowing = (userId) => following.some((u) => u.id === userId);
+  const isFollowing = (userId) => followingIds.has(userId);
   const toggleFollow = async (targetId) => {
     try {
       const action = isFollowing(targetId) ? 'unfollow' : 'follow';
       await axios.post(`/users/${currentUser.id}/${action}`, { target_user_id: targetId });
-      const updated = await axios.get(`/users/${currentUser.id}/following`);
-      setFollowing(Array.isArray(updated.data) ? updated.data : []);
+      setFollowingIds((prev) => {
+        const next = new Set(prev);
+        if (action === 'follow') next.add(targetId);
+        else next.delete(targetId);
+        return next;
+      });
     } catch (err) {
       console.error("Failed to follow/unfollow", err);
     }
@@ -198,7 +214,7 @@ const Search = () => {
                 <PlaceholderText>Start typing to search for users</PlaceholderText>
               </PlaceholderContainer>
             )}
-            {query && filteredUsers.length === 0 && (
+            {query && !isLoading && displayedUsers.length === 0 && (
               <NoResults>No users found.</NoResults>
             )}
             {query && displayedUsers.length > 0 && (
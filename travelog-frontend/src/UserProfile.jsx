@@ -14,8 +14,8 @@ const UserProfile = () => {
   const navigate = useNavigate();
   const { username } = useParams();
   const [userData, setUserData] = useState(null);
-  const [followers, setFollowers] = useState([]);
-  const [following, setFollowing] = useState([]);
+  const [followerCount, setFollowerCount] = useState(0);
+  const [followingCount, setFollowingCount] = useState(0);
   const [avatarSrc, setAvatarSrc] = useState(defaultAvatar);
   const [isFollowing, setIsFollowing] = useState(false);
   const [currentUser, setCurrentUser] = useState(null);
@@ -28,29 +28,27 @@ const UserProfile = () => {
   useEffect(() => {
     const fetchUserData = async () => {
       try {
-        const allUsers = await axios.get('/users');
-        const targetUser = allUsers.data.find(u => u.username === username);
-        if (!targetUser) {
-          navigate(-1);
-          return;
-        }
-        setUserData(targetUser);
-
-        const [followersRes, followingRes] = await Promise.all([
-          axios.get(`/users/${targetUser.id}/followers`),
-          axios.get(`/users/${targetUser.id}/following`)
-        ]);
-        setFollowers(followersRes.data || []);
-        setFollowing(followingRes.data || []);
-
-        // Check if current user is following this user
-        if (currentUser) {
-          const isFollowingUser = followersRes.data.some(f => f.id === currentUser.id);
-          setIsFollowing(isFollowingUser);
+        let profile;
+        try {
+          // Identity, counts, avatar and follow state in one request
+          const res = await axios.get(`/users/by-username/${encodeURIComponent(username)}/profile`, {
+            params: { trip_limit: 1, ...(currentUser ? { viewer_id: currentUser.id } : {}) }
+          });
+          profile = res.data;
+        } catch (err) {
+          if (err.response?.status === 404) {
+            navigate(-1);
+            return;
+          }
+          throw err;
         }
+        setUserData(profile);
+        setFollowerCount(profile.follower_count);
+        setFollowingCount(profile.following_count);
+        setIsFollowing(Boolean(profile.is_following));
 
         const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
-        setAvatarSrc(`${BACKEND_URL}/uploads/user_${targetUser.id}.png?v=${Date.now()}`);
+        setAvatarSrc(`${BACKEND_URL}${profile.avatar_url}`);
       } catch (err) {
         console.error('Failed to fetch user profile', err);
       }
@@ -67,12 +65,12 @@ const UserProfile = () => {
 
     try {
       const action = isFollowing ? 'unfollow' : 'follow';
-      await axios.post(`/users/${currentUser.id}/${action}`, { target_user_id: userData.id });
-      
-      // Update followers list
-      const updatedFollowers = await axios.get(`/users/${userData.id}/followers`);
-      setFollowers(updatedFollowers.data || []);
-      
+      const response = await axios.post(`/users/${currentUser.id}/${action}`, { target_user_id: userData.id });
+
+      // Update follower count
+      const changed = (response.data.followed || response.data.unfollowed || []).length;
+      setFollowerCount((count) => count + (isFollowing ? -changed : changed));
+
       // Update following status
       setIsFollowing(!isFollowing);
     } catch (err) {
@@ -107,13 +105,17 @@ const UserProfile = () => {
 
           <Stats>
             <Stat>
-              <Number>{followers.length}</Number>
+              <Number>{followerCount}</Number>
               <Label>Followers</Label>
             </Stat>
             <Stat>
-              <Number>{following.length}</Number>
+              <Number>{followingCount}</Number>
               <Label>Following</Label>
             </Stat>
+            <Stat>
+              <Number>{userData.trip_count}</Number>
+              <Label>Trips</Label>
+            </Stat>
           </Stats>
 
           {currentUser && currentUser.id !== userData.id && (